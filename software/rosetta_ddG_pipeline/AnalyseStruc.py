@@ -1,98 +1,48 @@
 import sys
 import os
-import Bio
-from Bio.PDB.PDBParser import PDBParser
-parser = PDBParser(PERMISSIVE=1)
-from Bio.PDB import *
-from Bio import SeqIO
-from Bio import pairwise2
-from Bio.pairwise2 import format_alignment
+from Bio import Align
 import json
+from structure_model import load_structure
+
+# scores like pairwise2.align.globalxx: identities count, gaps are free
+aligner = Align.PairwiseAligner()
+aligner.mode = 'global'
+aligner.match_score = 1
+aligner.mismatch_score = 0
+aligner.gap_score = 0
+
+
+def best_alignment(seq1, seq2):
+    # one optimal alignment as [seqA, seqB, score, start, end], like
+    # pairwise2.align.globalxx(seq1, seq2, one_alignment_only=True)[0];
+    # enumerating all optimal alignments explodes for long or repetitive chains
+    alignment = aligner.align(seq1, seq2)[0]
+    return [alignment[0], alignment[1], alignment.score, 0, len(alignment[0])]
+
 
 def get_structure_parameters(outpath,structure_id,printing=True):
     name = structure_id.split("/")
     name = name[-1].split(".")[-2] 
-    structure = parser.get_structure(name, structure_id)
-    
-    aminocodes = {
-    "ALA": "A",
-    "CYS": "C",
-    "ASP": "D",
-    "GLU": "E",
-    "PHE": "F",
-    "GLY": "G",
-    "HIS": "H",
-    "ILE": "I",
-    "LYS": "K",
-    "LEU": "L",
-    "MET": "M",
-    "ASN": "N",
-    "PRO": "P",
-    "GLN": "Q",
-    "ARG": "R",
-    "SER": "S",
-    "THR": "T",
-    "VAL": "V",
-    "TRP": "W",
-    "TYR": "Y"
-    }
-    resdata={};strucdata={};count=0;exceptions = 0
-    model = structure[0]
-   
-    for chain in structure[0]:
-        for residue in chain:
-            if residue.get_id()[0] == " ":
-                count += 1
-                try:
-                    residue_letter = aminocodes[residue.get_resname()]
-                    resdata[count] = residue_letter,residue.get_id()[1],chain.get_id()
-                except: 
-                    residue_letter = str(residue.get_resname())
-                    exceptions += 1
-                    resdata[count] = residue_letter,str(residue.get_id()[1]),chain.get_id()
+    # parsed once per file content, see structure_model.py
+    model = load_structure(structure_id, sidecar=os.path.join(outpath, f'structure_{name}.npz'))
+    resdata = model.resdata
+    strucdata = model.strucdata
+    dbref = model.dbref
     if printing == True:
-        print("Special residues in structure = ",exceptions)
-    
-    
-    for chain in model:
-        sequence = []
-        for res in range(1,len(resdata)+1):
-    
-            if str(resdata[res][2]) == str(chain)[-2:-1]:
-                sequence.append(resdata[res][0])
-        sequence_chain = ''.join([str(elem) for elem in sequence]) 
-        strucdata[str(chain)[-2:-1]]= sequence_chain
-        #print(sequence_chain)
-    
-    for record in SeqIO.parse(structure_id, "pdb-seqres"):
-        seq=str(record.seq)
-        strucdata[str(record.annotations["chain"])]=strucdata[str(record.annotations["chain"])],seq
-        #print(str(record.annotations["chain"]),seq)
-    
-    with open(structure_id, 'r') as pdb_file:
-        pdblines = pdb_file.readlines()
-    ref_count=0
-    dbref={}
-    for line in pdblines:
-        if len(line) > 1:
-            line_fields = line.split()
-            if line_fields[0] == 'DBREF' :
-                refs=line_fields
-                ref_count+=1
-                dbref[ref_count] = refs
-                    
+        print("Special residues in structure = ",model.exceptions)
+
     align ={}
     for chain in strucdata:
         
         seq1=strucdata[str(chain)][0]
         seq2=strucdata[str(chain)][1]
-        alignments = pairwise2.align.globalxx(seq1, seq2)
-        align[str(chain)] = alignments
+        align[str(chain)] = [best_alignment(seq1, seq2)]
         #print(alignments)
     
     structure_dic = {"resdata": resdata, "strucdata": strucdata, "DBREF":dbref, "alignment":align}
     #structure_dic = {"strucdata": strucdata, "DBREF":dbref, "alignment":align}
-    print(structure_dic)
+    if printing == True:
+        print(structure_dic)
     with open(outpath +"/structure_{}.txt".format(name),'w') as strucfile:
 
         strucfile.write('#Structure features \n')
@@ -0,0 +1,195 @@
+"""adaptive.py adds cartesian ddG replicates only where the estimate has not converged.
+
+After the first pass (and its retries) the adaptive controller runs as a
+small job. It computes the confidence interval of every ddG from the
+replicate spread of the variant and of the WT reference of its position,
+
+    half width = t(0.975, n - 1) * sqrt(std_mut^2 / n_mut + std_wt^2 / n_wt) / 2.9
+
+and submits a follow-up array over only the variants wider than the
+threshold (plus the WT reference of their positions), with
+-ddg:iterations set to the batch size. This repeats until all variants
+converged or reached the replicate cap, for at most
+max_replicates / batch_size rounds; then the parse job is submitted.
+Follow-up waves are recorded in ddg_jobs.txt with negative attempt
+numbers, which the retry controller ignores.
+
+Membrane protein runs are not supported: rosetta_ddg_mp_pyrosetta.py
+writes one averaged ddG per variant to ddG.out, without the replicates
+the interval is computed from, so --adaptive_ci is rejected together
+with --is_membrane.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import json
+import logging as logger
+import os
+from os.path import join
+import shutil
+import sys
+
+# Third party imports
+import numpy as np
+from scipy import stats as scipy_stats
+
+# Local application imports
+from helper import AttrDict
+from parse_cartesian_functions import update_ddg_aggregate
+from result_store import ReplicateStore
+import retry
+import rosetta_paths
+from scheduler import SlurmScheduler
+from structure_input import write_cartesian_ddg_sbatch
+
+
+def write_adaptive_sbatch(folder, sequence, sys_name='', partition='sbinlab', ci_threshold=0.5,
+                          batch_size=3, max_replicates=12, max_array_size=1000, array_throttle=100):
+    """Writes adaptive.json and the adaptive_ddgs.sbatch controller to folder.ddG_input."""
+    config = {
+        'folder': {'input': folder.input, 'ddG_input': folder.ddG_input, 'ddG_run': folder.ddG_run,
+                   'ddG_output': folder.ddG_output},
+        'sequence': sequence,
+        'sys_name': sys_name,
+        'partition': partition,
+        'ci_threshold': ci_threshold,
+        'batch_size': batch_size,
+        'max_replicates': max_replicates,
+        'max_array_size': max_array_size,
+        'array_throttle': array_throttle,
+    }
+    path_to_config = join(folder.ddG_input, 'adaptive.json')
+    with open(path_to_config, 'w') as fp:
+        json.dump(config, fp, indent=4)
+
+    path_to_sbatch = join(folder.ddG_input, 'adaptive_ddgs.sbatch')
+    with open(path_to_sbatch, 'w') as fp:
+        fp.write(f'''#!/bin/sh
+#SBATCH --job-name={sys_name}_adaptive
+#SBATCH --time=0:30:00
+#SBATCH --mem 4000
+#SBATCH --partition={partition}
+
+# adds replicates for the unconverged variants (round number $1)
+''')
+        fp.write(f'python3 {join(rosetta_paths.path_to_stability_pipeline, "adaptive.py")} {path_to_config} $1')
+    return path_to_sbatch
+
+
+def remove_adaptive_sbatch(folder):
+    for path in [join(folder.ddG_input, 'adaptive.json'), join(folder.ddG_input, 'adaptive_ddgs.sbatch')]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def ddg_half_widths(stats):
+    """Returns the 95% confidence half width of the ddG of every variant.
+
+    Variants with fewer than two replicates of themselves or of their WT
+    reference get inf.
+    """
+    wt = stats[stats['wt'] == stats['mutant']].set_index('position')
+    n_wt = stats['position'].map(wt['count']).values
+    std_wt = stats['position'].map(wt['std']).values
+    n = np.minimum(stats['count'].values, n_wt)
+    standard_error = np.sqrt(stats['std'].values ** 2 / stats['count'].values + std_wt ** 2 / n_wt) / 2.9
+    with np.errstate(invalid='ignore'):
+        half_widths = scipy_stats.t.ppf(0.975, n - 1) * standard_error
+    return np.where(np.isnan(half_widths), np.inf, half_widths)
+
+
+def unconverged_variants(stats, ci_threshold, max_replicates):
+    """Returns {position: (wt, mutants)} of the variants to run again.
+
+    The WT reference of every such position is run again, too, unless it
+    reached max_replicates.
+    """
+    selected = stats[(ddg_half_widths(stats) > ci_threshold) & (stats['count'] < max_replicates)]
+    rerun = {}
+    for position, variants in selected.groupby('position'):
+        wt = variants['wt'].iloc[0]
+        mutants = list(variants['mutant'])
+        wt_count = stats.loc[(stats['position'] == position) & (stats['mutant'] == wt), 'count']
+        if wt not in mutants and (wt_count.empty or wt_count.iloc[0] < max_replicates):
+            mutants.insert(0, wt)
+        rerun[int(position)] = (wt, mutants)
+    return rerun
+
+
+def write_followup_inputs(folder, rerun, round_number, batch_size):
+    """Writes mutfiles of the rerun variants and a flag file with
+    -ddg:iterations batch_size to ddG_input/adaptive_<round>."""
+    path_to_round = join(folder.ddG_input, f'adaptive_{round_number}')
+    if os.path.isdir(path_to_round):
+        shutil.rmtree(path_to_round)
+    os.makedirs(join(path_to_round, 'mutfiles'))
+    for position, (wt, mutants) in rerun.items():
+        with open(join(path_to_round, 'mutfiles', f'mutfile{position:0>5}'), 'w') as mutfile:
+            mutfile.write('total ' + str(len(mutants)))
+            for mutant in mutants:
+                mutfile.write(f'\n1\n{wt} {position} {mutant}')
+
+    path_to_ddgflags = join(path_to_round, 'ddg_flagfile')
+    with open(join(folder.ddG_input, 'ddg_flagfile'), 'r') as fp:
+        flags = [line for line in fp
+                 if line.split()[:1] not in [['-ddg:iterations'], ['-ddg::iterations']]]
+    with open(path_to_ddgflags, 'w') as fp:
+        fp.writelines(flags)
+        fp.write(f'\n-ddg:iterations {batch_size}\n')
+    return join(path_to_round, 'mutfiles'), path_to_ddgflags
+
+
+def read_config(path_to_config):
+    with open(path_to_config, 'r') as fp:
+        config = json.load(fp)
+    return config, AttrDict(config['folder'])
+
+
+def adaptive_round(path_to_config, round_number, scheduler):
+    """Submits the follow-up array of one round; returns its jobs, or []
+    if all variants converged or reached the replicate cap."""
+    config, folder = read_config(path_to_config)
+    stats = update_ddg_aggregate(folder.ddG_run, config['sequence'],
+                                 store=ReplicateStore(join(folder.ddG_output, 'ddg_replicates')))
+    rerun = unconverged_variants(stats, config['ci_threshold'], config['max_replicates'])
+    n_variants = sum(len(mutants) for wt, mutants in rerun.values())
+    logger.info(f'Adaptive round {round_number}: {n_variants} of {len(stats)} variants need more replicates')
+    # the rounds are capped as well, in case some variants keep failing
+    if rerun == {} or round_number > -(-config['max_replicates'] // config['batch_size']):
+        return []
+
+    input_mutfiles, ddgfile = write_followup_inputs(folder, rerun, round_number, config['batch_size'])
+    jobs = []
+    for path_to_sbatch in write_cartesian_ddg_sbatch(
+            folder, input_mutfiles=input_mutfiles, ddgfile=ddgfile, sys_name=config['sys_name'],
+            partition=config['partition'], max_array_size=config['max_array_size'],
+            array_throttle=config['array_throttle'], basename=f'adaptive_ddg_{round_number}'):
+        job = scheduler.submit(path_to_sbatch, folder.ddG_run)
+        retry.record_ddg_jobs(folder.ddG_run, -round_number, job.job_id, path_to_sbatch)
+        jobs.append(job)
+    return jobs
+
+
+def adaptive_ddgs(path_to_config, round_number, scheduler=None):
+    """Runs one adaptive round and chains the next controller, or the parse job."""
+    if scheduler == None:
+        scheduler = SlurmScheduler()
+    config, folder = read_config(path_to_config)
+    jobs = adaptive_round(path_to_config, round_number, scheduler)
+    if jobs == []:
+        return retry.submit_parse(folder, scheduler)
+    return scheduler.submit(join(folder.ddG_input, 'adaptive_ddgs.sbatch'), folder.ddG_run,
+                            dependencies=jobs, args=str(round_number + 1))
+
+
+def adaptive_in_process(folder, scheduler):
+    # for blocking schedulers, whose rounds are finished when submit returns
+    round_number = 1
+    while adaptive_round(join(folder.ddG_input, 'adaptive.json'), round_number, scheduler) != []:
+        round_number += 1
+
+
+if __name__ == '__main__':
+    adaptive_ddgs(sys.argv[1], int(sys.argv[2]))
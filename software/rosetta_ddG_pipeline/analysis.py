@@ -21,7 +21,6 @@ import subprocess
 # Local application imports
 from helper import AttrDict, drop_numerical_outliers
 from prism_rosetta_parser import read_from_prism, write_prism
-from PrismData import PrismParser
 import rosetta_paths
 
 # Definitions
@@ -38,19 +37,19 @@ for residue, pos_alph in zip(aa_order_alphabetical, range(len(aa_order_alphabeti
 
 
 def calc_cc(prismfile):
-    parser = PrismParser()
-    data = parser.read(prismfile)
-    data_frame1 = data.dataframe
-    spearman = stats.spearmanr(np.array(data_frame1)[
-                               :, 1], np.array(data_frame1)[:, 2])
-    pearson = stats.pearsonr(np.array(data_frame1)[
-                             :, 1], np.array(data_frame1)[:, 2])
-    mannwhitney = stats.mannwhitneyu(
-        np.array(data_frame1)[:, 1], np.array(data_frame1)[:, 2])
-    linregress = stats.linregress(np.array(data_frame1)[:, 1].astype(
-        float), np.array(data_frame1)[:, 2].astype(float))
-    best_fit = np.polyfit(np.array(data_frame1)[:, 1].astype(
-        float), np.array(data_frame1)[:, 2].astype(float), 1)
+    metadata, data_frame1 = read_from_prism(prismfile)
+    return calc_cc_values(data_frame1.iloc[:, 1], data_frame1.iloc[:, 2])
+
+
+def calc_cc_values(predicted, experimental):
+    # correlation statistics of two columns, without writing and reading a prism file
+    predicted = np.asarray(predicted, dtype=float)
+    experimental = np.asarray(experimental, dtype=float)
+    spearman = stats.spearmanr(predicted, experimental)
+    pearson = stats.pearsonr(predicted, experimental)
+    mannwhitney = stats.mannwhitneyu(predicted, experimental)
+    linregress = stats.linregress(predicted, experimental)
+    best_fit = np.polyfit(predicted, experimental, 1)
     statistics = {
         'spearman': {
             'correlation': spearman[0],
@@ -121,7 +120,7 @@ def calc_all(folder, sys_name='', drop_outliers=True, drop_pro=True):
     write_prism(merged_metadata, merged_dataframe,
                 merged_prism_file, comment=comment)
     statistics = {}
-    stats = calc_cc(merged_prism_file)
+    stats = calc_cc_values(merged_dataframe['predicted_ddG'], merged_dataframe['experimental_ddG'])
     statistics['correlation'] = stats
 
     if drop_pro:
@@ -132,8 +131,8 @@ def calc_all(folder, sys_name='', drop_outliers=True, drop_pro=True):
         write_prism(merged_metadata, merged_dataframe_pro,
                     merged_prism_file3, comment=comment)
 
-        stats_no_pro = calc_cc(
-            merged_prism_file3)
+        stats_no_pro = calc_cc_values(
+            merged_dataframe_pro['predicted_ddG'], merged_dataframe_pro['experimental_ddG'])
         statistics['correlation_no_pro'] = stats_no_pro
 
     if drop_outliers:
@@ -143,8 +142,8 @@ def calc_all(folder, sys_name='', drop_outliers=True, drop_pro=True):
         write_prism(merged_metadata, merged_dataframe_no_outlier,
                     merged_prism_file2, comment=comment)
 
-        stats_no_outlier = calc_cc(
-            merged_prism_file2)
+        stats_no_outlier = calc_cc_values(
+            merged_dataframe_no_outlier['predicted_ddG'], merged_dataframe_no_outlier['experimental_ddG'])
         statistics['correlation_no_outlier'] = stats_no_outlier
 
     statistic_outfile = os.path.join(folder.analysis, 'statistic.json')
@@ -17,9 +17,9 @@ import re
 import rosetta_paths
 
 
-def parse_args2():
+def parse_args2(argv=None):
     """
-    Argument parser function
+    Argument parser function, parses sys.argv unless argv is given
     """
 
     parser = ArgumentParser(description=(
@@ -77,7 +77,8 @@ def parse_args2():
                         )
     parser.add_argument('--mode', '-i',
                         choices=['print', 'create', 'proceed',
-                                 'fullrun', 'relax', 'ddg_calculation', 'analysis'],
+                                 'fullrun', 'relax', 'ddg_calculation', 'resume', 'analysis', 'campaign',
+                                 'status'],
                         default='create',
                         dest='MODE',
                         help=('Mode to run:\n'
@@ -86,11 +87,21 @@ def parse_args2():
                               '\tproceed: Starts calculations with created run files (incl. relax and ddG calculation) \n'
                               '\trelax: Starts relax calculations with created run files\n'
                               '\tddg_calculation: Starts ddg_calculation calculations with created run files\n'
+                              '\tresume: Reruns only the ddG calculations without complete output\n'
                               '\tanalysis: Does standard analysis like heatmap plotting\n'
                               '\tfullrun: runs full pipeline\n'
+                              '\tcampaign: prepares and runs all proteins of --manifest with shared job arrays\n'
+                              '\tstatus: reports the progress of the ddG calculations of --outputpath\n'
                               'Default value: create'
                               )
                         )
+    parser.add_argument('--manifest',
+                        default=None,
+                        dest='MANIFEST',
+                        help=('CSV file with one protein per row for --mode campaign. The header names \n'
+                              'long options without dashes (e.g. structure,chainid,mutations,prism); \n'
+                              'the other command line options are used for all rows.')
+                        )
     parser.add_argument('--chainid',
                         default='A',
                         dest='CHAIN',
@@ -229,11 +240,158 @@ def parse_args2():
                         dest='SLURM_PARTITION',
                         help='Partition to run the SLURM jobs'
                         )
+    parser.add_argument('--mutfiles_per_task',
+                        default=1,
+                        type=int,
+                        dest='MUTFILES_PER_TASK',
+                        help=('Number of mutfiles run in sequence by one ddG array task. \n'
+                              'The array size and walltime (at most 168 h) are scaled accordingly. Default value: 1')
+                        )
+    parser.add_argument('--slurm_max_array_size',
+                        default=1000,
+                        type=int,
+                        dest='SLURM_MAX_ARRAY_SIZE',
+                        help=('Maximum number of tasks per job array (MaxArraySize of the cluster). \n'
+                              'Larger ddG arrays are split into several sbatch files. Default value: 1000')
+                        )
+    parser.add_argument('--slurm_array_throttle',
+                        default=100,
+                        type=int,
+                        dest='SLURM_ARRAY_THROTTLE',
+                        help=('Maximum number of simultaneously running tasks per job array (%%N). \n'
+                              '0=no limit. Default value: 100')
+                        )
+    parser.add_argument('--work_queue_workers',
+                        default=0,
+                        type=int,
+                        dest='WORK_QUEUE_WORKERS',
+                        help=('Run the ddG calculations with this many workers pulling mutfiles (or MP \n'
+                              'residues) from a queue in ddG/run, longest expected first, instead of one \n'
+                              'array task per fixed block. Default value: 0 (static arrays)')
+                        )
+    parser.add_argument('--max_retries',
+                        default=0,
+                        type=int,
+                        dest='MAX_RETRIES',
+                        help=('Number of times cancelled or failed ddG tasks are resubmitted \n'
+                              'with increased resources. Default value: 0')
+                        )
+    parser.add_argument('--retry_time_factor',
+                        default=2.0,
+                        type=float,
+                        dest='RETRY_TIME_FACTOR',
+                        help='Factor the walltime of retried ddG tasks grows with per attempt. Default value: 2.0'
+                        )
+    parser.add_argument('--retry_mem_factor',
+                        default=1.5,
+                        type=float,
+                        dest='RETRY_MEM_FACTOR',
+                        help='Factor the memory of retried ddG tasks grows with per attempt. Default value: 1.5'
+                        )
+    parser.add_argument('--relax_keep_top',
+                        default=1,
+                        type=int,
+                        dest='RELAX_KEEP_TOP',
+                        help=('Number of best scoring relaxed models that are kept (and ranked in \n'
+                              'relax/output/relax_ranking.txt); the others are deleted. Default value: 1')
+                        )
+    parser.add_argument('--adaptive_ci',
+                        default=0.0,
+                        type=float,
+                        dest='ADAPTIVE_CI',
+                        help=('Adaptive replicates for cartesian ddG: after the first pass, variants whose 95% \n'
+                              'confidence interval half width (kcal/mol) is above this value get more \n'
+                              'replicates. Not available for --is_membrane runs. Default value: 0 (off)')
+                        )
+    parser.add_argument('--adaptive_batch',
+                        default=3,
+                        type=int,
+                        dest='ADAPTIVE_BATCH',
+                        help='Replicates added per adaptive round. Default value: 3'
+                        )
+    parser.add_argument('--adaptive_max_replicates',
+                        default=12,
+                        type=int,
+                        dest='ADAPTIVE_MAX_REPLICATES',
+                        help='Variants get no more adaptive replicates beyond this number. Default value: 12'
+                        )
+    parser.add_argument('--clean_pdb',
+                        choices=['native', 'script'],
+                        default='native',
+                        dest='CLEAN_PDB',
+                        help=('How the input structure is cleaned:\n'
+                              '\tnative: in-process (clean_structure.py) \n'
+                              '\tscript: Rosetta\'s clean_pdb.py with python2 \n'
+                              'Default value: native')
+                        )
+    parser.add_argument('--align',
+                        choices=['native', 'muscle'],
+                        default='native',
+                        dest='ALIGN',
+                        help=('How the structure sequence is aligned to the UniProt sequence:\n'
+                              '\tnative: in-process (sequence_alignment.py), cached by sequence \n'
+                              '\tmuscle: MUSCLE \n'
+                              'Default value: native')
+                        )
+    parser.add_argument('--parse_shards',
+                        default=0,
+                        type=int,
+                        dest='PARSE_SHARDS',
+                        help=('Parses the cartesian .ddg files in this many map tasks (parse_shards.sbatch), \n'
+                              'whose results the parse job merges; for very large runs. Default value: 0 (one parse job)')
+                        )
+    parser.add_argument('--executor',
+                        choices=['slurm', 'local'],
+                        default='slurm',
+                        dest='EXECUTOR',
+                        help=('Where to run the relax and ddG calculations:\n'
+                              '\tslurm: submits the sbatch files with sbatch \n'
+                              '\tlocal: runs the array tasks on a local process pool \n'
+                              'Default value: slurm'
+                              )
+                        )
+    parser.add_argument('--max_workers',
+                        default=None,
+                        type=int,
+                        dest='MAX_WORKERS',
+                        help='Number of parallel processes for --executor local. Default: number of cores'
+                        )
+    parser.add_argument('--runtime_model',
+                        default=None,
+                        dest='RUNTIME_MODEL',
+                        help=('Runtime model (json) fit with runtime_model.py on earlier runs. If given, \n'
+                              'the ddG arrays request the predicted --time and --mem instead of the defaults')
+                        )
+    parser.add_argument('--force_stages',
+                        action='store_true',
+                        dest='FORCE_STAGES',
+                        help=('Rerun all preparation and relax stages, even if their inputs '
+                              'are unchanged since the last run (see stage_hashes.json)')
+                        )
+    parser.add_argument('--status_heatmap',
+                        action='store_true',
+                        dest='STATUS_HEATMAP',
+                        help='Plot a heatmap of the ddGs finished so far in --mode status'
+                        )
+    parser.add_argument('--status_history',
+                        action='store_true',
+                        dest='STATUS_HISTORY',
+                        help=('Append the --mode status report to ddG/run/status_history.tsv, which later \n'
+                              'reports use for the completion rate')
+                        )
     parser.add_argument('--verbose',
                         default=False,
                         dest='VERBOSE',
                         help='Make pipeline more verbose'
                         )
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    # an array of zero tasks or mutfiles would never be split into sbatch files
+    if args.SLURM_MAX_ARRAY_SIZE < 1:
+        parser.error(f'--slurm_max_array_size must be at least 1, not {args.SLURM_MAX_ARRAY_SIZE}')
+    if args.MUTFILES_PER_TASK < 1:
+        parser.error(f'--mutfiles_per_task must be at least 1, not {args.MUTFILES_PER_TASK}')
+    # the MP protocol has no per-variant replicates to extend (see adaptive.py)
+    if args.ADAPTIVE_CI > 0 and args.IS_MP == True:
+        parser.error('--adaptive_ci is only available for cartesian ddG, not for --is_membrane runs')
 
     return args
@@ -0,0 +1,296 @@
+"""campaign.py runs the pipeline for many proteins listed in a manifest.
+
+The entries of the manifest are prepared (mode create) in parallel in one
+process pool. The relax, parse relax, ddG and parse ddG stages of all
+entries are then submitted as shared job arrays, whose tasks run one
+array task of a per-protein sbatch file each (see *_tasks.txt); the map
+tasks of --parse_shards are a wave of their own before parse ddG. Every
+finished task is logged to progress.log, which is summarised per protein
+in progress.tsv. The shared ddG arrays are recorded in ddg_jobs.txt of
+every entry, with the campaign folder that holds their slurm-*.out
+files, so --mode status and retry.py map their tasks back to the
+mutfiles of each protein. Entries created with --adaptive_ci leave the
+shared parse waves: after the shared ddG wave their adaptive controller
+runs the follow-up rounds and then submits their parse job itself.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import logging as logger
+import os
+from os.path import isfile, join
+import sys
+
+# Local application imports
+from args_pipeline import parse_args2
+from folders import folder2
+from helper import array_spec, ddg_sbatch_files, format_slurm_time, read_sbatch_resources, split_array
+from local_executor import parse_sbatch_array
+import adaptive
+import retry
+from retry import record_ddg_jobs
+from scheduler import get_scheduler
+from stages import StageCache, clear_outputs, relax_stage
+
+
+WAVES = ['relax', 'parse_relax', 'ddg', 'parse_shards', 'parse_ddg']
+
+# manifest columns holding paths (long and short option names)
+PATH_OPTIONS = ['structure', 's', 'mutations', 'm', 'prism', 'p', 'outputpath', 'o', 'ddgflags', 'd',
+                'relaxflags', 'r', 'mp_span', 'mp_relax_xml', 'runtime_model']
+
+
+def strip_campaign_options(argv):
+    # the command line options used for every entry of the manifest
+    entry_argv = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg in ['--mode', '-i', '--manifest']:
+            skip = True
+        elif not arg.startswith('--mode=') and not arg.startswith('--manifest='):
+            entry_argv.append(arg)
+    return entry_argv
+
+
+def read_manifest(path_to_manifest, base_argv, campaign_path):
+    """Returns name, output path and command line options of every manifest row.
+
+    Relative paths in the PATH_OPTIONS columns are relative to the
+    manifest. Entries without an outputpath column run in
+    <campaign_path>/<structure name>_<chain>.
+    """
+    manifest_dir = os.path.dirname(os.path.abspath(path_to_manifest))
+    entries = []
+    with open(path_to_manifest, 'r') as fp:
+        for row in csv.DictReader(fp):
+            options = {}
+            for key, value in row.items():
+                key = key.strip().lstrip('-')
+                value = value.strip()
+                if value == '':
+                    continue
+                if key in PATH_OPTIONS:
+                    value = join(manifest_dir, value)
+                options[key] = value
+            structure_name = os.path.splitext(os.path.basename(options['structure']))[0]
+            name = f"{structure_name}_{options.get('chainid', 'A')}"
+            options.setdefault('outputpath', join(campaign_path, name))
+            argv = list(base_argv)
+            for key, value in options.items():
+                argv.extend([f'--{key}', value])
+            entries.append({'name': name, 'output_path': options['outputpath'],
+                            'argv': argv + ['--mode', 'create', '--overwrite_path', 'True']})
+    return entries
+
+
+def prepare_entry(entry):
+    # runs mode create for one entry; failures are reported, not raised.
+    # run_pipeline imports this module, so it is imported here
+    from run_pipeline import predict_stability
+    # the pipeline logger adds handlers per run folder
+    logger.getLogger('Pipeline_logger').handlers = []
+    try:
+        args = parse_args2(entry['argv'])
+        predict_stability(args)
+        return {'name': entry['name'], 'is_mp': args.IS_MP, 'prepared': True, 'error': ''}
+    except (Exception, SystemExit) as error:
+        return {'name': entry['name'], 'is_mp': False, 'prepared': False, 'error': repr(error)}
+
+
+def wave_units(wave, folder, stage_cache):
+    # (run directory, sbatch file, task id) of one entry in one wave
+    if wave == 'relax':
+        relax_inputs, relax_outputs = relax_stage(folder)
+        if stage_cache.up_to_date('relax', relax_inputs, relax_outputs):
+            return []
+        clear_outputs(relax_outputs)
+        stage_cache.done('relax', relax_inputs, relax_outputs, hash_outputs=False)
+        paths = [(folder.relax_run, join(folder.relax_input, 'rosetta_relax.sbatch'))]
+    elif wave == 'parse_relax':
+        paths = [(folder.relax_run, join(folder.relax_input, 'parse_relax.sbatch'))]
+    elif wave == 'ddg':
+        paths = [(folder.ddG_run, path) for path in ddg_sbatch_files(folder.ddG_input)]
+    elif wave == 'parse_shards':
+        # only entries created with --parse_shards
+        paths = [(folder.ddG_run, path) for path in [join(folder.ddG_input, 'parse_shards.sbatch')] if isfile(path)]
+    else:
+        paths = [(folder.ddG_run, join(folder.ddG_input, 'parse_ddgs.sbatch'))]
+    units = []
+    for run_dir, path_to_sbatch in paths:
+        task_ids = parse_sbatch_array(path_to_sbatch)[0]
+        units.extend((run_dir, path_to_sbatch, task_id) for task_id in task_ids)
+    return units
+
+
+def write_shared_arrays(campaign_path, wave, units, partition='sbinlab', max_array_size=1000, array_throttle=100):
+    """Writes the task table and sbatch files of one shared wave.
+
+    units are (entry name, run directory, sbatch file, task id) tuples.
+    Each array gets the largest walltime and memory of its sbatch files.
+    """
+    path_to_tasks = join(campaign_path, f'{wave}_tasks.txt')
+    with open(path_to_tasks, 'w') as fp:
+        for unit in units:
+            fp.write(' '.join(str(field) for field in unit) + '\n')
+    resources = [read_sbatch_resources(path) for path in set(unit[2] for unit in units)]
+    hours = max(resource[0] for resource in resources)
+    mem = max(resource[1] for resource in resources)
+
+    paths_to_sbatch = []
+    chunks = split_array(len(units), max_array_size)
+    for n, (first_task, chunk_tasks) in enumerate(chunks):
+        path_to_sbatch = join(campaign_path, f'{wave}_{n:03}.sbatch')
+        with open(path_to_sbatch, 'w') as fp:
+            fp.write(f'''#!/bin/sh
+#SBATCH --job-name=campaign_{wave}
+#SBATCH --array={array_spec(chunk_tasks, array_throttle)}
+#SBATCH --time={format_slurm_time(hours)}
+#SBATCH --mem {mem}
+#SBATCH --partition={partition}
+
+# runs one array task of a per-protein sbatch file (name, run dir, sbatch, task)
+TASKS={path_to_tasks}
+OFFSET={first_task}
+LINE=`sed -n "$((OFFSET+SLURM_ARRAY_TASK_ID+1))p" $TASKS`
+set -- $LINE
+cd $2
+SLURM_ARRAY_TASK_ID=$4 bash $3
+CODE=$?
+echo "$1 {wave} $3 $4 $CODE" >> {join(campaign_path, 'progress.log')}
+exit $CODE
+''')
+        paths_to_sbatch.append(path_to_sbatch)
+    return paths_to_sbatch
+
+
+def record_campaign_ddg_jobs(folders, units, jobs, campaign_path, max_array_size=1000):
+    """Records the shared ddG arrays in ddg_jobs.txt of every entry.
+
+    The units of one sbatch file are consecutive tasks of an array, so each
+    (array, sbatch file) pair is recorded with its first and last task and
+    the offset of its tasks, for the status and retry modes, together with
+    campaign_path, where the slurm-*.out files of the array are.
+    """
+    for (first_task, chunk_tasks), job in zip(split_array(len(units), max_array_size), jobs):
+        ranges = {}
+        for task in range(chunk_tasks):
+            name, run_dir, path_to_sbatch, task_id = units[first_task + task]
+            ranges.setdefault((name, path_to_sbatch), [task, task, task - int(task_id)])[1] = task
+        for (name, path_to_sbatch), tasks in ranges.items():
+            record_ddg_jobs(folders[name].ddG_run, 0, job.job_id, path_to_sbatch, tasks=tasks,
+                            slurm_dir=campaign_path)
+
+
+def chain_adaptive(folder, scheduler, ddg_jobs):
+    # the adaptive rounds of one entry after the shared ddG wave, then its
+    # parse job, as run_modes.ddg_calculation does for single runs
+    if scheduler.blocking:
+        adaptive.adaptive_in_process(folder, scheduler)
+        return retry.submit_parse(folder, scheduler)
+    return retry.submit_after_ddgs(folder, scheduler, dependencies=ddg_jobs)
+
+
+def write_progress(campaign_path):
+    """Summarises progress.log per protein and wave in progress.tsv."""
+    with open(join(campaign_path, 'entries.json'), 'r') as fp:
+        entries = json.load(fp)
+    total = {}
+    for wave in WAVES:
+        path_to_tasks = join(campaign_path, f'{wave}_tasks.txt')
+        if isfile(path_to_tasks):
+            with open(path_to_tasks, 'r') as fp:
+                for line in fp:
+                    key = (line.split()[0], wave)
+                    total[key] = total.get(key, 0) + 1
+    # later attempts of a task replace earlier ones
+    finished = {}
+    path_to_log = join(campaign_path, 'progress.log')
+    if isfile(path_to_log):
+        with open(path_to_log, 'r') as fp:
+            for line in fp:
+                name, wave, path_to_sbatch, task_id, code = line.split()
+                finished[(name, wave, path_to_sbatch, task_id)] = code
+
+    path_to_progress = join(campaign_path, 'progress.tsv')
+    with open(path_to_progress, 'w') as fp:
+        fp.write('name\tprepared\t' + '\t'.join(f'{wave}_done\t{wave}_failed\t{wave}_total' for wave in WAVES) + '\n')
+        for entry in entries:
+            fields = [entry['name'], str(entry['prepared'])]
+            for wave in WAVES:
+                codes = [code for key, code in finished.items() if key[:2] == (entry['name'], wave)]
+                fields += [str(codes.count('0')), str(len(codes) - codes.count('0')),
+                           str(total.get((entry['name'], wave), 0))]
+            fp.write('\t'.join(fields) + '\n')
+    return path_to_progress
+
+
+def run_campaign(args, argv=None):
+    """Prepares all manifest entries in parallel and submits the shared waves."""
+    if argv == None:
+        argv = sys.argv[1:]
+    campaign_path = os.path.abspath(args.OUTPUT_FILE)
+    os.makedirs(campaign_path, exist_ok=True)
+    entries = read_manifest(args.MANIFEST, strip_campaign_options(argv), campaign_path)
+    logger.info(f'Campaign with {len(entries)} entries in {campaign_path}')
+
+    with ProcessPoolExecutor(max_workers=args.MAX_WORKERS) as pool:
+        results = list(pool.map(prepare_entry, entries))
+    for entry, result in zip(entries, results):
+        entry.update(result)
+        if not entry['prepared']:
+            logger.error(f"Preparation of {entry['name']} failed: {entry['error']}")
+    with open(join(campaign_path, 'entries.json'), 'w') as fp:
+        json.dump(entries, fp, indent=4)
+
+    folders = {entry['name']: folder2(entry['output_path'], True, is_mp=entry['is_mp'])
+               for entry in entries if entry['prepared']}
+    stage_caches = {name: StageCache(folder, enabled=not args.FORCE_STAGES) for name, folder in folders.items()}
+    if args.MAX_RETRIES > 0:
+        logger.warning('Retries are not chained in campaign mode, use --mode resume per protein')
+    adaptive_entries = [name for name, folder in folders.items()
+                        if isfile(join(folder.ddG_input, 'adaptive_ddgs.sbatch'))]
+
+    scheduler = get_scheduler(args.EXECUTOR, max_workers=args.MAX_WORKERS)
+    dependencies = []
+    relaxed = []
+    # entries whose adaptive controller submits their parse job
+    chained = []
+    for wave in WAVES:
+        units = []
+        for name, folder in folders.items():
+            if wave == 'parse_relax' and name not in relaxed:
+                continue
+            if wave in ['parse_shards', 'parse_ddg'] and name in chained:
+                continue
+            entry_units = wave_units(wave, folder, stage_caches[name])
+            if wave == 'relax' and entry_units != []:
+                relaxed.append(name)
+            units.extend((name,) + unit for unit in entry_units)
+        if units == []:
+            clear_outputs([join(campaign_path, f'{wave}_tasks.txt')])
+            continue
+        jobs = [scheduler.submit(path_to_sbatch, campaign_path, dependencies=dependencies)
+                for path_to_sbatch in write_shared_arrays(
+                    campaign_path, wave, units, partition=args.SLURM_PARTITION,
+                    max_array_size=args.SLURM_MAX_ARRAY_SIZE, array_throttle=args.SLURM_ARRAY_THROTTLE)]
+        if wave == 'ddg':
+            record_campaign_ddg_jobs(folders, units, jobs, campaign_path,
+                                     max_array_size=args.SLURM_MAX_ARRAY_SIZE)
+            chained = [name for name in adaptive_entries if name in set(unit[0] for unit in units)]
+            for name in chained:
+                chain_adaptive(folders[name], scheduler, jobs)
+        logger.info(f'Campaign {wave}: {len(units)} tasks in {len(jobs)} arrays')
+        dependencies = jobs
+
+    logger.info(f'Progress per protein: {write_progress(campaign_path)}')
+
+
+if __name__ == '__main__':
+    logger.info(f'Progress per protein: {write_progress(sys.argv[1])}')
@@ -3,15 +3,20 @@ import sys
 import os
 import numpy as np
 
-def compare_mutfile(fasta_seq, path_to_run_folder,prepare_checking,mutation_input=None):
+from sequence_alignment import uniprot_to_structure
+
+def compare_mutfile(fasta_seq, path_to_run_folder,prepare_checking,mutation_input=None,index_map=None):
+    # index_map: the array of structure.muscle_align_to_uniprot, read from
+    # uniprot_index_list.txt if not given
     mutfiles_folder = path_to_run_folder +'/'
     error=False
-    path_to_alignment = os.path.join(prepare_checking, 'uniprot_index_list.txt')
-    #print(path_to_alignment)
-    alignment = np.loadtxt(path_to_alignment)   
-    alignment_dic={}
-    for n in enumerate(alignment):
-        alignment_dic[int(n[1])] = int(n[0]+1)
+    if index_map is None:
+        path_to_alignment = os.path.join(prepare_checking, 'uniprot_index_list.txt')
+        #print(path_to_alignment)
+        alignment = np.loadtxt(path_to_alignment)
+    else:
+        alignment = index_map
+    alignment_dic = uniprot_to_structure(alignment)
          
     
     if mutation_input == None:
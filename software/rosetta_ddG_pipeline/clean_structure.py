@@ -0,0 +1,169 @@
+"""clean_structure.py cleans PDB files in-process, like Rosetta's clean_pdb.py.
+
+clean_pdb(path_to_pdb, chains, out_dir) writes <stem>_<chains>.pdb and
+<stem>_<chain>.fasta to out_dir as `python2 clean_pdb.py path_to_pdb chains`
+does: only the first model and the given chains are kept ('_' for a blank
+chain), modified residues are renamed to their parent residue (MSE
+selenium atoms to sulfur) and written as ATOM, other residues, waters and
+alternative locations after 'A' are dropped, residues without occupied N,
+CA and C atoms are left out, and the residues are renumbered from 1
+(insertion codes removed). With keep_ligand=True (clean_pdb_keep_ligand.py,
+<stem>.pdb<chains>.pdb) the HETATM residues that are not water are kept
+after the protein with their original numbering.
+
+The residue tables are read from Rosetta's amino_acids.py (next to
+clean_pdb.py) if present, so the output matches the script of the
+installed Rosetta tools; otherwise a table of the canonical and common
+modified residues is used. clean_pdbs cleans many files in a process pool.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import ast
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+from os.path import basename, isfile, join
+
+# Local application imports
+from parse_cartesian_functions import aminocodes
+import rosetta_paths
+import structure_model
+
+
+common_modres = {
+    'MSE': 'MET', 'SEP': 'SER', 'TPO': 'THR', 'PTR': 'TYR', 'HYP': 'PRO', 'CSO': 'CYS', 'CSD': 'CYS',
+    'CME': 'CYS', 'CSX': 'CYS', 'OCS': 'CYS', 'CAS': 'CYS', 'MLY': 'LYS', 'M3L': 'LYS', 'KCX': 'LYS',
+    'LLP': 'LYS', 'ALY': 'LYS', 'HIC': 'HIS', 'MLE': 'LEU', 'NLE': 'LEU', 'FME': 'MET',
+}
+
+waters = ['HOH', 'WAT', 'DOD', 'H2O']
+
+
+def residue_tables():
+    """Returns (longer_names, modres) of Rosetta's amino_acids.py, or the
+    canonical residues and common_modres without it."""
+    path_to_tables = join(os.path.dirname(rosetta_paths.path_to_clean_pdb), 'amino_acids.py')
+    if isfile(path_to_tables):
+        try:
+            with open(path_to_tables, 'r') as fp:
+                tree = ast.parse(fp.read())
+            tables = {}
+            for node in tree.body:
+                if isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+                    if node.targets[0].id in ['longer_names', 'modres']:
+                        tables[node.targets[0].id] = ast.literal_eval(node.value)
+            return tables['longer_names'], tables['modres']
+        except (SyntaxError, ValueError, KeyError):
+            pass
+    return dict(aminocodes), common_modres
+
+
+longer_names, modres = residue_tables()
+
+
+def complete_residue(residue_buffer):
+    # only residues with occupied N, CA and C atoms are kept
+    backbone = set(line[12:16] for line in residue_buffer if float(line[55:60]) > 0.0)
+    return set([' N  ', ' CA ', ' C  ']) <= backbone
+
+
+def clean_lines(lines, chains, keep_ligand=False):
+    """Returns the cleaned PDB text and {chain: sequence} of lines."""
+    if chains == '_':
+        chains = ' '
+    pdb_lines = []
+    ligand_lines = []
+    sequences = {}
+    residue_buffer = []
+    residue_letter = ''
+    old_resnum = None
+    count = 1
+
+    def add_residue(count):
+        if residue_buffer == [] or not complete_residue(residue_buffer):
+            return count
+        for line in residue_buffer:
+            pdb_lines.append(line[0:22] + '%4d ' % count + line[27:])
+        sequences[residue_buffer[0][21]] = sequences.get(residue_buffer[0][21], '') + residue_letter
+        return count + 1
+
+    for line in lines:
+        if line[0:6] == 'ENDMDL':
+            break
+        if not (line[0:4] == 'ATOM' or line[0:6] == 'HETATM') or line[21] not in chains:
+            continue
+        line_edit = line
+        resn = line[17:20]
+        if resn in modres:
+            line_edit = 'ATOM  ' + line[6:17] + modres[resn] + line[20:]
+            if resn == 'MSE':
+                if line_edit[12:14] == 'SE':
+                    line_edit = line_edit[0:12] + ' S' + line_edit[14:]
+                if len(line_edit) > 75 and line_edit[76:78] == 'SE':
+                    line_edit = line_edit[0:76] + ' S' + line_edit[78:]
+            resn = modres[resn]
+        if resn not in longer_names:
+            if keep_ligand and line[0:6] == 'HETATM' and resn not in waters and line[16] in ' A':
+                ligand_lines.append(line[:16] + ' ' + line[17:])
+            continue
+
+        resnum = line_edit[22:27]
+        if resnum != old_resnum:
+            count = add_residue(count)
+            residue_buffer = []
+            residue_letter = longer_names[resn]
+        old_resnum = resnum
+
+        if line[16] != ' ':
+            if line[16] != 'A':
+                # only the first alternative location is kept
+                continue
+            line_edit = line_edit[:16] + ' ' + line_edit[17:]
+        residue_buffer.append(line_edit)
+    add_residue(count)
+
+    return ''.join(pdb_lines) + ''.join(ligand_lines) + 'TER\n', sequences
+
+
+def clean_pdb(path_to_pdb, chains, out_dir, keep_ligand=False, cache_model=True):
+    """Writes the cleaned PDB and the FASTA files of path_to_pdb to out_dir.
+
+    Returns the path of the cleaned PDB and {chain: sequence}. With
+    cache_model=True the cleaned structure is added to the structure_model
+    cache, so it is not read again.
+    """
+    with open(path_to_pdb, 'r') as fp:
+        text, sequences = clean_lines(fp.readlines(), chains, keep_ligand=keep_ligand)
+    stem = basename(path_to_pdb)
+    if keep_ligand:
+        path_to_cleaned_pdb = join(out_dir, f'{stem}{chains}.pdb')
+    else:
+        for extension in ['.gz', '.pdb1', '.pdb']:
+            if stem.endswith(extension):
+                stem = stem[:-len(extension)]
+        path_to_cleaned_pdb = join(out_dir, f'{stem}_{chains}.pdb')
+        for chain, sequence in sequences.items():
+            name = f"{stem}_{'_' if chain == ' ' else chain}"
+            with open(join(out_dir, f'{name}.fasta'), 'w') as fp:
+                fp.write(f'>{name}\n{sequence}\n')
+    with open(path_to_cleaned_pdb, 'w') as fp:
+        fp.write(text)
+    key = hashlib.sha256(text.encode()).hexdigest()
+    if cache_model and structure_model.cached_model(key) == None:
+        structure_model.cache_model(key, structure_model.StructureModel.from_text(text, sha256=key))
+    return path_to_cleaned_pdb, sequences
+
+
+def clean_pdb_job(job):
+    # the models would stay in the worker processes
+    return clean_pdb(*job, cache_model=False)
+
+
+def clean_pdbs(jobs, max_workers=None):
+    """Cleans many structures in a process pool; jobs are (path_to_pdb,
+    chains, out_dir) or (path_to_pdb, chains, out_dir, keep_ligand) tuples."""
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(clean_pdb_job, jobs, chunksize=16))
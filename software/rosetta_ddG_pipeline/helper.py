@@ -8,6 +8,7 @@ Date of last major changes: 2020-05-04
 """
 
 # Standard library imports
+import glob
 import logging as logger
 import os
 import shutil
@@ -181,6 +182,74 @@ def check_path(path):
             path=os.path.join(os.getcwd(),path)
     return(path)
 
+def format_slurm_time(hours):
+    # converts a number of hours into the SLURM [HH]H:MM:SS time format
+    minutes = int(round(hours * 60))
+    return f'{minutes // 60}:{minutes % 60:02}:00'
+
+
+def read_sbatch_resources(path_to_sbatch):
+    """Returns the walltime in hours and the memory (MB) requested by an sbatch file.
+
+    Missing requests are returned as 0.
+    """
+    hours = 0
+    mem = 0
+    with open(path_to_sbatch, 'r') as fp:
+        for line in fp:
+            if not line.startswith('#SBATCH'):
+                continue
+            fields = line[len('#SBATCH'):].replace('=', ' ').split()
+            if fields[0] == '--time':
+                days = 0
+                time = fields[1]
+                if '-' in time:
+                    days, time = time.split('-')
+                parts = [int(part) for part in time.split(':')] + [0, 0]
+                hours = 24 * int(days) + parts[0] + parts[1] / 60 + parts[2] / 3600
+            elif fields[0] == '--mem':
+                mem = int(fields[1].rstrip('M'))
+    return hours, mem
+
+
+def read_mutfile(path_to_mutfile):
+    # returns the (residue number, mutant) pairs of a mutfile
+    mutations = []
+    with open(path_to_mutfile, 'r') as fp:
+        for line in fp:
+            fields = line.split()
+            if len(fields) == 3:
+                mutations.append((fields[1], fields[2]))
+    return mutations
+
+
+def split_array(n_tasks, max_array_size=1000):
+    # splits n_tasks array tasks into (first task, number of tasks) chunks
+    # that respect the MaxArraySize of the cluster
+    if max_array_size < 1:
+        raise ValueError(f'max_array_size must be at least 1, not {max_array_size}')
+    return [(start, min(max_array_size, n_tasks - start))
+            for start in range(0, n_tasks, max_array_size)]
+
+
+def array_spec(n_tasks, throttle=0):
+    # --array value incl. the %N throttle of simultaneously running tasks
+    if throttle > 0:
+        return f'0-{n_tasks-1}%{throttle}'
+    return f'0-{n_tasks-1}'
+
+
+def ddg_sbatch_files(ddG_input, basename='rosetta_ddg'):
+    # e.g. rosetta_ddg.sbatch or, for split arrays, all its numbered parts
+    return sorted(glob.glob(join(ddG_input, f'{basename}.sbatch'))
+                  + glob.glob(join(ddG_input, f'{basename}_[0-9][0-9][0-9].sbatch')))
+
+
+def remove_ddg_sbatch_files(ddG_input, basename='rosetta_ddg'):
+    for path_to_sbatch in ddg_sbatch_files(ddG_input, basename=basename):
+        os.remove(path_to_sbatch)
+
+
 def read_slurms(path, printing=False):
     files = [f for f in listdir(path) if isfile(join(path, f))]
     mypath=path
@@ -192,27 +261,24 @@ def read_slurms(path, printing=False):
     slurm_file_warn = []
     nums_warn = []
     nums_canc = []
+    cancelled_tasks = []
     for file in files:
         if str(file[0:5]) == "slurm":
+            # slurm-<job>_<task>.out of array tasks, slurm-<job>.out of
+            # other jobs (e.g. the parse job), which have no task number
+            job_id, _, task = file[6:].split('.')[0].partition('_')
             path = join(mypath, file)
             with open(path) as f:
                 for line in f:
                     if "WARNING" in line:
-                        num_warn = file.split('_')
-                        num_warn = num_warn[1].split('.')
-                        num_warn = num_warn[0]
-
-                        nums_warn.append(num_warn)
+                        nums_warn.append(task if task != '' else job_id)
                         warn.append(line)
                         warnings += 1
                         slurm_file_warn.append(file)
                     if "CANCELLED" in line:
-
-                        num_canc = file.split('_')
-                        num_canc = num_canc[1].split('.')
-                        num_canc = num_canc[0]
-
-                        nums_canc.append(num_canc)
+                        nums_canc.append(task if task != '' else job_id)
+                        if task != '':
+                            cancelled_tasks.append((job_id, int(task)))
                         slurm_file_canc.append(file)
                         canc.append(line)
                         cancels += 1
@@ -238,3 +304,5 @@ def read_slurms(path, printing=False):
                 for n, m in zip(canc, slurm_file_canc):
                     cancelfile.write(m+'\n')
                     cancelfile.write(n+'\n')
+    # (job id, array task id) of all cancelled tasks
+    return list(dict.fromkeys(cancelled_tasks))
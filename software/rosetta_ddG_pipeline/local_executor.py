@@ -0,0 +1,82 @@
+"""local_executor.py runs the generated sbatch files on the local machine.
+
+Array tasks are executed with SLURM_ARRAY_TASK_ID set, so the same scripts
+can be used on workstations and large single nodes without SLURM.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+from concurrent.futures import ProcessPoolExecutor
+import logging as logger
+import os
+from os.path import join
+import subprocess
+import time
+
+
+def parse_sbatch_array(path_to_sbatch):
+    """Returns the array task ids and the %N throttle of an sbatch file.
+
+    Scripts without an --array directive are treated as a single task 0.
+    """
+    task_ids = [0]
+    throttle = None
+    with open(path_to_sbatch, 'r') as fp:
+        for line in fp:
+            if line.startswith('#SBATCH') and '--array' in line:
+                spec = line.split('--array')[1].strip().lstrip('=').split()[0]
+                if '%' in spec:
+                    spec, throttle = spec.split('%')
+                    throttle = int(throttle)
+                task_ids = []
+                for elem in spec.split(','):
+                    if '-' in elem:
+                        start, end = elem.split('-')
+                        task_ids.extend(range(int(start), int(end) + 1))
+                    else:
+                        task_ids.append(int(elem))
+    return task_ids, throttle
+
+
+def run_array_task(path_to_sbatch, task_id, job_id, cwd, args=''):
+    # Output is written to slurm-<job>_<task>.out like SLURM does, so
+    # helper.read_slurms works on local runs as well
+    env = dict(os.environ)
+    env.update({'SLURM_ARRAY_TASK_ID': str(task_id),
+                'SLURM_ARRAY_JOB_ID': str(job_id),
+                'SLURM_JOB_ID': str(job_id),
+                'OMP_NUM_THREADS': '1'})
+    with open(join(cwd, f'slurm-{job_id}_{task_id}.out'), 'w') as out:
+        process = subprocess.run(['bash', path_to_sbatch] + args.split(), cwd=cwd, env=env,
+                                 stdout=out, stderr=subprocess.STDOUT)
+    return process.returncode
+
+
+def run_sbatch_locally(path_to_sbatch, cwd, max_workers=None, args=''):
+    """Runs all array tasks of an sbatch file on a bounded process pool.
+
+    The pool is sized to the number of cores (or max_workers), and never
+    larger than the number of tasks or the %N throttle of the array. The
+    call blocks until all tasks are finished, which keeps the order of
+    consecutive stages. Returns the job id and the ids of failed tasks.
+    """
+    task_ids, throttle = parse_sbatch_array(path_to_sbatch)
+    if max_workers == None:
+        max_workers = os.cpu_count()
+    max_workers = min(max_workers, len(task_ids))
+    if throttle != None:
+        max_workers = min(max_workers, throttle)
+    job_id = int(time.time() * 1000)
+
+    logger.info(f'Running {path_to_sbatch} locally: {len(task_ids)} tasks on {max_workers} processes')
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        return_codes = list(pool.map(run_array_task, [path_to_sbatch] * len(task_ids),
+                                     task_ids, [job_id] * len(task_ids), [cwd] * len(task_ids),
+                                     [args] * len(task_ids)))
+
+    failed = [task_id for task_id, code in zip(task_ids, return_codes) if code != 0]
+    if failed != []:
+        logger.warning(f'{len(failed)} tasks of {path_to_sbatch} failed: {failed}')
+    return job_id, failed
@@ -13,16 +13,14 @@ import sys
 
 
 # Local application imports
-from helper import AttrDict, create_copy
+from helper import AttrDict, array_spec, create_copy, format_slurm_time, remove_ddg_sbatch_files, split_array
 from prism_rosetta_parser import rosetta_to_prism
 import rosetta_paths
 
 
-def rosetta_ddg_mp_pyrosetta(folder, mut_dict, SLURM=True, sys_name='',
-                             partition='sbinlab', output_name='ddG.out', 
-                             add_output_name='ddG_additional.out', repack_radius=0,
-                             lipids='DLPC', temperature=37.0, repeats=3,
-                             score_file_name='scores', is_pH=0, pH_value=7):
+def mp_ddg_command(folder, output_name='ddG.out', add_output_name='ddG_additional.out', repack_radius=0,
+                   lipids='DLPC', temperature=37.0, repeats=3, score_file_name='scores', is_pH=0, pH_value=7):
+    # the ddG command of all residues, without --res and --mut
     ddg_script_exec = os.path.join(
         rosetta_paths.path_to_stability_pipeline, 'rosetta_mp_ddG_adapted.py')
     input_struc = os.path.join(folder.ddG_input, 'input.pdb')
@@ -46,29 +44,68 @@ def rosetta_ddg_mp_pyrosetta(folder, mut_dict, SLURM=True, sys_name='',
                    f' --lipids {lipids}'
                    f' --temperature {temperature}'
                    '')
+    return ddG_command
+
+
+def rosetta_ddg_mp_pyrosetta(folder, mut_dict, SLURM=True, sys_name='',
+                             partition='sbinlab', output_name='ddG.out', 
+                             add_output_name='ddG_additional.out', repack_radius=0,
+                             lipids='DLPC', temperature=37.0, repeats=3,
+                             score_file_name='scores', is_pH=0, pH_value=7,
+                             max_array_size=1000, array_throttle=100, basename='rosetta_ddg',
+                             hours=32, mem=5000, runtime_model=None, max_hours=168):
+    ddG_command = mp_ddg_command(folder, output_name=output_name, add_output_name=add_output_name,
+                                 repack_radius=repack_radius, lipids=lipids, temperature=temperature,
+                                 repeats=repeats, score_file_name=score_file_name, is_pH=is_pH,
+                                 pH_value=pH_value)
 
     if SLURM:
-        path_to_sbatch = os.path.join(folder.ddG_input, 'rosetta_ddg.sbatch')
-        with open(path_to_sbatch, 'w') as fp:
-            fp.write(f'''#!/bin/sh
+        resids = list(mut_dict.keys())
+        muts = list(mut_dict.values())
+        # walltime requests are clamped to max_hours, the partition limit
+        if runtime_model == None and hours > max_hours:
+            logger.warning(f'MP ddG tasks need up to {hours} h; requesting {max_hours} h, tasks may time out')
+        # arrays larger than MaxArraySize are split into several sbatch
+        # files, each starting at its own OFFSET into the residue list
+        chunks = split_array(len(resids), max_array_size)
+        remove_ddg_sbatch_files(folder.ddG_input, basename=basename)
+        cpu_hours = 0
+        paths_to_sbatch = []
+        for n, (first_task, chunk_tasks) in enumerate(chunks):
+            if len(chunks) == 1:
+                path_to_sbatch = os.path.join(folder.ddG_input, f'{basename}.sbatch')
+            else:
+                path_to_sbatch = os.path.join(folder.ddG_input, f'{basename}_{n:03}.sbatch')
+            if runtime_model != None:
+                # one task per residue, each running all its mutations
+                hours, mem, chunk_cpu_hours = runtime_model.request(
+                    [[resids[index]] * len(muts[index]) for index in range(first_task, first_task + chunk_tasks)])
+                cpu_hours += chunk_cpu_hours
+            with open(path_to_sbatch, 'w') as fp:
+                fp.write(f'''#!/bin/sh
 #SBATCH --job-name=mp_ddG_{sys_name}
-#SBATCH --array=0-{len(mut_dict.keys())}
-#SBATCH --time=32:00:00
-#SBATCH --mem 5000
+#SBATCH --array={array_spec(chunk_tasks, array_throttle)}
+#SBATCH --time={format_slurm_time(min(hours, max_hours))}
+#SBATCH --mem {mem}
 #SBATCH --partition={partition}
 #SBATCH --nice
-RESIS=({' '.join(mut_dict.keys())})
-MUTS=({' '.join(mut_dict.values())})
-OFFSET=0
+RESIS=({' '.join(resids)})
+MUTS=({' '.join(muts)})
+OFFSET={first_task}
 INDEX=$((OFFSET+SLURM_ARRAY_TASK_ID))
 echo $INDEX
 
 # launching rosetta
 ''')
-            new_ddG_command = ddG_command + \
-                ' --res ${RESIS[$INDEX]} --mut ${MUTS[$INDEX]} '
-            fp.write(new_ddG_command)
-        logger.info(path_to_sbatch)
+                new_ddG_command = ddG_command + \
+                    ' --res ${RESIS[$INDEX]} --mut ${MUTS[$INDEX]} '
+                fp.write(new_ddG_command)
+            logger.info(path_to_sbatch)
+            paths_to_sbatch.append(path_to_sbatch)
+        if runtime_model != None:
+            logger.info(f'Estimated cost of {len(resids)} MP ddG tasks: {cpu_hours:.1f} CPU-hours')
+            print(f'Estimated cost of {len(resids)} MP ddG tasks: {cpu_hours:.1f} CPU-hours')
+        return paths_to_sbatch
 
     else:
         logger.warn("need to write the script!")
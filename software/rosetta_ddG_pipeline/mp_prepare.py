@@ -11,7 +11,6 @@ import io
 import logging as logger
 import os
 import subprocess
-import sys
 
 # Third party imports
 from Bio import PDB
@@ -118,24 +117,17 @@ def mp_TMalign_opm(reference_chain, target, filename, target_chain='A',
 
 
 
-def mp_span_from_pdb_octopus(pdbinput, outdir_path, SLURM=False):
+def mp_span_from_pdb_octopus(pdbinput, outdir_path):
 
     Rosetta_span_exec = os.path.join(
         rosetta_paths.path_to_rosetta, 'bin/spanfile_from_pdb.{rosetta_paths.Rosetta_extension}')
     span_command = f'{Rosetta_span_exec} -in:file:s {pdbinput}'
     logger.info(f"Span call function: {span_command}")
 
-    if SLURM:
-        logger.warn("need to write the slurm script!")
-        span_call = subprocess.Popen('sbatch rosetta_span.sbatch', stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
-        span_process_id_info = span_call.communicate()
-        span_process_id = str(span_process_id_info[0]).split()[3][0:-3]
-        logger.info(span_process_id_info)
-    else:
-        span_call = subprocess.Popen(
-            span_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
-        span_process_id_info = span_call.communicate()
+    # span files are quick to calculate and always run in-process
+    span_call = subprocess.Popen(
+        span_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
+    span_process_id_info = span_call.communicate()
 
     with open(os.path.join(outdir_path, 'span.log'), 'w') as fp:
         fp.writelines(span_process_id_info[0].decode())
@@ -154,7 +146,7 @@ def mp_span_from_pdb_octopus(pdbinput, outdir_path, SLURM=False):
         return spanfiles
 
 
-def mp_span_from_pdb_dssp(pdbinput, outdir_path, thickness=15, SLURM=False):
+def mp_span_from_pdb_dssp(pdbinput, outdir_path, thickness=15):
     """
     Calculates the membrane spanning Rosetta input file for membrane proteins using the pdb orientation and dssp. 
     Rosetta scripts used: mp_span_from_pdb
@@ -174,18 +166,10 @@ def mp_span_from_pdb_dssp(pdbinput, outdir_path, thickness=15, SLURM=False):
                     '')
     logger.info(f"Span call function: {span_command}")
 
-    if SLURM:
-        logger.warn("need to write the slurm script!")
-        sys.exit()
-        span_call = subprocess.Popen('sbatch rosetta_span.sbatch', stdout=subprocess.PIPE,
-                                     stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
-        span_process_id_info = span_call.communicate()
-        span_process_id = str(span_process_id_info[0]).split()[3][0:-3]
-        logger.info(span_process_id_info)
-    else:
-        span_call = subprocess.Popen(
-            span_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
-        span_process_id_info = span_call.communicate()
+    # span files are quick to calculate and always run in-process
+    span_call = subprocess.Popen(
+        span_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True, cwd=outdir_path)
+    span_process_id_info = span_call.communicate()
 
     with open(os.path.join(outdir_path, 'span.log'), 'w') as fp:
         fp.writelines(span_process_id_info[0].decode())
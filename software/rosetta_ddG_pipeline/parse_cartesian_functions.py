@@ -1,91 +1,324 @@
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import pandas as pd
 import scipy
 import os
 import json
+import zlib
 
-def rosetta_cartesian_read(pathtofile, protein_seq='abcd'):
-    score_file = open(pathtofile, "r")
-    score_data = score_file.readlines()
-    score_file.close()
-
-    aminocodes = {
-        "ALA": "A",
-        "CYS": "C",
-        "ASP": "D",
-        "GLU": "E",
-        "PHE": "F",
-        "GLY": "G",
-        "HIS": "H",
-        "ILE": "I",
-        "LYS": "K",
-        "LEU": "L",
-        "MET": "M",
-        "ASN": "N",
-        "PRO": "P",
-        "GLN": "Q",
-        "ARG": "R",
-        "SER": "S",
-        "THR": "T",
-        "VAL": "V",
-        "TRP": "W",
-        "TYR": "Y"
-    }
-
-    cartesian_scores = {}
-    #print(len(protein_seq))
-    for line in score_data:
-        score_fields = line.split()
-        description = score_fields[2]
-        three_letter_code = description[-4:-1]
-        one_letter = aminocodes[three_letter_code]
-        res_number = description[4:-4]
-        dg = float(score_fields[3])
-
-        key = protein_seq[int(res_number) - 1] + res_number + one_letter
-
-        if key in cartesian_scores:
-            cartesian_scores[key].append(dg)
+aa_order = 'ACDEFGHIKLMNPQRSTVWY'
+
+aminocodes = {
+    "ALA": "A",
+    "CYS": "C",
+    "ASP": "D",
+    "GLU": "E",
+    "PHE": "F",
+    "GLY": "G",
+    "HIS": "H",
+    "ILE": "I",
+    "LYS": "K",
+    "LEU": "L",
+    "MET": "M",
+    "ASN": "N",
+    "PRO": "P",
+    "GLN": "Q",
+    "ARG": "R",
+    "SER": "S",
+    "THR": "T",
+    "VAL": "V",
+    "TRP": "W",
+    "TYR": "Y"
+}
+
+
+def read_ddg_rows(score_data, protein_seq, terms=False):
+    """Parses cartesian_ddg lines into a table with one row per round.
 
+    score_data are lines like 'COMPLEX:   Round2: MUT_104ALA:  -345.6 ...'.
+    The columns are position, wt (from protein_seq), mutant, dg and
+    replicate; WT_ lines and other rows are dropped. protein_seq None
+    leaves out wt and keeps all positions. With terms=True the
+    energy terms after dg ('fa_atr: -1234.5 ...') are added as columns.
+    """
+    rows = pd.Series(list(score_data), dtype=str).str.extract(
+        r'Round(\d+):\s+MUT_(\d+)([A-Z]{3}):?\s+(\S+)(.*)').dropna()
+    table = pd.DataFrame({'position': rows[1].astype(int).values,
+                          'mutant': rows[2].map(aminocodes).values,
+                          'dg': rows[3].astype(float).values,
+                          'replicate': rows[0].astype(int).values})
+    if terms and len(rows) > 0:
+        # usually all lines have the same terms in the same order
+        tokens = rows[4].str.split()
+        names = tokens.iloc[0][::2]
+        regular = (tokens.str.len() == 2 * len(names)).all()
+        if regular:
+            tokens = np.array(tokens.tolist(), dtype=str).reshape(len(rows), -1)
+            regular = (tokens[:, ::2] == np.array(names)).all()
+        if regular:
+            energies = pd.DataFrame(tokens[:, 1::2].astype(float), columns=[name.rstrip(':') for name in names])
         else:
-            cartesian_scores[protein_seq[int(res_number) - 1 ] + res_number
-                             + one_letter] = [dg]
-    #print(cartesian_scores)
-    return cartesian_scores
+            pairs = rows[4].str.extractall(r'([A-Za-z_]\w*):\s+(\S+)')
+            energies = pairs.set_index(0, append=True)[1].droplevel('match').astype(float).unstack()
+            energies = energies.reindex(rows.index)
+        for term in energies.columns:
+            table[term] = energies[term].values
+    if protein_seq == None:
+        # without the sequence (e.g. counting rounds) there is no wt column
+        return table[table['mutant'].notna()].reset_index(drop=True)
+    table = table[table['mutant'].notna() & (table['position'] <= len(protein_seq))]
+    table.insert(1, 'wt', np.array(list(protein_seq))[table['position'].values - 1])
+    return table.reset_index(drop=True)
+
+
+def ddg_sums(table):
+    # count, sum and sum of squares of dG per variant, which add up over batches
+    return table.assign(dg2=table['dg'] ** 2).groupby(['position', 'wt', 'mutant'], sort=True).agg(
+        count=('dg', 'count'), sum=('dg', 'sum'), sumsq=('dg2', 'sum')).reset_index()
+
+
+def add_ddg_sums(sums, new_sums):
+    return pd.concat([sums, new_sums]).groupby(['position', 'wt', 'mutant'], sort=True)[
+        ['count', 'sum', 'sumsq']].sum().reset_index()
+
+
+def ddg_statistics_from_sums(sums):
+    """Mean and std of the mutant-minus-WT dG per variant, scaled by 1/2.9.
+
+    The WT reference of a position is the mean dG of the variant that
+    mutates to the native residue; variants without it get NaN.
+    """
+    stats = sums.copy()
+    stats['mean'] = stats['sum'] / stats['count']
+    variance = (stats['sumsq'] - stats['sum'] * stats['mean']).clip(lower=0) / (stats['count'] - 1)
+    stats['std'] = np.sqrt(variance.where(stats['count'] > 1))
+    wt_dg = stats[stats['wt'] == stats['mutant']].set_index('position')['mean']
+    stats['ddg'] = (stats['mean'] - stats['position'].map(wt_dg)) / 2.9
+    stats['ddg_std'] = stats['std'] / 2.9
+    stats['variant'] = stats['wt'] + stats['position'].astype(str) + stats['mutant']
+    return stats
+
+
+def ddg_statistics(table):
+    return ddg_statistics_from_sums(ddg_sums(table))
+
+
+def ddg_matrix(stats, length):
+    # L x 20 ddG matrix (columns in aa_order), NaN where no variant was run
+    matrix = np.full((length, 20), np.nan)
+    valid = stats[stats['ddg'].notna()]
+    matrix[valid['position'].values - 1, [aa_order.index(aa) for aa in valid['mutant']]] = valid['ddg'].values
+    return matrix
+
+
+def ddg_matrix_frame(matrix):
+    # the ddg_matrix as a mutant x position DataFrame, as plotted by simple_plot_heatmap
+    return pd.DataFrame(matrix.T, index=list(aa_order), columns=np.arange(1, len(matrix) + 1))
+
+
+def read_ddg_matrix(path_to_matrix):
+    # the ddg_matrix saved by parse_rosetta_ddgs (<sys_name>_ddg_matrix.npy)
+    return np.load(path_to_matrix)
+
+
+def format_ddg_matrix(matrix, missing='-'):
+    """Formats the ddg_matrix as the rows of the per-position table.
+
+    Values are formatted like '{:.3}' (3 significant digits, '1.0' and
+    '1e+02' rather than '1' and '100'), with missing for NaN, all cells at
+    once; the rows are 'position\\t value\\t value ...'.
+    """
+    cells = np.char.mod('%.3g', matrix)
+    scientific = np.char.mod('%.2e', matrix)
+    exponents = np.char.partition(scientific, 'e')[..., 2]
+    # '{:.3}' already switches to the exponent notation at 1e+02
+    hundreds = np.char.replace(np.char.replace(scientific, '.00e', 'e'), '0e', 'e')
+    cells = np.where(exponents == '+02', hundreds, cells)
+    integral = (np.char.find(cells, '.') < 0) & (np.char.find(cells, 'e') < 0)
+    cells = np.where(integral, np.char.add(cells, '.0'), cells)
+    cells = np.where(np.isnan(matrix), missing, cells)
+    rows = np.arange(1, len(matrix) + 1).astype(str)
+    for column in cells.T:
+        rows = np.char.add(np.char.add(rows, '\t '), column)
+    return rows
+
+
+def read_ddg_lines(path_to_ddg, offset=0):
+    """Returns the complete lines after offset without the WT rows (like
+    grep -v WT), and the offset after the last complete line."""
+    with open(path_to_ddg, 'rb') as fp:
+        fp.seek(offset)
+        data = fp.read()
+    end = data.rfind(b'\n') + 1
+    lines = [line for line in data[:end].decode().splitlines() if 'WT' not in line]
+    return lines, offset + end
+
+
+def ddg_files(ddG_run):
+    return sorted(entry.path for entry in os.scandir(ddG_run) if entry.name.endswith('.ddg'))
+
+
+def stream_ddg_tables(paths, protein_seq, offsets={}, max_workers=16, batch_size=500, terms=False):
+    """Yields (read_ddg_rows table, end offsets) for batches of .ddg files.
+
+    Each file is read from offsets[path] (default 0) on. The files are read
+    by a thread pool, as reading many small files from network file systems
+    is I/O-bound, and parsed batch by batch without an intermediate file.
+    """
+    lines = []
+    end_offsets = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(read_ddg_lines, paths, [offsets.get(path, 0) for path in paths])
+        for n, (path, (file_lines, end)) in enumerate(zip(paths, results), 1):
+            lines.extend(file_lines)
+            end_offsets[path] = end
+            if n % batch_size == 0:
+                yield read_ddg_rows(lines, protein_seq, terms=terms), end_offsets
+                lines = []
+                end_offsets = {}
+    if end_offsets != {}:
+        yield read_ddg_rows(lines, protein_seq, terms=terms), end_offsets
+
+
+def read_ddg_run(ddG_run, protein_seq, max_workers=16):
+    # all rounds of all .ddg files in ddG_run as one table
+    tables = [table for table, end_offsets in stream_ddg_tables(ddg_files(ddG_run), protein_seq,
+                                                                max_workers=max_workers)]
+    if tables == []:
+        return read_ddg_rows([], protein_seq)
+    return pd.concat(tables, ignore_index=True)
+
+
+def ddg_shard(name, n_shards):
+    # the shard of a .ddg file; stable when files are added to the run
+    return zlib.crc32(name.encode()) % n_shards
+
+
+def parse_state_paths(ddG_run, shard=None):
+    # manifest and aggregate of the whole run, or of shard (index, n_shards)
+    if shard == None:
+        return os.path.join(ddG_run, 'parse_manifest.json'), os.path.join(ddG_run, 'parse_aggregate.csv')
+    path_to_shards = os.path.join(ddG_run, 'parse_shards')
+    return (os.path.join(path_to_shards, f'parse_manifest_{shard[0]}.json'),
+            os.path.join(path_to_shards, f'parse_aggregate_{shard[0]}.csv'))
+
+
+def write_parse_state(ddG_run, manifest, sums, store=None, shard=None):
+    # written to temporary files first, so a killed parser leaves a consistent
+    # state; the manifest comes last, as it marks the lines as parsed
+    path_to_manifest, path_to_aggregate = parse_state_paths(ddG_run, shard=shard)
+    os.makedirs(os.path.dirname(path_to_manifest), exist_ok=True)
+    manifest.pop('store_rows', None)
+    if store != None:
+        store.write()
+        manifest['store_rows'] = len(store)
+    sums.to_csv(path_to_aggregate + '.tmp', index=False)
+    with open(path_to_manifest + '.tmp', 'w') as fp:
+        json.dump(manifest, fp)
+    os.replace(path_to_aggregate + '.tmp', path_to_aggregate)
+    os.replace(path_to_manifest + '.tmp', path_to_manifest)
+
+
+def update_ddg_aggregate(ddG_run, protein_seq, max_workers=16, store=None, shard=None, write=True):
+    """Returns the ddg_statistics of ddG_run, reading only new or grown .ddg files.
+
+    parse_manifest.json keeps size, mtime and the parsed byte offset of
+    every file, parse_aggregate.csv the ddg_sums of all parsed lines.
+    Files that shrank, were rewritten or removed trigger a full rebuild.
+    The rows read, with their energy terms, are also appended to store
+    (a result_store.ReplicateStore) if given; the manifest records its
+    length, so rows of an interrupted parse are dropped.
+    With shard=(index, n_shards) only the files of that shard (ddg_shard)
+    are parsed, into parse_shards/parse_manifest_<index>.json and
+    parse_shards/parse_aggregate_<index>.csv (see merge_ddg_shards).
+    With write=False the new lines are only parsed in memory and nothing
+    is written (e.g. for status reports while the parser runs).
+    """
+    path_to_manifest, path_to_aggregate = parse_state_paths(ddG_run, shard=shard)
+    manifest = {'sequence': protein_seq, 'files': {}}
+    sums = ddg_sums(read_ddg_rows([], protein_seq))
+    if os.path.isfile(path_to_manifest) and os.path.isfile(path_to_aggregate):
+        with open(path_to_manifest, 'r') as fp:
+            manifest = json.load(fp)
+        sums = pd.read_csv(path_to_aggregate, dtype={'wt': str, 'mutant': str})
+
+    files = {entry.name: entry.stat() for entry in os.scandir(ddG_run) if entry.name.endswith('.ddg')
+             and (shard == None or ddg_shard(entry.name, shard[1]) == shard[0])}
+    for name, (size, mtime, offset) in manifest['files'].items():
+        if (name not in files or files[name].st_size < size
+                or (files[name].st_size == size and files[name].st_mtime != mtime)):
+            manifest['files'] = {}
+            break
+    if (manifest['sequence'] != protein_seq or manifest['files'] == {}
+            or (store != None and not store.matches(protein_seq, manifest.get('store_rows')))):
+        manifest = {'sequence': protein_seq, 'files': {}}
+        sums = ddg_sums(read_ddg_rows([], protein_seq))
+        if store != None:
+            store.reset(protein_seq)
+
+    offsets = {}
+    for name, stat in files.items():
+        if name not in manifest['files'] or stat.st_size > manifest['files'][name][0]:
+            offsets[os.path.join(ddG_run, name)] = manifest['files'].get(name, [0, 0, 0])[2]
+    for table, end_offsets in stream_ddg_tables(sorted(offsets), protein_seq, offsets=offsets,
+                                                max_workers=max_workers, terms=store != None):
+        sums = add_ddg_sums(sums, ddg_sums(table))
+        if store != None:
+            store.append(table)
+        for path, end in end_offsets.items():
+            stat = files[os.path.basename(path)]
+            manifest['files'][os.path.basename(path)] = [stat.st_size, stat.st_mtime, end]
+
+    if write:
+        write_parse_state(ddG_run, manifest, sums, store=store, shard=shard)
+    return ddg_statistics_from_sums(sums)
+
+
+def merge_ddg_shards(ddG_run, protein_seq, n_shards, store=None, shard_stores=None):
+    """Returns the ddg_statistics of the n_shards shard parses of ddG_run.
+
+    The shard aggregates (and the shard_stores, one ReplicateStore per
+    shard, into store) are merged into the parse state of the whole run,
+    so later update_ddg_aggregate calls continue incrementally from it.
+    """
+    manifest = {'sequence': protein_seq, 'files': {}}
+    sums = ddg_sums(read_ddg_rows([], protein_seq))
+    if store != None:
+        store.reset(protein_seq)
+    for index in range(n_shards):
+        path_to_manifest, path_to_aggregate = parse_state_paths(ddG_run, shard=(index, n_shards))
+        if not os.path.isfile(path_to_manifest):
+            raise ValueError(f'Shard {index} of {ddG_run} was not parsed')
+        with open(path_to_manifest, 'r') as fp:
+            shard_manifest = json.load(fp)
+        if shard_manifest['sequence'] != protein_seq:
+            raise ValueError(f'Shard {index} of {ddG_run} was parsed with another sequence')
+        manifest['files'].update(shard_manifest['files'])
+        sums = add_ddg_sums(sums, pd.read_csv(path_to_aggregate, dtype={'wt': str, 'mutant': str}))
+        if store != None:
+            if not shard_stores[index].matches(protein_seq, shard_manifest.get('store_rows')):
+                raise ValueError(f'Shard {index} of {ddG_run} has no replicate store')
+            store.extend(shard_stores[index].columns)
+
+    write_parse_state(ddG_run, manifest, sums, store=store)
+    return ddg_statistics_from_sums(sums)
+
+
+def rosetta_cartesian_read(pathtofile, protein_seq='abcd'):
+    with open(pathtofile, 'r') as score_file:
+        table = read_ddg_rows(score_file, protein_seq)
+    keys = table['wt'] + table['position'].astype(str) + table['mutant']
+    return {key: list(dgs) for key, dgs in table.groupby(keys, sort=False)['dg']}
 
 
 def ddgs_from_dg(dictionary_of_dGs):
-    wt_dGs = {}
-    #with open(structure_input) as json_file:
-    #    strucdata = json.load(json_file)
-        
-    for entry in dictionary_of_dGs:
-
-        if entry[0] == entry[-1]:
-
-            residue_number = entry[1:-1]
-            for item in dictionary_of_dGs[entry]:
-                if residue_number in wt_dGs:
-                    wt_dGs[residue_number].append(float(item))
-
-                else:
-                    wt_dGs[residue_number] = [float(item)]
-
-    ddgs = {}
-    dgs_as_floats = {}
-    for mutation in dictionary_of_dGs:
-        dgs_as_floats[mutation] = []
-        for value in dictionary_of_dGs[mutation]:
-            dgs_as_floats[mutation].append(float(value))
-
-    for mutation in dictionary_of_dGs:
-        #resdata=structure_input
-        #print(resdata)
-        #num=int(mutation[1:-1])
-        residue_number = mutation[1:-1]
-        
-        ddgs[mutation] = np.divide((np.mean(dgs_as_floats[mutation]) - np.mean(wt_dGs[residue_number])), 2.9)
-
-    return ddgs
+    variants = list(dictionary_of_dGs)
+    table = pd.DataFrame({'position': [int(variant[1:-1]) for variant in variants for item in dictionary_of_dGs[variant]],
+                          'wt': [variant[0] for variant in variants for item in dictionary_of_dGs[variant]],
+                          'mutant': [variant[-1] for variant in variants for item in dictionary_of_dGs[variant]],
+                          'dg': [float(item) for variant in variants for item in dictionary_of_dGs[variant]]})
+    ddgs = ddg_statistics(table).set_index('variant')['ddg']
+    return {variant: ddgs[variant] for variant in variants}
 
 
 def postprocess_rosetta_ddg_prism_copy(folder, output_name='ddG.out', sys_name='', uniprot='', version=1, prims_nr='XXX'):
@@ -0,0 +1,71 @@
+"""parse_shards.py parses the .ddg files of large cartesian ddG runs as a job array.
+
+With --parse_shards N, parse_shards.sbatch runs N map tasks before the
+parse job. Task i parses the .ddg files of shard i (parse_cartesian_functions.ddg_shard)
+incrementally into ddG/run/parse_shards/ (manifest, aggregate and replicate
+store of the shard). The parse job (parse_ddgs.sbatch) is the reduce
+task: it merges the shards into the replicate store and parse state of
+the whole run and writes the outputs from them, so its runtime no longer
+grows with the number of .ddg files.
+
+    python3 parse_shards.py ddG_run sequence n_shards index
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import os
+from os.path import join
+import sys
+
+# Local application imports
+from parse_cartesian_functions import merge_ddg_shards, update_ddg_aggregate
+from result_store import ReplicateStore
+import rosetta_paths
+
+
+def shard_store(ddG_run, index):
+    return ReplicateStore(join(ddG_run, 'parse_shards', f'ddg_replicates_{index}'))
+
+
+def parse_shard(ddG_run, protein_seq, n_shards, index):
+    """Map task: parses the .ddg files of shard index; returns their ddg_statistics."""
+    return update_ddg_aggregate(ddG_run, protein_seq, store=shard_store(ddG_run, index),
+                                shard=(index, n_shards))
+
+
+def reduce_shards(ddG_run, ddG_output, protein_seq, n_shards):
+    """Reduce task: returns the ddg_statistics of all shards, which are
+    merged into the parse state and replicate store of the run."""
+    return merge_ddg_shards(ddG_run, protein_seq, n_shards,
+                            store=ReplicateStore(join(ddG_output, 'ddg_replicates')),
+                            shard_stores=[shard_store(ddG_run, index) for index in range(n_shards)])
+
+
+def write_parse_shards_sbatch(folder, sequence, n_shards, sys_name='', partition='sbinlab'):
+    """Writes the map array parse_shards.sbatch to folder.ddG_input."""
+    path_to_sbatch = join(folder.ddG_input, 'parse_shards.sbatch')
+    with open(path_to_sbatch, 'w') as fp:
+        fp.write(f'''#!/bin/sh
+#SBATCH --job-name={sys_name}_p-shard
+#SBATCH --array=0-{n_shards - 1}
+#SBATCH --time=0:10:00
+#SBATCH --mem 4000
+#SBATCH --partition={partition}
+
+# parses shard $SLURM_ARRAY_TASK_ID of the .ddg files
+''')
+        fp.write(f'python3 {join(rosetta_paths.path_to_stability_pipeline, "parse_shards.py")} '
+                 f'{folder.ddG_run} {sequence} {n_shards} $SLURM_ARRAY_TASK_ID')
+    return path_to_sbatch
+
+
+def remove_parse_shards_sbatch(folder):
+    path_to_sbatch = join(folder.ddG_input, 'parse_shards.sbatch')
+    if os.path.isfile(path_to_sbatch):
+        os.remove(path_to_sbatch)
+
+
+if __name__ == '__main__':
+    parse_shard(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
@@ -1,8 +1,9 @@
 import json
 import sys
 from os.path import join
-import subprocess
-from parse_cartesian_functions import rosetta_cartesian_read, ddgs_from_dg
+from result_store import ReplicateStore
+from parse_cartesian_functions import update_ddg_aggregate
+from parse_shards import reduce_shards
 import numpy as np
 import re
 import seaborn as sns
@@ -38,20 +39,21 @@ def csv_to_prism(data,structure_input,chain_id):
             prism_data.write('#\t chain_id: '+ chain_id+"\n")
             data.to_csv(prism_data, index = False,sep=' ')
 
-def parse_rosetta_ddgs(sys_name, chain_id, fasta_seq, ddG_run, ddG_output, structure_input):
+def parse_rosetta_ddgs(sys_name, chain_id, fasta_seq, ddG_run, ddG_output, structure_input, n_shards=0):
 
     path_to_run_folder = ddG_run
     print('the path to run folder is')
     print(path_to_run_folder)
 
-    rosetta_summary_file = f'{sys_name}_{chain_id}.rosetta_cartesian.dgs'
-    shell_command = f'cat *.ddg | grep -v WT > {rosetta_summary_file}'
-    print('calling to the shell:')
-    print(shell_command)
-    subprocess.call(shell_command, cwd=path_to_run_folder, shell=True)
-
-    rosetta_cartesian_ddgs_dict = ddgs_from_dg(rosetta_cartesian_read(
-        join(path_to_run_folder, rosetta_summary_file), fasta_seq))
+    if n_shards > 0:
+        # the .ddg files were parsed by the map tasks of parse_shards.sbatch
+        stats = reduce_shards(path_to_run_folder, ddG_output, fasta_seq, n_shards)
+    else:
+        stats = update_ddg_aggregate(path_to_run_folder, fasta_seq,
+                                     store=ReplicateStore(join(ddG_output, 'ddg_replicates')))
+    if stats['ddg'].isna().any():
+        print('no WT reference for:', ' '.join(stats.loc[stats['ddg'].isna(), 'variant']))
+        stats = stats[stats['ddg'].notna()]
     protein_sequence=fasta_seq 
     aa_order_alphabetical = pd.Series(["A", "C", "D", "E", "F", "G", "H", "I", "K", "L", "M",
            "N", "P", "Q", "R", "S", "T", "V", "W", "Y"])
@@ -79,11 +81,7 @@ def parse_rosetta_ddgs(sys_name, chain_id, fasta_seq, ddG_run, ddG_output, struc
     PROTEIN_NAME=protein_name
     ddg_sequence=fasta_seq
 
-    ddgs=rosetta_cartesian_ddgs_dict
-    numpy_array = np.zeros(shape = (len(ddgs), 2))
-    output_df = pd.DataFrame(numpy_array, columns = ["variant", "Rosetta_ddg_score"])
-    output_df["variant"] = ddgs.keys()
-    output_df["Rosetta_ddg_score"] = ddgs.values()
+    output_df = pd.DataFrame({"variant": stats["variant"].values, "Rosetta_ddg_score": stats["ddg"].values})
     output_filename = PROTEIN_NAME+"_"+uniprot_accession_name+"_" + pdb_name +"_rosetta"
     print("Saving Rosetta variants in .prism format:\n"+ output_filename+".csv\n")
     stats = "Positions: " + str(len(fasta_seq)) + ", variants: " + str(len(output_df))
@@ -102,4 +100,7 @@ def parse_rosetta_ddgs(sys_name, chain_id, fasta_seq, ddG_run, ddG_output, struc
         print('cant print warnings')
     
 if __name__ == '__main__':
-    parse_rosetta_ddgs(sys_name=sys.argv[1], chain_id=sys.argv[2], fasta_seq=sys.argv[3], ddG_run=sys.argv[4], ddG_output=sys.argv[5], structure_input=sys.argv[6])
+    if len(sys.argv) > 7:
+        parse_rosetta_ddgs(sys_name=sys.argv[1], chain_id=sys.argv[2], fasta_seq=sys.argv[3], ddG_run=sys.argv[4], ddG_output=sys.argv[5], structure_input=sys.argv[6], n_shards=int(sys.argv[7]))
+    else:
+        parse_rosetta_ddgs(sys_name=sys.argv[1], chain_id=sys.argv[2], fasta_seq=sys.argv[3], ddG_run=sys.argv[4], ddG_output=sys.argv[5], structure_input=sys.argv[6])
@@ -7,6 +7,11 @@ def pdb_to_fasta_seq(path_to_pdb):
     with open(path_to_pdb, 'r') as pdb_file:
         pdblines = pdb_file.readlines()
 
+    return fasta_seq_from_lines(pdblines)
+
+
+def fasta_seq_from_lines(pdblines):
+    # the sequence of the ATOM records, one letter per residue
     fasta_seq = ''
 
     chainspec = 'NULL'
@@ -8,6 +8,7 @@ Date of last major changes: 2020-05-01
 # Standard library imports
 from datetime import datetime
 import logging as logger
+import os
 import re
 import sys
 
@@ -18,16 +19,32 @@ import pandas as pd
 
 # Local application imports
 from helper import extract_by_uniprot_fasta
+from prism_table import probe_layout, write_prism_table
 import rosetta_paths
 sys.path.insert(1, rosetta_paths.prims_parser)
 from PrismData import PrismParser, VariantData
 
 
+def read_prism_body(primsfile, metadata=None, chunksize=500000):
+    """Reads the variant table of a prism file with a typed, chunked CSV reader.
+
+    The columns of the metadata are read as float, n_mut as int and
+    everything else as str; NA marks missing values.
+    """
+    dtype = {'variant': str, 'n_mut': 'Int32'}
+    if metadata != None:
+        for column in metadata.get('columns', {}):
+            dtype[column] = float
+    chunks = pd.read_csv(primsfile, sep=r'\s+', comment='#', na_values=['NA'], keep_default_na=False,
+                         dtype=dtype, chunksize=chunksize)
+    return pd.concat(chunks, ignore_index=True)
+
+
 def read_from_prism(primsfile):
     logger.info('Reads the prism file')
-    parser = PrismParser()
-    dataframe = parser.read(primsfile).dataframe
-    meta_data = parser.read_header(primsfile)
+    # the header is parsed once, the body without per-row Python objects
+    meta_data = PrismParser().read_header(primsfile)
+    dataframe = read_prism_body(primsfile, meta_data)
     return meta_data, dataframe
 
 
@@ -54,32 +71,66 @@ def prism_to_mut(primsfile, mutfile):
     return mut_dic
 
 
+def add_variant_lists(dataframe):
+    # the per-variant aa_ref, resi and aa_var lists of PrismParser
+    mutations = dataframe['variant'].str.split(':')
+    dataframe = dataframe.copy()
+    dataframe['aa_ref'] = [[mutation[0] for mutation in variant] for variant in mutations]
+    dataframe['resi'] = [[mutation[1:-1] for mutation in variant] for variant in mutations]
+    dataframe['aa_var'] = [[mutation[-1] for mutation in variant] for variant in mutations]
+    return dataframe
+
+
+def write_probe(metadata, probe, path_to_probe, comment):
+    # the file PrismParser writes for the probe rows
+    try:
+        PrismParser().write(path_to_probe, VariantData(metadata, probe), comment_lines=comment)
+        with open(path_to_probe, 'r') as fp:
+            return fp.read()
+    finally:
+        if os.path.isfile(path_to_probe):
+            os.remove(path_to_probe)
+
+
+def write_prism_fast(metadata, dataframe, prism_file, comment=[], variant_lists=False, probe_rows=1000):
+    """Writes a prism file with one buffered to_csv dump of the body.
+
+    For tables of more than probe_rows rows, PrismParser writes the first
+    probe_rows and probe_rows // 2 rows; if prism_table.probe_layout
+    accepts them, their header is written with the fast body of the whole
+    table. Otherwise the whole file is written by PrismParser. variant_lists
+    adds the aa_ref, resi and aa_var lists for PrismParser.
+    """
+    layout = None
+    if len(dataframe) > probe_rows:
+        probes = [dataframe.head(probe_rows), dataframe.head(probe_rows // 2)]
+        if variant_lists:
+            probes = [add_variant_lists(probe) for probe in probes]
+        try:
+            layout = probe_layout(probes, [write_probe(metadata, probe, prism_file + '.probe', comment)
+                                           for probe in probes])
+        except Exception as e:
+            logger.info(f'PrismParser rejected the probe ({e})')
+        if layout == None:
+            logger.info('The fast prism writer differs from PrismParser, using PrismParser')
+
+    if layout != None:
+        header, columns = layout
+        write_prism_table(prism_file, header, columns, dataframe)
+    else:
+        if variant_lists:
+            dataframe = add_variant_lists(dataframe)
+        PrismParser().write(prism_file, VariantData(metadata, dataframe), comment_lines=comment)
+
+
 def rosetta_to_prism(ddg_file, prism_file, sequence, rosetta_info=None, version=1, uniprot='', sys_name=''):
     # create prism file with rosetta values
     logger.info('Create prism file with rosetta ddG values')
-    variant = []
-    norm_ddG_value = []
-    std_ddG_value = []
-    ddG_value = []
-    with open(ddg_file, 'r') as fp:
-        for line in fp:
-            split_line = line.split(',')
-            variant.append(split_line[0])
-            norm_ddG_value.append(split_line[1])
-            std_ddG_value.append(split_line[2].strip())
-     #       ddG_value.append(split_line[1])
-
-    data = {
-        'variant': pd.Series(variant),
-        'norm_ddG': pd.Series(norm_ddG_value),
-        'std_ddG': pd.Series(std_ddG_value),
-        #      'ddG': pd.Series(ddG_value),
-        'n_mut': 1,  # pd.Series([1 for x in range(len(variant))]),
-        'aa_ref': [[seg[0]] for seg in variant],
-        "resi": [[seg[1:-1]] for seg in variant],
-        "aa_var": [[seg[-1]] for seg in variant],
-    }
-    dataframeset = pd.DataFrame(data)
+    # the values are kept as written in ddg_file
+    dataframeset = pd.read_csv(ddg_file, header=None, usecols=[0, 1, 2], names=['variant', 'norm_ddG', 'std_ddG'],
+                               dtype=str, keep_default_na=False)
+    dataframeset['std_ddG'] = dataframeset['std_ddG'].str.strip()
+    dataframeset.insert(3, 'n_mut', 1)
 
     if rosetta_info == None:
         rosetta_info = {
@@ -107,8 +158,8 @@ def rosetta_to_prism(ddg_file, prism_file, sequence, rosetta_info=None, version=
         "variants": {
             #      "number": df["pos"].count(),
             #      "coverage": df["pos"].nunique() / len(seq[1][1]),
-            "number": data["variant"].count(),
-            "coverage": len(set(sum(data["resi"], []))) / len(seq[1][1]),
+            "number": dataframeset["variant"].count(),
+            "coverage": dataframeset["variant"].str[1:-1].nunique() / len(seq[1][1]),
             "width": "single",
             #        "depth":,
         },
@@ -125,12 +176,9 @@ def rosetta_to_prism(ddg_file, prism_file, sequence, rosetta_info=None, version=
         f"version {version} - {datetime.date(datetime.now())} - johanna.tiemann@gmail.com",
     ]
 
-    variant_dataset = VariantData(metadata, dataframeset)
-    parser = PrismParser()
-    parser.write(prism_file, variant_dataset, comment_lines=comment)
+    write_prism_fast(metadata, dataframeset, prism_file, comment=comment, variant_lists=True)
 
 
 def write_prism(metadata, dataframe, prism_file, comment=''):
-    variant_dataset = VariantData(metadata, dataframe)
-    parser = PrismParser()
-    parser.write(prism_file, variant_dataset, comment_lines=comment)
+    # read_from_prism frames have no variant lists
+    write_prism_fast(metadata, dataframe, prism_file, comment=comment, variant_lists=True)
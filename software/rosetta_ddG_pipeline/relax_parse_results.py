@@ -1,66 +1,114 @@
-"""relax_parse_results.py 
-This function will parse the results of a rosetta pre_relax run. it will be callable from an 
-sbatch script, that can wait for the relaxation to finish, and then select the best one. The 
+"""relax_parse_results.py
+This function will parse the results of a rosetta pre_relax run. it will be callable from an
+sbatch script, that can wait for the relaxation to finish, and then select the best one. The
 point is to implement the 20x pre relaxation for the stability pipeline, that Amelie requested.
 
+All scorefiles (*.sc) and silent files (*.silent) of the relax run are
+scanned concurrently, so any number of relax outputs works (cartesian
+arrays, MP -nstruct). The keep_top best models are ranked in
+relax_ranking.txt and kept, the other models are deleted.
+
 Author: Anders Frederiksen
 
-Date of last major changes: 2020-04
+Date of last major changes: 2026-10-18
 
 """
 
 # Standard library imports
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import heapq
 import logging as logger
 import os
+import subprocess
 import sys
 
 # Local application imports
-from helper import AttrDict, create_symlinks, create_copy, find_copy
+from helper import AttrDict, create_copy
+import rosetta_paths
 
 
-def parse_relax_results(folder, sc_name='score_bn15_calibrated', logger_mode='info'):
-    '''This function parses the scorefile from a rosetta
-    pre-relaxation, and selects the lowest scoring one'''
-    relax_scores = {}
-    for n in range(20):
-        path_to_scorefile = os.path.join(
-            folder.relax_run, f'{n}-{sc_name}.sc')
-        with open(path_to_scorefile) as scorefile:
-            scorelines = scorefile.readlines()
+def read_scores(path_to_scorefile):
+    # yields (total score, description, scorefile) of every SCORE: line; the
+    # score column is taken from the header line
+    score_column = 1
+    with open(path_to_scorefile) as scorefile:
+        for line in scorefile:
+            score_fields = line.split()
+            if len(score_fields) < 3 or score_fields[0] != 'SCORE:':
+                continue
+            if score_fields[-1] == 'description':
+                for column in ['total_score', 'score']:
+                    if column in score_fields:
+                        score_column = score_fields.index(column)
+                        break
+                continue
+            try:
+                yield float(score_fields[score_column]), score_fields[-1], path_to_scorefile
+            except ValueError:
+                continue
 
-        # Put the relaxation scores in this dict
-        
 
-        for line in scorelines:
-            score_fields = line.split()
-            name = score_fields[-1].strip()
-            #print(name,score_fields)
-            # check if this is an actual scoring line
-            if score_fields[0].strip() == 'SCORE:' and name != 'description':
-                score = float(score_fields[1])
-                relax_scores[name] = score
-    print(relax_scores)
-    # now find the lowest scoring one.
-    # set it to the last one, just to start with something
-    most_relaxed = name
-    for key in relax_scores:
-        # it the key is more relaxed than the previous best, update the best.
-        if relax_scores[key] < relax_scores[most_relaxed]:
-            most_relaxed = key
-            print(most_relaxed)
+def scan_scorefile(path_to_scorefile, keep_top=1):
+    # (keep_top best entries, descriptions of all entries) of one scorefile
+    descriptions = []
+
+    def entries():
+        for entry in read_scores(path_to_scorefile):
+            descriptions.append(entry[1])
+            yield entry
+    return heapq.nsmallest(keep_top, entries()), descriptions
+
+
+def best_models(paths_to_scorefiles, keep_top=1, max_workers=16):
+    """Returns the keep_top lowest scoring (score, description, scorefile)
+    entries and the descriptions of all models.
+
+    Each scorefile is reduced to its keep_top best entries in a thread
+    pool, and these are merged; only keep_top entries per file are held.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        scanned = list(pool.map(lambda path: scan_scorefile(path, keep_top=keep_top), paths_to_scorefiles))
+    ranking = heapq.nsmallest(keep_top, (entry for best, descriptions in scanned for entry in best))
+    return ranking, [name for best, descriptions in scanned for name in descriptions]
+
+
+def model_pdb(relax_run, description, path_to_scorefile):
+    # the pdb of a model; models in silent files are extracted first
+    path_to_pdb = os.path.join(relax_run, f'{description}.pdb')
+    if not os.path.isfile(path_to_pdb) and path_to_scorefile.endswith('.silent'):
+        extract_pdbs = os.path.join(rosetta_paths.path_to_rosetta,
+                                    f'bin/extract_pdbs.{rosetta_paths.Rosetta_extension}')
+        subprocess.call([extract_pdbs, '-in:file:silent', path_to_scorefile, '-in:file:tags', description],
+                        cwd=relax_run)
+    return path_to_pdb
+
+
+def parse_relax_results(folder, sc_name='score_bn15_calibrated', keep_top=1, logger_mode='info'):
+    '''This function parses the scorefiles (*{sc_name}.sc and silent files)
+    from a rosetta pre-relaxation, keeps the keep_top lowest scoring models
+    (ranked in relax_ranking.txt) and uses the lowest scoring one as input
+    of the ddG calculations'''
+    paths_to_scorefiles = sorted(glob.glob(os.path.join(folder.relax_run, f'*{sc_name}.sc')) +
+                                 glob.glob(os.path.join(folder.relax_run, '*.silent')))
+    ranking, descriptions = best_models(paths_to_scorefiles, keep_top=keep_top)
+    if ranking == []:
+        raise ValueError(f'No relax scores found in {folder.relax_run}')
+    with open(os.path.join(folder.relax_output, 'relax_ranking.txt'), 'w') as fp:
+        fp.write('rank\tscore\tdescription\tscorefile\n')
+        for rank, (score, name, path_to_scorefile) in enumerate(ranking, 1):
+            fp.write(f'{rank}\t{score}\t{name}\t{path_to_scorefile}\n')
 
+    score, most_relaxed, path_to_scorefile = ranking[0]
     logger.info(f'most relaxed structure is {most_relaxed}.')
-    logger.info('deleting the rest')
-#     and now delete all the structures that are not the best scoring one.
-#     it seems a little crude, but whatever.
-    for key in relax_scores:
-        if key != most_relaxed:
-            path_to_tense = os.path.join(folder.relax_run, f'{key}.pdb')
-            print('deleting', path_to_tense)
+    logger.info(f'keeping the {keep_top} best models, deleting the rest')
+    kept = set(name for score, name, path in ranking)
+    for name in descriptions:
+        path_to_tense = os.path.join(folder.relax_run, f'{name}.pdb')
+        if name not in kept and os.path.isfile(path_to_tense):
             os.remove(path_to_tense)
-    relax_output_strucfile = find_copy(
-        folder.relax_run, f'{most_relaxed}.pdb', folder.relax_output, 'output.pdb')
 
+    create_copy(model_pdb(folder.relax_run, most_relaxed, path_to_scorefile), folder.relax_output, name='output.pdb')
     create_copy(
         os.path.join(folder.relax_output, 'output.pdb'), folder.ddG_input, name='input.pdb')
 
@@ -71,7 +119,9 @@ if __name__ == '__main__':
     folder = AttrDict()
     folder.update({'relax_run': sys.argv[1], 'relax_output': sys.argv[
                   2], 'ddG_input': sys.argv[3]})
-    if len(sys.argv) > 4:
+    if len(sys.argv) > 5:
+        parse_relax_results(folder, sc_name=sys.argv[4], keep_top=int(sys.argv[5]))
+    elif len(sys.argv) > 4:
         parse_relax_results(folder, sc_name=sys.argv[4])
     else:
         parse_relax_results(folder)
@@ -0,0 +1,154 @@
+"""result_store.py keeps every replicate of a cartesian ddG run in a columnar file.
+
+The store (ddG/output/ddg_replicates.arrow, or .npz without pyarrow) has
+one row per round of every variant, including the rounds of the WT
+reference (mutant == wt), with the columns
+
+    key        int32    variant key, (position - 1) * 20 + mutant
+    position   int32    residue number (1-based, as in the mutfiles)
+    wt         int8     native residue, index in aa_order
+    mutant     int8     mutant residue, index in aa_order
+    replicate  int16    cartesian_ddg round
+    dg         float64  dG of the round
+    wt_dg      float64  mean dG of the WT reference of the position
+    <term>     float64  energy terms of the round (fa_atr, fa_rep, ...)
+
+and the sequence as metadata. The Arrow IPC file can be memory-mapped
+(open_store); the .npz fallback is loaded column by column.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import os
+
+# Third party imports
+import numpy as np
+import pandas as pd
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Local application imports
+from parse_cartesian_functions import aa_order
+
+
+def store_path(path_to_store):
+    # the extension depends on whether pyarrow is installed
+    if pa != None:
+        return path_to_store + '.arrow'
+    return path_to_store + '.npz'
+
+
+def variant_keys(position, mutant):
+    return ((np.asarray(position) - 1) * 20 + np.asarray(mutant)).astype(np.int32)
+
+
+def decode_variant_keys(keys, protein_seq):
+    # variant names like 'M1A' of an array of variant keys
+    keys = np.asarray(keys)
+    positions = keys // 20 + 1
+    return [f'{protein_seq[position - 1]}{position}{aa_order[code]}'
+            for position, code in zip(positions, keys % 20)]
+
+
+def compact_rows(table):
+    """Converts read_ddg_rows(..., terms=True) rows to the store columns."""
+    codes = pd.Series(np.arange(20, dtype=np.int8), index=list(aa_order))
+    mutant = codes[table['mutant']].values
+    columns = pd.DataFrame({'key': variant_keys(table['position'].values, mutant),
+                            'position': table['position'].values.astype(np.int32),
+                            'wt': codes[table['wt']].values,
+                            'mutant': mutant,
+                            'replicate': table['replicate'].values.astype(np.int16),
+                            'dg': table['dg'].values.astype(np.float64)})
+    for term in table.columns:
+        if term not in ['position', 'wt', 'mutant', 'replicate', 'dg']:
+            columns[term] = table[term].values.astype(np.float64)
+    return columns
+
+
+def write_store(columns, protein_seq, path):
+    # written to a temporary file first and moved into place
+    if pa != None:
+        table = pa.Table.from_pandas(columns, preserve_index=False)
+        table = table.replace_schema_metadata({'sequence': protein_seq})
+        with pa.OSFile(path + '.tmp', 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        with open(path + '.tmp', 'wb') as fp:
+            np.savez(fp, sequence=np.array(protein_seq),
+                     **{column: columns[column].values for column in columns.columns})
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def open_store(path):
+    """Returns the sequence and {column: numpy array} of a store.
+
+    Columns of an .arrow store are memory-mapped, not read.
+    """
+    if path.endswith('.arrow'):
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        columns = {name: table.column(name).to_numpy() for name in table.column_names}
+        return table.schema.metadata[b'sequence'].decode(), columns
+    with np.load(path) as data:
+        columns = {name: data[name] for name in data.files if name != 'sequence'}
+        return str(data['sequence']), columns
+
+
+def read_store(path):
+    # the store as a DataFrame with the sequence
+    protein_seq, columns = open_store(path)
+    return protein_seq, pd.DataFrame(columns)
+
+
+class ReplicateStore:
+    """The store of one run, updated with the rows of incremental parses
+    (see parse_cartesian_functions.update_ddg_aggregate)."""
+
+    def __init__(self, path_to_store):
+        self.path = store_path(path_to_store)
+        self.sequence = None
+        self.columns = None
+        if os.path.isfile(self.path):
+            self.sequence, self.columns = read_store(self.path)
+
+    def __len__(self):
+        return 0 if self.columns is None else len(self.columns)
+
+    def matches(self, protein_seq, n_rows):
+        """True if the store holds at least the n_rows rows recorded by the
+        parse manifest; rows of an interrupted parse after them are dropped."""
+        if n_rows == None or self.columns is None or self.sequence != protein_seq:
+            return False
+        if len(self.columns) < n_rows:
+            return False
+        self.columns = self.columns.iloc[:n_rows]
+        return True
+
+    def reset(self, protein_seq):
+        self.sequence = protein_seq
+        self.columns = None
+
+    def append(self, table):
+        self.extend(compact_rows(table))
+
+    def extend(self, rows):
+        # rows already in the store columns, e.g. of another store
+        if self.columns is None:
+            self.columns = rows
+        else:
+            self.columns = pd.concat([self.columns, rows], ignore_index=True)
+
+    def write(self):
+        if self.columns is None:
+            self.append(pd.DataFrame({'position': [], 'wt': [], 'mutant': [], 'replicate': [], 'dg': []}))
+        columns = self.columns.drop(columns='wt_dg', errors='ignore')
+        reference = columns[columns['wt'] == columns['mutant']].groupby('position')['dg'].mean()
+        columns.insert(6, 'wt_dg', columns['position'].map(reference).values.astype(np.float64))
+        self.columns = columns
+        return write_store(columns, self.sequence, self.path)
@@ -0,0 +1,117 @@
+"""resume.py finds the ddG calculations without complete output and writes
+sbatch files that rerun only those.
+
+Cartesian runs are checked per mutfile (every mutation needs all
+-ddg:iterations rounds in the .ddg files), membrane protein runs per
+residue/mutation pair in ddG.out.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import glob
+import logging as logger
+import os
+from os.path import join
+
+# Local application imports
+from helper import get_mut_dict, read_mutfile
+import mp_ddG
+from parse_cartesian_functions import ddg_files, stream_ddg_tables
+from structure_input import write_cartesian_ddg_sbatch
+
+
+def ddg_iterations(ddg_flagfile, default=3):
+    # number of rounds cartesian_ddg runs per mutation
+    if not os.path.isfile(ddg_flagfile):
+        return default
+    with open(ddg_flagfile, 'r') as fp:
+        for line in fp:
+            fields = line.split()
+            if len(fields) > 1 and fields[0].lstrip('-') in ['ddg:iterations', 'ddg::iterations']:
+                return int(fields[1])
+    return default
+
+
+def count_cartesian_rounds(ddG_run):
+    # counts the finished rounds per (residue number, mutant) in all .ddg
+    # files, read and parsed as by the ddG parser
+    rounds = {}
+    for table, end_offsets in stream_ddg_tables(ddg_files(ddG_run), None):
+        for (position, mutant), count in table.groupby(['position', 'mutant']).size().items():
+            key = (str(position), mutant)
+            rounds[key] = rounds.get(key, 0) + int(count)
+    return rounds
+
+
+def missing_mutfiles(folder, input_mutfiles=''):
+    """Returns the mutfiles of folder.ddG_input without complete output in folder.ddG_run."""
+    if input_mutfiles == '':
+        input_mutfiles = join(folder.ddG_input, 'mutfiles')
+    iterations = ddg_iterations(join(folder.ddG_input, 'ddg_flagfile'))
+    rounds = count_cartesian_rounds(folder.ddG_run)
+    missing = []
+    for mutfile in sorted(glob.glob(join(input_mutfiles, 'mutfile*'))):
+        if any(rounds.get(mutation, 0) < iterations for mutation in read_mutfile(mutfile)):
+            missing.append(mutfile)
+    return missing
+
+
+def missing_mp_mutations(folder, mut_dict, output_name='ddG.out'):
+    """Returns the residue/mutation pairs of mut_dict that are not in ddG.out yet."""
+    done = set()
+    path_to_output = join(folder.ddG_run, output_name)
+    if os.path.isfile(path_to_output):
+        with open(path_to_output, 'r') as fp:
+            for line in fp:
+                variant = line.split(',')[0].strip()
+                if len(variant) > 2:
+                    done.add((variant[1:-1], variant[-1]))
+    missing = {}
+    for resid, muts in mut_dict.items():
+        missing_muts = ''.join(aa for aa in muts if (resid, aa) not in done)
+        if missing_muts != '':
+            missing[resid] = missing_muts
+    return missing
+
+
+def mp_mut_dict(folder):
+    # the mutation list used by the create stage for membrane proteins
+    prism_mutfile = join(folder.prepare_input, 'input_mutfile')
+    if os.path.isfile(prism_mutfile):
+        return get_mut_dict(prism_mutfile)
+    return get_mut_dict(join(folder.input, 'mutations'))
+
+
+def resume_ddg(folder, sys_name='', is_mp=False, partition='sbinlab', mutfiles_per_task=1,
+               max_array_size=1000, array_throttle=100, basename='resume_ddg', mp_options={}):
+    """Writes sbatch files (basename*.sbatch) over the missing ddG calculations only.
+
+    Returns the list of written sbatch files, which is empty if all
+    calculations already have complete output. The .ddg files of earlier
+    runs of the missing mutfiles are moved away (retry.supersede_outputs).
+    """
+    if is_mp:
+        mut_dict = mp_mut_dict(folder)
+        missing = missing_mp_mutations(folder, mut_dict)
+        logger.info(f'Resume: {len(missing)} of {len(mut_dict)} residues have missing mutations')
+        if missing == {}:
+            return []
+        return mp_ddG.rosetta_ddg_mp_pyrosetta(
+            folder, missing, SLURM=True, sys_name=sys_name, partition=partition,
+            max_array_size=max_array_size, array_throttle=array_throttle,
+            basename=basename, **mp_options)
+    else:
+        missing = missing_mutfiles(folder)
+        logger.info(f'Resume: {len(missing)} mutfiles have missing output')
+        if missing == []:
+            return []
+        # the rounds of partly finished mutfiles would be counted twice;
+        # retry imports this module, so it is imported here
+        from retry import supersede_outputs
+        supersede_outputs(folder.ddG_run, missing)
+        return write_cartesian_ddg_sbatch(
+            folder, sys_name=sys_name, partition=partition, mutfiles_per_task=mutfiles_per_task,
+            max_array_size=max_array_size, array_throttle=array_throttle,
+            mutfile_list=missing, basename=basename)
@@ -0,0 +1,301 @@
+"""retry.py resubmits cancelled or failed ddG array tasks with more resources.
+
+The retry controller runs as a small job after each wave of ddG arrays.
+It maps the cancelled tasks of the last wave (see helper.read_slurms) and
+all units without complete output back to their mutfiles or residues, and
+resubmits only those with --time/--mem scaled by the retry factors. The
+walltime is capped at max_hours (the partition limit); once a wave
+already requested the cap, a further wave would not get more time, so
+the controller stops there. After the last wave, or when nothing failed,
+it submits the parse job.
+
+The .ddg files of earlier runs of a resubmitted mutfile are moved to
+ddG_run/superseded before the rerun, so the rounds of a partly finished
+mutfile are not counted (and averaged) twice. Membrane protein reruns
+only get the mutations that are not in ddG.out yet.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import glob
+import json
+import logging as logger
+import os
+from os.path import join
+import re
+import shutil
+import sys
+
+# Local application imports
+from helper import AttrDict, read_sbatch_resources, read_slurms
+import mp_ddG
+import resume
+import rosetta_paths
+from scheduler import SlurmScheduler
+from structure_input import write_cartesian_ddg_sbatch
+
+
+def write_retry_sbatch(folder, sys_name='', is_mp=False, partition='sbinlab', max_retries=1,
+                       time_factor=2.0, mem_factor=1.5, mutfiles_per_task=1,
+                       max_array_size=1000, array_throttle=100, mp_options={}, max_hours=168):
+    """Writes retry.json and the retry_ddgs.sbatch controller to folder.ddG_input."""
+    config = {
+        'folder': {'input': folder.input, 'prepare_input': folder.prepare_input,
+                   'ddG_input': folder.ddG_input, 'ddG_run': folder.ddG_run},
+        'sys_name': sys_name,
+        'is_mp': is_mp,
+        'partition': partition,
+        'max_retries': max_retries,
+        'time_factor': time_factor,
+        'mem_factor': mem_factor,
+        'mutfiles_per_task': mutfiles_per_task,
+        'max_array_size': max_array_size,
+        'array_throttle': array_throttle,
+        'mp_options': mp_options,
+        'max_hours': max_hours,
+    }
+    path_to_config = join(folder.ddG_input, 'retry.json')
+    with open(path_to_config, 'w') as fp:
+        json.dump(config, fp, indent=4)
+
+    path_to_sbatch = join(folder.ddG_input, 'retry_ddgs.sbatch')
+    with open(path_to_sbatch, 'w') as fp:
+        fp.write(f'''#!/bin/sh
+#SBATCH --job-name={sys_name}_retry
+#SBATCH --time=0:10:00
+#SBATCH --mem 2000
+#SBATCH --partition={partition}
+
+# checks the last ddG wave and resubmits failed tasks (attempt number $1)
+''')
+        fp.write(f'python3 {join(rosetta_paths.path_to_stability_pipeline, "retry.py")} {path_to_config} $1')
+    return path_to_sbatch
+
+
+def remove_retry_sbatch(folder):
+    for path in [join(folder.ddG_input, 'retry.json'), join(folder.ddG_input, 'retry_ddgs.sbatch')]:
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def record_ddg_jobs(ddG_run, attempt, job_id, path_to_sbatch, tasks=None, slurm_dir=None):
+    # keeps track of which job id ran which ddG sbatch file in which wave;
+    # tasks=(first, last, offset): only the array tasks first to last of a
+    # shared (campaign) job ran path_to_sbatch, as its task (task - offset);
+    # the slurm-*.out files of such a job are in slurm_dir
+    with open(join(ddG_run, 'ddg_jobs.txt'), 'a') as fp:
+        if tasks == None:
+            fp.write(f'{attempt} {job_id} {path_to_sbatch}\n')
+        else:
+            fp.write(f'{attempt} {job_id} {path_to_sbatch} {tasks[0]} {tasks[1]} {tasks[2]}')
+            fp.write('\n' if slurm_dir == None else f' {slurm_dir}\n')
+
+
+def read_ddg_jobs(ddG_run, attempt):
+    """Returns {job id: [(sbatch file, first task, last task, offset)]} of
+    one wave, or of all waves for attempt None.
+
+    Jobs of one sbatch file run all tasks (0, None, 0).
+    """
+    jobs = {}
+    path_to_jobs = join(ddG_run, 'ddg_jobs.txt')
+    if os.path.isfile(path_to_jobs):
+        with open(path_to_jobs, 'r') as fp:
+            for line in fp:
+                fields = line.split()
+                if attempt == None or int(fields[0]) == attempt:
+                    if len(fields) > 3:
+                        first, last, offset = [int(field) for field in fields[3:6]]
+                        jobs.setdefault(fields[1], []).append((fields[2], first, last, offset))
+                    else:
+                        jobs[fields[1]] = [(fields[2], 0, None, 0)]
+    return jobs
+
+
+def slurm_dirs(ddG_run):
+    # ddG_run and the folders of the shared arrays of ddg_jobs.txt
+    dirs = [ddG_run]
+    path_to_jobs = join(ddG_run, 'ddg_jobs.txt')
+    if os.path.isfile(path_to_jobs):
+        with open(path_to_jobs, 'r') as fp:
+            for line in fp:
+                fields = line.split()
+                if len(fields) > 6 and fields[6] not in dirs:
+                    dirs.append(fields[6])
+    return dirs
+
+
+def cancelled_ddg_tasks(ddG_run):
+    """Returns (job id, task id) of the cancelled ddG array tasks, also of
+    shared campaign arrays, whose slurm-*.out files are in the campaign."""
+    return [task for path in slurm_dirs(ddG_run) if os.path.isdir(path) for task in read_slurms(path)]
+
+
+def job_task_units(job, task_id):
+    # units of array task task_id of a job of read_ddg_jobs
+    units = []
+    for path_to_sbatch, first, last, offset in job:
+        if task_id >= first and (last == None or task_id <= last):
+            units.extend(array_task_units(path_to_sbatch, task_id - offset))
+    return units
+
+
+def sbatch_units(path_to_sbatch):
+    # the unit list (LST or RESIS) and OFFSET and PER_TASK of a ddG sbatch file
+    offset = 0
+    per_task = 1
+    units = []
+    with open(path_to_sbatch, 'r') as fp:
+        for line in fp:
+            line = line.strip()
+            if line.startswith('OFFSET='):
+                offset = int(line.split('=')[1])
+            elif line.startswith('PER_TASK='):
+                per_task = int(line.split('=')[1])
+            elif line.startswith('LST=(`ls '):
+                units = sorted(glob.glob(line[len('LST=(`ls '):].split('`')[0]))
+            elif line.startswith('LST=(') or line.startswith('RESIS=('):
+                units = line.split('=(')[1].rstrip(')').split()
+    return units, offset, per_task
+
+
+def array_task_units(path_to_sbatch, task_id):
+    # mutfiles (cartesian) or residues (MP) run by one array task
+    units, offset, per_task = sbatch_units(path_to_sbatch)
+    start = offset + task_id * per_task
+    return units[start:start + per_task]
+
+
+def supersede_outputs(ddG_run, mutfiles):
+    """Moves the .ddg files of all earlier runs of mutfiles to ddG_run/superseded.
+
+    A cartesian_ddg run of mutfile LST[INDEX] of a job writes its rounds
+    with the prefix ddg-<job id>-<INDEX>. Returns the moved files.
+    """
+    mutfiles = set(mutfiles)
+    prefixes = []
+    for job_id, job in read_ddg_jobs(ddG_run, None).items():
+        for path_to_sbatch, first, last, offset in job:
+            if os.path.isfile(path_to_sbatch):
+                units, sbatch_offset, per_task = sbatch_units(path_to_sbatch)
+                prefixes.extend(f'ddg-{job_id}-{index}' for index, unit in enumerate(units) if unit in mutfiles)
+    if prefixes == []:
+        return []
+    # ddg-1-1 is no prefix of the files of ddg-1-10
+    pattern = re.compile(f"({'|'.join(re.escape(prefix) for prefix in prefixes)})(?![0-9]).*\\.ddg$")
+    moved = []
+    for entry in os.scandir(ddG_run):
+        if entry.is_file() and pattern.match(entry.name):
+            os.makedirs(join(ddG_run, 'superseded'), exist_ok=True)
+            shutil.move(entry.path, join(ddG_run, 'superseded', entry.name))
+            moved.append(entry.name)
+    if moved != []:
+        logger.info(f'Moved {len(moved)} .ddg files of rerun mutfiles to {join(ddG_run, "superseded")}')
+    return moved
+
+
+def walltime_capped(folder, config, attempt):
+    # whether the wave before attempt already requested the max_hours cap
+    max_hours = config.get('max_hours', 168)
+    hours = [read_sbatch_resources(path_to_sbatch)[0]
+             for job in read_ddg_jobs(folder.ddG_run, attempt - 1).values()
+             for path_to_sbatch, first, last, offset in job if os.path.isfile(path_to_sbatch)]
+    return hours != [] and min(hours) >= max_hours
+
+
+def failed_units(folder, config, attempt):
+    """Returns the mutfiles (or MP {residue: mutations}) that need another run.
+
+    These are the cancelled tasks of the previous wave plus every unit
+    without complete output; for MP only the mutations without output.
+    """
+    jobs = read_ddg_jobs(folder.ddG_run, attempt - 1)
+    cancelled = []
+    for job_id, task_id in cancelled_ddg_tasks(folder.ddG_run):
+        if job_id in jobs:
+            cancelled.extend(job_task_units(jobs[job_id], task_id))
+
+    if config['is_mp']:
+        # a cancelled residue is rerun only for its mutations without
+        # output, the others would be appended to ddG.out again
+        return resume.missing_mp_mutations(folder, resume.mp_mut_dict(folder))
+    return sorted(set(resume.missing_mutfiles(folder)) | set(cancelled))
+
+
+def write_retry_arrays(folder, config, failed, attempt):
+    # the resources grow with every attempt
+    time_scale = config['time_factor'] ** attempt
+    mem_scale = config['mem_factor'] ** attempt
+    basename = f'retry_ddg_{attempt}'
+    max_hours = config.get('max_hours', 168)
+    if config['is_mp']:
+        return mp_ddG.rosetta_ddg_mp_pyrosetta(
+            folder, failed, SLURM=True, sys_name=config['sys_name'], partition=config['partition'],
+            max_array_size=config['max_array_size'], array_throttle=config['array_throttle'],
+            basename=basename, hours=32 * time_scale, mem=int(5000 * mem_scale), max_hours=max_hours,
+            **config['mp_options'])
+    supersede_outputs(folder.ddG_run, failed)
+    return write_cartesian_ddg_sbatch(
+        folder, sys_name=config['sys_name'], partition=config['partition'],
+        mutfiles_per_task=config['mutfiles_per_task'], hours_per_mutfile=48 * time_scale,
+        max_array_size=config['max_array_size'], array_throttle=config['array_throttle'],
+        mutfile_list=failed, basename=basename, mem=int(2000 * mem_scale), max_hours=max_hours)
+
+
+def read_config(path_to_config):
+    with open(path_to_config, 'r') as fp:
+        config = json.load(fp)
+    return config, AttrDict(config['folder'])
+
+
+def submit_after_ddgs(folder, scheduler, dependencies=[]):
+    # the adaptive replicate controller, if enabled at create, else the parse job
+    path_to_adaptive_sbatch = join(folder.ddG_input, 'adaptive_ddgs.sbatch')
+    if os.path.isfile(path_to_adaptive_sbatch):
+        return scheduler.submit(path_to_adaptive_sbatch, folder.ddG_run, dependencies=dependencies, args='1')
+    return submit_parse(folder, scheduler, dependencies=dependencies)
+
+
+def submit_parse(folder, scheduler, dependencies=[]):
+    # the parse job, after the map array of parse_shards.sbatch if enabled at create
+    path_to_shards_sbatch = join(folder.ddG_input, 'parse_shards.sbatch')
+    if os.path.isfile(path_to_shards_sbatch):
+        dependencies = [scheduler.submit(path_to_shards_sbatch, folder.ddG_run, dependencies=dependencies)]
+    return scheduler.submit(join(folder.ddG_input, 'parse_ddgs.sbatch'), folder.ddG_run, dependencies=dependencies)
+
+
+def log_unretried(config, failed, attempt):
+    if attempt > config['max_retries']:
+        message = f'{len(failed)} units still failed after {config["max_retries"]} retries'
+    else:
+        message = (f'{len(failed)} units still failed, but wave {attempt - 1} already requested the '
+                   f'{config.get("max_hours", 168)} h walltime cap; they are not resubmitted')
+    logger.warning(message)
+    print(message)
+
+
+def retry_failed_ddgs(path_to_config, attempt, scheduler=None):
+    """Runs one retry wave and chains the next controller, or the parse job."""
+    if scheduler == None:
+        scheduler = SlurmScheduler()
+    config, folder = read_config(path_to_config)
+    failed = failed_units(folder, config, attempt)
+    if len(failed) == 0 or attempt > config['max_retries'] or walltime_capped(folder, config, attempt):
+        if len(failed) != 0:
+            log_unretried(config, failed, attempt)
+        return submit_after_ddgs(folder, scheduler)
+
+    logger.info(f'Retry attempt {attempt}: resubmitting {len(failed)} units')
+    retry_jobs = []
+    for path_to_sbatch in write_retry_arrays(folder, config, failed, attempt):
+        job = scheduler.submit(path_to_sbatch, folder.ddG_run)
+        record_ddg_jobs(folder.ddG_run, attempt, job.job_id, path_to_sbatch)
+        retry_jobs.append(job)
+    return scheduler.submit(join(folder.ddG_input, 'retry_ddgs.sbatch'), folder.ddG_run,
+                            dependencies=retry_jobs, args=str(attempt + 1))
+
+
+if __name__ == '__main__':
+    retry_failed_ddgs(sys.argv[1], int(sys.argv[2]))
@@ -10,6 +10,7 @@ default_path = {
     'Rosetta_database_path': '/sbinlab/software/Rosetta_2018_Oct_d557f8/database/',
     'Rosetta_extension': 'linuxgccrelease',
     'prims_parser': '/sbinlab/tiemann/repos/PRISM/prism/scripts',
+    'alignment_cache': os.path.join(os.path.expanduser('~'), '.cache', 'rosetta_ddG_pipeline', 'alignments'),
 }
 
 
@@ -30,6 +31,7 @@ Rosetta_tools_path = load_env('Rosetta_tools_path')
 Rosetta_database_path = load_env('Rosetta_database_path')
 Rosetta_extension = load_env('Rosetta_extension')
 prims_parser = load_env('prims_parser')
+alignment_cache = load_env('alignment_cache')
 
 print('current env paths & exec:', TMalign_exec, muscle_exec, ddG_pipeline, Rosetta_main_path,
       Rosetta_tools_path, Rosetta_database_path, Rosetta_extension, prims_parser)
@@ -51,3 +53,6 @@ path_to_muscle = muscle_exec
 
 # TMalign exec
 path_to_TMalign = TMalign_exec
+
+# index maps of sequence_alignment.py, shared by all runs
+path_to_alignment_cache = alignment_cache
@@ -9,40 +9,71 @@ Date of last major changes: 2020-04-15
 
 # Standard library imports
 import logging as logger
-from os.path import join
-import subprocess
+from os.path import isfile, join
 
+# Local application imports
+import adaptive
+from helper import ddg_sbatch_files
+import retry
+from scheduler import SlurmScheduler
 
-def relaxation(folder):
 
-    relax_call = subprocess.Popen(f'sbatch {join(folder.relax_input, "rosetta_relax.sbatch")}', stdout=subprocess.PIPE, shell=True, cwd=folder.relax_run)
+def relaxation(folder, scheduler=None):
+    if scheduler == None:
+        scheduler = SlurmScheduler()
 
-    relax_process_id_info = relax_call.communicate()
-    relax_process_id = str(relax_process_id_info[0]).split()[3][0:-3]
+    relax_job = scheduler.submit(join(folder.relax_input, "rosetta_relax.sbatch"), folder.relax_run)
 
-    parse_relaxation_call = subprocess.Popen(f'sbatch --dependency=afterany:{relax_process_id} {join(folder.relax_input, "parse_relax.sbatch")}', stdout=subprocess.PIPE, shell=True, cwd=folder.relax_run)
+    parse_relax_job = scheduler.submit(join(folder.relax_input, "parse_relax.sbatch"), folder.relax_run, dependencies=[relax_job])
 
-    parse_relax_process_id_info = parse_relaxation_call.communicate()
-    parse_relax_process_id = str(
-        parse_relax_process_id_info[0]).split()[3][0:-3]
+    return parse_relax_job
 
-    return parse_relax_process_id
 
-
-def ddg_calculation(folder, parse_relax_process_id=None):
-    if parse_relax_process_id == None:
-        dependency = ''
-        parse_relax_process_id = ''
+def ddg_calculation(folder, parse_relax_job=None, scheduler=None, basename='rosetta_ddg'):
+    if scheduler == None:
+        scheduler = SlurmScheduler()
+    if parse_relax_job == None:
+        dependencies = []
     else:
-        dependency = '--dependency=afterany:'
-
-    ddg_call = subprocess.Popen(f'sbatch {dependency}{parse_relax_process_id} {join(folder.ddG_input, "rosetta_ddg.sbatch")}', stdout=subprocess.PIPE, shell=True, cwd=folder.ddG_run)
-
-    ddg_process_id_info = ddg_call.communicate()
-
-    logger.info(f'ddG process ID info: {ddg_process_id_info}')
-    ddg_process_id = str(ddg_process_id_info[0]).split()[3][0:-3]
-
-    parse_results_call = subprocess.Popen(f'sbatch --dependency=afterany:{ddg_process_id} {join(folder.ddG_input, "parse_ddgs.sbatch")}', stdout=subprocess.PIPE, shell=True, cwd=folder.ddG_run)
-
-    return
+        dependencies = [parse_relax_job]
+
+    # large arrays are split into several sbatch files; the parse job
+    # waits for all of them
+    ddg_jobs = []
+    for path_to_sbatch in ddg_sbatch_files(folder.ddG_input, basename=basename):
+        ddg_job = scheduler.submit(path_to_sbatch, folder.ddG_run, dependencies=dependencies)
+        logger.info(f'ddG job: {ddg_job}')
+        retry.record_ddg_jobs(folder.ddG_run, 0, ddg_job.job_id, path_to_sbatch)
+        ddg_jobs.append(ddg_job)
+
+    # with retries enabled at create, a retry controller runs after each
+    # wave; the adaptive controller (if enabled) or the parse job follows
+    # the last one
+    path_to_retry_sbatch = join(folder.ddG_input, "retry_ddgs.sbatch")
+    if isfile(path_to_retry_sbatch):
+        if scheduler.blocking:
+            # the waves are already finished here, so retry in-process
+            retry_in_process(folder, scheduler)
+        else:
+            return scheduler.submit(path_to_retry_sbatch, folder.ddG_run, dependencies=ddg_jobs, args='1')
+
+    if scheduler.blocking and isfile(join(folder.ddG_input, "adaptive_ddgs.sbatch")):
+        adaptive.adaptive_in_process(folder, scheduler)
+        return retry.submit_parse(folder, scheduler)
+
+    return retry.submit_after_ddgs(folder, scheduler, dependencies=ddg_jobs)
+
+
+def retry_in_process(folder, scheduler):
+    config, retry_folder = retry.read_config(join(folder.ddG_input, 'retry.json'))
+    for attempt in range(1, config['max_retries'] + 1):
+        failed = retry.failed_units(retry_folder, config, attempt)
+        if len(failed) == 0:
+            break
+        if retry.walltime_capped(retry_folder, config, attempt):
+            retry.log_unretried(config, failed, attempt)
+            break
+        logger.info(f'Retry attempt {attempt}: rerunning {len(failed)} units')
+        for path_to_sbatch in retry.write_retry_arrays(retry_folder, config, failed, attempt):
+            job = scheduler.submit(path_to_sbatch, folder.ddG_run)
+            retry.record_ddg_jobs(folder.ddG_run, attempt, job.job_id, path_to_sbatch)
@@ -18,21 +18,31 @@ import sys
 # import getopt
 
 # Local application imports
+import adaptive
 from AnalyseStruc import get_structure_parameters
 from analysis import calc_all
 from args_pipeline import parse_args2
+from campaign import run_campaign
 from checks import compare_mutfile, pdbxmut
 from folders import folder2
 from helper import create_symlinks, create_copy, find_copy, get_mut_dict, read_fasta, check_path
 import mp_prepare
 import mp_ddG
-from pdb_to_fasta_seq import pdb_to_fasta_seq
+import parse_shards
 from plotting import plot_all
 from prism_rosetta_parser import prism_to_mut, read_from_prism
+import resume
+import retry
 import rosetta_paths
 import run_modes
+from runtime_model import load_runtime_model
+from scheduler import get_scheduler
+from stages import StageCache, clear_outputs, relax_stage, tool_stamp
+from status import report_status
 import storeinputs
 from structure_input import structure
+from structure_model import load_structure
+import work_queue
 from make_logs import make_log
 
 
@@ -56,9 +66,20 @@ def predict_stability(args):
     mp_span = args.MP_SPAN_INPUT
     verbose = args.VERBOSE
     partition=args.SLURM_PARTITION
+    scheduler = get_scheduler(args.EXECUTOR, max_workers=args.MAX_WORKERS)
 
     if run_struc == None:
         run_struc = chain_id
+    # Options of the MP ddG calculation
+    if args.MP_PH == -1:
+        is_pH = 0
+        pH_value = 7
+    else:
+        is_pH = 1
+        pH_value = args.MP_PH
+    mp_options = {'repack_radius': args.BENCH_MP_REPACK, 'lipids': args.MP_LIPIDS,
+                  'temperature': args.MP_TEMPERATURE, 'repeats': args.BENCH_MP_REPEAT,
+                  'is_pH': is_pH, 'pH_value': pH_value}
     # System name
     name = os.path.splitext(os.path.basename(structure_list))[0]
 
@@ -68,8 +89,10 @@ def predict_stability(args):
 
     # Store input files
     input_dict = storeinputs.storeinputfuc(name, args, folder)
+    # Hashes of the stages of previous runs in this folder
+    stage_cache = StageCache(folder, enabled=not args.FORCE_STAGES)
 
-    if mode == "proceed" or mode == "relax" or mode == "ddg_calculation":
+    if mode == "proceed" or mode == "relax" or mode == "ddg_calculation" or mode == "resume":
         mutation_input == "proceed"
         logger.info(f'No preparation, proceeding to execution')
 
@@ -118,26 +141,54 @@ def predict_stability(args):
 
         # Cleaning pdb and making fasta based on pdb or uniprot-id if provided
         logger.info(f'Prepare the pdb and extract fasta file')
-        structure_instance.path_to_cleaned_pdb, struc_dic_cleaned = structure_instance.clean_up_and_isolate()
-        structure_instance.fasta_seq = pdb_to_fasta_seq(
-            structure_instance.path_to_cleaned_pdb)
+        clean_inputs = [prep_struc, run_struc, args.CLEAN_PDB, tool_stamp(rosetta_paths.path_to_clean_pdb)]
+        clean_outputs = [os.path.join(folder.prepare_cleaning, f'input_{run_struc}.pdb')] + [
+            os.path.join(folder.prepare_cleaning, f'input_{chain}.fasta') for chain in str(run_struc)]
+        run_clean = not stage_cache.up_to_date('clean', clean_inputs, clean_outputs)
+        structure_instance.path_to_cleaned_pdb, struc_dic_cleaned = structure_instance.clean_up_and_isolate(
+            run_clean=run_clean, native=args.CLEAN_PDB == 'native')
+        if run_clean:
+            stage_cache.done('clean', clean_inputs, clean_outputs)
+        # parsed by clean_up_and_isolate already
+        structure_instance.fasta_seq = load_structure(
+            structure_instance.path_to_cleaned_pdb).fasta_seq
         if uniprot_accesion != "":
             structure_instance.uniprot_seq = read_fasta(
                 uniprot_accesion)
-            structure_instance.muscle_align_to_uniprot(structure_instance.uniprot_seq)
+            align_sequence = structure_instance.uniprot_seq
         else:
-            structure_instance.muscle_align_to_uniprot(structure_instance.fasta_seq)
+            align_sequence = structure_instance.fasta_seq
+        if args.ALIGN == 'native':
+            # cached by sequence in rosetta_paths.path_to_alignment_cache
+            structure_instance.muscle_align_to_uniprot(align_sequence)
+        else:
+            align_inputs = [structure_instance.fasta_seq, align_sequence, tool_stamp(rosetta_paths.path_to_muscle)]
+            align_outputs = [os.path.join(folder.prepare_checking, 'alignment.txt')]
+            run_muscle = not stage_cache.up_to_date('align', align_inputs, align_outputs)
+            structure_instance.muscle_align_to_uniprot(align_sequence, run_muscle=run_muscle, native=False)
+            if run_muscle:
+                stage_cache.done('align', align_inputs, align_outputs)
 
         # Get span file for mp from cleaned file if not provided
         if args.IS_MP == True:
-            if input_dict['MP_SPAN_INPUT'] == None:
+            span_inputs = [structure_instance.path_to_cleaned_pdb, args.MP_CALC_SPAN_MODE,
+                           args.MP_THICKNESS, tool_stamp(rosetta_paths.path_to_rosetta)]
+            span_outputs = [folder.prepare_mp_span]
+            if input_dict['MP_SPAN_INPUT'] == None and stage_cache.up_to_date('span', span_inputs, span_outputs):
+                structure_instance.span = sorted(os.path.join(folder.prepare_mp_span, fname) for fname in
+                                                 os.listdir(folder.prepare_mp_span) if fname.endswith('.span'))
+            elif input_dict['MP_SPAN_INPUT'] == None:
                 logger.info(f'Calculate span file with option {args.MP_CALC_SPAN_MODE}')
+                # copies of old span files are not overwritten by create_copy
+                clear_outputs([os.path.join(folder.prepare_output, 'spanfiles'),
+                               os.path.join(folder.relax_input, 'spanfiles'),
+                               os.path.join(folder.ddG_input, 'spanfiles')])
                 if args.MP_CALC_SPAN_MODE == 'DSSP':
                     structure_instance.span = mp_prepare.mp_span_from_pdb_dssp(
-                        structure_instance.path_to_cleaned_pdb, folder.prepare_mp_span, thickness=args.MP_THICKNESS, SLURM=False)
+                        structure_instance.path_to_cleaned_pdb, folder.prepare_mp_span, thickness=args.MP_THICKNESS)
                 elif args.MP_CALC_SPAN_MODE == 'octopus':
                     structure_instance.span = mp_prepare.mp_span_from_pdb_octopus(
-                        structure_instance.path_to_cleaned_pdb, folder.prepare_mp_span, thickness=args.MP_THICKNESS, SLURM=False)
+                        structure_instance.path_to_cleaned_pdb, folder.prepare_mp_span)
                 elif args.MP_CALC_SPAN_MODE == 'False':
                     logger.warn(
                         'No span file provided and no calculation method selected.')
@@ -145,6 +196,7 @@ def predict_stability(args):
                     logger.error(
                         'Other modes (struc, bcl, Boctopus) not yet implemented.')
                     sys.exit()
+                stage_cache.done('span', span_inputs, span_outputs)
             elif input_dict['MP_SPAN_INPUT'] != None:
                 structure_instance.span = create_copy(
                     input_dict['MP_SPAN_INPUT'], folder.prepare_mp_span, name='input.span')
@@ -161,10 +213,20 @@ def predict_stability(args):
         logger.info(f'Generate mutfiles.')
         print(input_dict['MUTATION_INPUT'])
         
-        check2 = structure_instance.make_mutfiles(
-            new_mut_input)
+        mutfile_inputs = [new_mut_input, structure_instance.path_to_cleaned_pdb,
+                          structure_instance.path_to_index_string]
+        mutfile_outputs = [folder.prepare_mutfiles]
+        if not stage_cache.up_to_date('mutfiles', mutfile_inputs, mutfile_outputs):
+            # mutfiles of removed mutations must not survive in the copies
+            clear_outputs([folder.prepare_mutfiles, os.path.join(folder.prepare_output, 'mutfiles'),
+                           os.path.join(folder.ddG_input, 'mutfiles')])
+            os.makedirs(folder.prepare_mutfiles)
+            check2 = structure_instance.make_mutfiles(
+                new_mut_input)
+            stage_cache.done('mutfiles', mutfile_inputs, mutfile_outputs)
         check1 = compare_mutfile(structure_instance.fasta_seq,
-                                 folder.prepare_mutfiles, folder.prepare_checking, new_mut_input)
+                                 folder.prepare_mutfiles, folder.prepare_checking, new_mut_input,
+                                 index_map=structure_instance.index_map)
         check3, errors = pdbxmut(folder.prepare_mutfiles, struc_dic_cleaned)
         check2 = False
 
@@ -189,6 +251,13 @@ def predict_stability(args):
 
         # Generate sbatch files
         logger.info(f'Generate sbatch files')
+        if args.RUNTIME_MODEL == None:
+            ddg_runtime_model = None
+        elif args.IS_MP == True:
+            ddg_runtime_model = load_runtime_model(args.RUNTIME_MODEL, prepare_output_struc, kind='mp',
+                                                   repack_radius=args.BENCH_MP_REPACK)
+        else:
+            ddg_runtime_model = load_runtime_model(args.RUNTIME_MODEL, prepare_output_struc)
         if args.IS_MP == True:
 
             # copy MP relax input files
@@ -205,7 +274,8 @@ def predict_stability(args):
 
             # Parse sbatch relax parser
             path_to_parse_relax_results_sbatch = structure_instance.parse_relax_sbatch(
-                folder, sys_name=f'{name}_relax', sc_name='relax_scores', partition=args.SLURM_PARTITION)
+                folder, sys_name=f'{name}_relax', sc_name='relax_scores', partition=args.SLURM_PARTITION,
+                keep_top=args.RELAX_KEEP_TOP)
 
             # Parse sbatch ddg file
             ddg_input_ddgfile = create_copy(
@@ -213,17 +283,17 @@ def predict_stability(args):
             ddg_input_span_dir = create_copy(
                 prepare_output_span_dir, folder.ddG_input, name='spanfiles', directory=True)
 
-            if args.MP_PH == -1:
-                is_pH = 0
-                pH_value = 7
+            if args.WORK_QUEUE_WORKERS > 0:
+                path_to_ddg_calc_sbatch = work_queue.write_queue_sbatch(
+                    folder, work_queue.mp_units(mut_dic, mp_ddG.mp_ddg_command(folder, **mp_options),
+                                                runtime_model=ddg_runtime_model),
+                    n_workers=args.WORK_QUEUE_WORKERS, sys_name=name, partition=partition,
+                    mem=5000, runtime_model=ddg_runtime_model)
             else:
-                is_pH = 1
-                pH_value = args.MP_PH
-            path_to_ddg_calc_sbatch = mp_ddG.rosetta_ddg_mp_pyrosetta(
-                folder, mut_dic, SLURM=True, sys_name=name, partition=args.SLURM_PARTITION,
-                repack_radius=args.BENCH_MP_REPACK, lipids=args.MP_LIPIDS,
-                temperature=args.MP_TEMPERATURE, repeats=args.BENCH_MP_REPEAT,
-                is_pH=is_pH, pH_value=pH_value)
+                path_to_ddg_calc_sbatch = mp_ddG.rosetta_ddg_mp_pyrosetta(
+                    folder, mut_dic, SLURM=True, sys_name=name, partition=args.SLURM_PARTITION,
+                    max_array_size=args.SLURM_MAX_ARRAY_SIZE, array_throttle=args.SLURM_ARRAY_THROTTLE,
+                    runtime_model=ddg_runtime_model, **mp_options)
             # Parse sbatch ddg parser
             path_to_parse_ddg_sbatch = mp_ddG.write_parse_rosetta_ddg_mp_pyrosetta_sbatch(
                 folder, uniprot=args.UNIPROT_ID, sys_name=name, output_name='ddG.out', partition=partition)
@@ -238,26 +308,65 @@ def predict_stability(args):
                 folder,  partition=partition)
             # Parse sbatch relax parser
             path_to_parse_relax_results_sbatch = structure_instance.parse_relax_sbatch(
-                folder, partition=args.SLURM_PARTITION)
+                folder, partition=args.SLURM_PARTITION, keep_top=args.RELAX_KEEP_TOP)
 
             # Parse sbatch ddg file
             ddg_input_ddgfile = create_copy(
                 input_dict['DDG_FLAG_FILE'], folder.ddG_input, name='ddg_flagfile')
             ddg_input_mutfile_dir = create_copy(
                 prepare_output_ddg_mutfile_dir, folder.ddG_input, name='mutfiles', directory=True)
-            path_to_ddg_calc_sbatch = structure_instance.write_rosetta_cartesian_ddg_sbatch(
-                folder, ddg_input_mutfile_dir, ddgfile=ddg_input_ddgfile, sys_name=name,  partition=partition)
-            # Parse sbatch ddg parser
-            path_to_parse_ddg_sbatch = structure_instance.write_parse_cartesian_ddg_sbatch(
-                folder,  partition=partition)
+            if args.WORK_QUEUE_WORKERS > 0:
+                path_to_ddg_calc_sbatch = work_queue.write_queue_sbatch(
+                    folder, work_queue.cartesian_units(folder, ddg_input_mutfile_dir, ddgfile=ddg_input_ddgfile,
+                                                       runtime_model=ddg_runtime_model),
+                    n_workers=args.WORK_QUEUE_WORKERS, sys_name=name, partition=partition,
+                    runtime_model=ddg_runtime_model)
+            else:
+                path_to_ddg_calc_sbatch = structure_instance.write_rosetta_cartesian_ddg_sbatch(
+                    folder, ddg_input_mutfile_dir, ddgfile=ddg_input_ddgfile, sys_name=name,  partition=partition,
+                    mutfiles_per_task=args.MUTFILES_PER_TASK, max_array_size=args.SLURM_MAX_ARRAY_SIZE,
+                    array_throttle=args.SLURM_ARRAY_THROTTLE, runtime_model=ddg_runtime_model)
             # Parse sbatch ddg parser
             path_to_parse_ddg_sbatch = structure_instance.write_parse_cartesian_ddg_sbatch(
-                folder, structure_instance.fasta_seq, structure_instance.chain_id, sys_name=name, partition=args.SLURM_PARTITION)
+                folder,  partition=partition, n_shards=args.PARSE_SHARDS)
+
+        # Map array of the sharded parse of large cartesian runs
+        if args.PARSE_SHARDS > 0 and args.IS_MP == True:
+            logger.warning('Parse shards are only available for cartesian ddG, not for --is_membrane')
+        if args.PARSE_SHARDS > 0 and args.IS_MP != True:
+            parse_shards.write_parse_shards_sbatch(
+                folder, structure_instance.fasta_seq, args.PARSE_SHARDS, sys_name=name, partition=partition)
+        else:
+            parse_shards.remove_parse_shards_sbatch(folder)
+
+        # Retry controller for cancelled or failed ddG tasks
+        if args.MAX_RETRIES > 0:
+            path_to_retry_sbatch = retry.write_retry_sbatch(
+                folder, sys_name=name, is_mp=args.IS_MP, partition=partition,
+                max_retries=args.MAX_RETRIES, time_factor=args.RETRY_TIME_FACTOR,
+                mem_factor=args.RETRY_MEM_FACTOR, mutfiles_per_task=args.MUTFILES_PER_TASK,
+                max_array_size=args.SLURM_MAX_ARRAY_SIZE, array_throttle=args.SLURM_ARRAY_THROTTLE,
+                mp_options=mp_options)
+        else:
+            retry.remove_retry_sbatch(folder)
+
+        # Adaptive replicates for unconverged cartesian ddGs
+        if args.ADAPTIVE_CI > 0 and args.IS_MP != True:
+            adaptive.write_adaptive_sbatch(
+                folder, structure_instance.fasta_seq, sys_name=name, partition=partition,
+                ci_threshold=args.ADAPTIVE_CI, batch_size=args.ADAPTIVE_BATCH,
+                max_replicates=args.ADAPTIVE_MAX_REPLICATES, max_array_size=args.SLURM_MAX_ARRAY_SIZE,
+                array_throttle=args.SLURM_ARRAY_THROTTLE)
+        else:
+            adaptive.remove_adaptive_sbatch(folder)
 
     # Execution
     # Single SLURM execution
     if mode == 'relax':
-        parse_relax_process_id = run_modes.relaxation(folder)
+        relax_inputs, relax_outputs = relax_stage(folder)
+        clear_outputs(relax_outputs)
+        parse_relax_job = run_modes.relaxation(folder, scheduler=scheduler)
+        stage_cache.done('relax', relax_inputs, relax_outputs, hash_outputs=False)
         relax_output_strucfile = find_copy(
             folder.relax_run, '.pdb', folder.relax_output, 'output.pdb')
 
@@ -271,25 +380,42 @@ def predict_stability(args):
 # logger.info(f"Relaxed structure for ddG calculations: {relax_pdb_out}")
 
     if mode == 'ddg_calculation':
-        run_modes.ddg_calculation(folder)
+        run_modes.ddg_calculation(folder, scheduler=scheduler)
 #        ddg_output_score = find_copy(
 #            folder.ddG_run, '.sc', folder.ddG_output, 'output.sc')
 
+    if mode == 'resume':
+        paths_to_resume_sbatch = resume.resume_ddg(
+            folder, sys_name=name, is_mp=args.IS_MP, partition=partition,
+            mutfiles_per_task=args.MUTFILES_PER_TASK, max_array_size=args.SLURM_MAX_ARRAY_SIZE,
+            array_throttle=args.SLURM_ARRAY_THROTTLE, mp_options=mp_options)
+        if paths_to_resume_sbatch == []:
+            logger.info('All ddG calculations have complete output, nothing to resume')
+        else:
+            run_modes.ddg_calculation(folder, scheduler=scheduler, basename='resume_ddg')
+
     if mode == 'analysis':
         calc_all(folder, sys_name=name)
         plot_all(folder, sys_name=name)
 
     # Full SLURM execution
     if mode == 'proceed' or mode == 'fullrun':
-        # Start relax calculation
-        parse_relax_process_id = run_modes.relaxation(folder)
+        # Start relax calculation, unless the relaxed structure of an
+        # earlier run with the same relax input can be reused
+        relax_inputs, relax_outputs = relax_stage(folder)
+        if stage_cache.up_to_date('relax', relax_inputs, relax_outputs):
+            parse_relax_job = None
+        else:
+            clear_outputs(relax_outputs)
+            parse_relax_job = run_modes.relaxation(folder, scheduler=scheduler)
+            stage_cache.done('relax', relax_inputs, relax_outputs, hash_outputs=False)
         # relax_output_strucfile = find_copy(
         # folder.relax_run, '.pdb', folder.relax_output, 'output.pdb')
         # Start ddG calculation
         # ddg_input_struc = create_copy(
         # os.path.join(folder.relax_output, 'output.pdb'), folder.ddG_input,
         # name='input.pdb')
-        run_modes.ddg_calculation(folder, parse_relax_process_id)
+        run_modes.ddg_calculation(folder, parse_relax_job, scheduler=scheduler)
 #        ddg_output_score = find_copy(
 #            folder.ddG_run, '.sc', folder.ddG_output, 'output.sc')
 
@@ -300,4 +426,9 @@ def predict_stability(args):
 if __name__ == '__main__':
 
     args = parse_args2()
-    predict_stability(args)
+    if args.MODE == 'campaign':
+        run_campaign(args)
+    elif args.MODE == 'status':
+        report_status(args)
+    else:
+        predict_stability(args)
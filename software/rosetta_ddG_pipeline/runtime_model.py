@@ -0,0 +1,214 @@
+"""runtime_model.py estimates walltime and memory of ddG array tasks.
+
+The model is fit on the accounting data (sacct) of finished runs:
+
+    python3 runtime_model.py model.json run_folder [run_folder ...]
+
+collects one sample per completed array task (residue count, mutations
+and their neighbours within the repack radius, elapsed time and MaxRSS),
+adds them to the samples in model.json and refits the linear models
+
+    seconds = c0 + c1 * mutations + c2 * sum(neighbours) + c3 * mutations * residues
+    memory  = m0 + m1 * residues
+
+for cartesian and MP ddG separately. The sbatch writers use the model
+(--runtime_model) for per-array --time and --mem requests.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import json
+import logging as logger
+import math
+import os
+from os.path import isfile, join
+import subprocess
+import sys
+
+# Third party imports
+import numpy as np
+
+# Local application imports
+from helper import AttrDict, read_mutfile
+import resume
+from retry import job_task_units, read_ddg_jobs
+from structure_model import load_structure
+
+
+def structure_features(path_to_pdb, repack_radius=8.0):
+    """Returns the number of residues and the neighbour count of every residue.
+
+    Neighbours are residues with any atom within repack_radius. They are
+    keyed by pose number (position in the file, as in mutfiles) and by
+    PDB residue number (as in MP runs). The structure is read from the
+    sidecar structure_input.npz next to path_to_pdb (see structure_model.py).
+    """
+    sidecar = join(os.path.dirname(os.path.abspath(path_to_pdb)), 'structure_input.npz')
+    try:
+        model = load_structure(path_to_pdb, sidecar=sidecar)
+    except OSError:
+        # a read-only run folder only costs the parse next time
+        model = load_structure(path_to_pdb)
+    neighbours = model.neighbour_counts(repack_radius).tolist()
+    by_pose = {str(n + 1): count for n, count in enumerate(neighbours)}
+    by_resnum = {str(resnum): count for resnum, count in zip(model.residue_numbers.tolist(), neighbours)}
+    return len(model), by_pose, by_resnum
+
+
+def task_features(n_residues, mutation_neighbours):
+    # mutation_neighbours: neighbour count of the residue of every mutation
+    n_mutations = len(mutation_neighbours)
+    return [1, n_mutations, sum(mutation_neighbours), n_mutations * n_residues]
+
+
+def fit(samples):
+    """Least squares fit of the time and memory models on a list of samples."""
+    time_x = np.array([task_features(sample['residues'], sample['neighbours']) for sample in samples], dtype=float)
+    time_y = np.array([sample['seconds'] for sample in samples], dtype=float)
+    mem_x = np.array([[1, sample['residues']] for sample in samples], dtype=float)
+    mem_y = np.array([sample['mem'] for sample in samples], dtype=float)
+    return {'time': np.linalg.lstsq(time_x, time_y, rcond=None)[0].tolist(),
+            'mem': np.linalg.lstsq(mem_x, mem_y, rcond=None)[0].tolist()}
+
+
+class RuntimeModel:
+    """Predicts the resources of ddG array tasks on one structure.
+
+    kind is 'cartesian' (mutfile residues in pose numbering) or 'mp' (PDB
+    residue numbers). Requests are the prediction times margin, but at
+    least min_hours and min_mem.
+    """
+
+    def __init__(self, path_to_model, path_to_pdb, kind='cartesian', repack_radius=8.0,
+                 margin=1.5, min_hours=0.25, min_mem=500):
+        with open(path_to_model, 'r') as fp:
+            self.coefficients = json.load(fp)['models'][kind]
+        self.kind = kind
+        self.margin = margin
+        self.min_hours = min_hours
+        self.min_mem = min_mem
+        self.n_residues, by_pose, by_resnum = structure_features(path_to_pdb, repack_radius=repack_radius)
+        if kind == 'cartesian':
+            self.neighbours = by_pose
+        else:
+            self.neighbours = by_resnum
+        self.mean_neighbours = float(np.mean(list(self.neighbours.values())))
+
+    def estimate(self, residues):
+        """Returns the estimated hours and memory (MB) of a task mutating residues.
+
+        residues holds the residue number of every mutation of the task.
+        """
+        features = task_features(self.n_residues, [self.neighbours.get(str(resnum), self.mean_neighbours)
+                                                   for resnum in residues])
+        hours = max(0.0, float(np.dot(self.coefficients['time'], features))) / 3600
+        mem = max(0.0, float(np.dot(self.coefficients['mem'], [1, self.n_residues])))
+        return hours, mem
+
+    def request(self, tasks):
+        """Returns --time hours, --mem and the estimated CPU-hours of a list of tasks."""
+        estimates = [self.estimate(residues) for residues in tasks]
+        hours = max(self.min_hours, self.margin * max(estimate[0] for estimate in estimates))
+        mem = max(self.min_mem, self.margin * max(estimate[1] for estimate in estimates))
+        return hours, int(math.ceil(mem / 100) * 100), sum(estimate[0] for estimate in estimates)
+
+
+def load_runtime_model(path_to_model, path_to_pdb, kind='cartesian', repack_radius=8.0):
+    # returns None (fixed requests) if no model was fit for this kind yet
+    with open(path_to_model, 'r') as fp:
+        models = json.load(fp)['models']
+    if kind not in models:
+        logger.warning(f'No {kind} runtime model in {path_to_model}, using the default requests')
+        return None
+    return RuntimeModel(path_to_model, path_to_pdb, kind=kind, repack_radius=repack_radius)
+
+
+def parse_sacct_usage(output):
+    # sacct -n -P -o JobID,State,ElapsedRaw,MaxRSS lines; the elapsed time
+    # is on the task line, MaxRSS on its .batch step
+    usage = {}
+    for line in output.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) < 4 or '_' not in fields[0]:
+            continue
+        job_id, task = fields[0].split('.')[0].split('_')
+        if not task.isdigit():
+            continue
+        record = usage.setdefault((job_id, int(task)), {'state': '', 'seconds': 0, 'mem': 0})
+        if '.' not in fields[0]:
+            record['state'] = fields[1].split()[0]
+            record['seconds'] = int(fields[2] or 0)
+        elif fields[3] != '':
+            factor = {'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024 ** 2}.get(fields[3][-1], 1 / 1024 ** 2)
+            record['mem'] = max(record['mem'], float(fields[3].rstrip('KMGT')) * factor)
+    return usage
+
+
+def collect_samples(output_path):
+    """Returns one sample per completed ddG array task of a run folder."""
+    with open(join(output_path, 'input', 'args.info'), 'r') as fp:
+        args = json.load(fp)
+    folder = AttrDict({'input': join(output_path, 'input'),
+                       'prepare_input': join(output_path, 'prepare', 'input'),
+                       'ddG_input': join(output_path, 'ddG', 'input'),
+                       'ddG_run': join(output_path, 'ddG', 'run')})
+    kind = 'mp' if args['IS_MP'] else 'cartesian'
+    repack_radius = args['BENCH_MP_REPACK'] if args['IS_MP'] else 8.0
+    n_residues, by_pose, by_resnum = structure_features(join(folder.ddG_input, 'input.pdb'), repack_radius)
+    if kind == 'mp':
+        neighbours = by_resnum
+        mut_dict = resume.mp_mut_dict(folder)
+    else:
+        neighbours = by_pose
+
+    jobs = read_ddg_jobs(folder.ddG_run, None)
+    if jobs == {}:
+        return []
+    process = subprocess.run(['sacct', '-n', '-P', '-o', 'JobID,State,ElapsedRaw,MaxRSS', '-j', ','.join(jobs)],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    samples = []
+    for (job_id, task), record in parse_sacct_usage(process.stdout).items():
+        if record['state'] != 'COMPLETED' or job_id not in jobs:
+            continue
+        # tasks of shared campaign arrays may belong to other proteins
+        units = job_task_units(jobs[job_id], task)
+        if units == []:
+            continue
+        residues = []
+        for unit in units:
+            if kind == 'mp':
+                residues.extend([unit] * len(mut_dict.get(unit, '')))
+            else:
+                residues.extend(resnum for resnum, mut in read_mutfile(unit))
+        samples.append({'id': f'{output_path}:{job_id}_{task}', 'kind': kind, 'residues': n_residues,
+                        'neighbours': [neighbours.get(resnum, 0) for resnum in residues],
+                        'seconds': record['seconds'], 'mem': record['mem']})
+    return samples
+
+
+def update_model(path_to_model, output_paths):
+    """Adds the samples of output_paths to path_to_model and refits the models."""
+    model = {'samples': [], 'models': {}}
+    if isfile(path_to_model):
+        with open(path_to_model, 'r') as fp:
+            model = json.load(fp)
+    samples = {sample['id']: sample for sample in model['samples']}
+    for output_path in output_paths:
+        for sample in collect_samples(os.path.abspath(output_path)):
+            samples[sample['id']] = sample
+    model['samples'] = list(samples.values())
+    for kind in ['cartesian', 'mp']:
+        kind_samples = [sample for sample in model['samples'] if sample['kind'] == kind]
+        if len(kind_samples) >= 4:
+            model['models'][kind] = fit(kind_samples)
+        logger.info(f'{kind}: {len(kind_samples)} samples')
+    with open(path_to_model, 'w') as fp:
+        json.dump(model, fp)
+    return model
+
+
+if __name__ == '__main__':
+    update_model(sys.argv[1], sys.argv[2:])
@@ -0,0 +1,165 @@
+"""scheduler.py submits the generated sbatch files and tracks the resulting jobs.
+
+SlurmScheduler submits with sbatch --parsable and asks sacct (or squeue as
+fallback) for the states of many jobs in one call. LocalScheduler runs
+the same files on a local process pool and is used for workstations and
+tests.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import logging as logger
+import subprocess
+import time
+
+# Local application imports
+from local_executor import run_sbatch_locally
+
+
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+COMPLETED = 'COMPLETED'
+FAILED = 'FAILED'
+UNKNOWN = 'UNKNOWN'
+FINISHED_STATES = [COMPLETED, FAILED, 'CANCELLED', 'TIMEOUT', 'OUT_OF_MEMORY',
+                   'NODE_FAIL', 'PREEMPTED', 'BOOT_FAIL', 'DEADLINE']
+
+
+class Job:
+    """Handle of a submitted (array) job."""
+
+    def __init__(self, job_id, path_to_sbatch, scheduler):
+        self.job_id = str(job_id)
+        self.path_to_sbatch = path_to_sbatch
+        self.scheduler = scheduler
+
+    def status(self):
+        return self.scheduler.status([self])[self.job_id]
+
+    def __repr__(self):
+        return f'Job({self.job_id}, {self.path_to_sbatch})'
+
+
+class Scheduler:
+    # blocking schedulers have finished a job when submit returns
+    blocking = False
+
+    def submit(self, path_to_sbatch, cwd, dependencies=[], args=''):
+        raise NotImplementedError
+
+    def status(self, jobs):
+        """Returns {job_id: state} for all jobs, queried in one call."""
+        raise NotImplementedError
+
+    def wait(self, jobs, poll_interval=60):
+        # polls until all jobs reached a final state
+        while True:
+            states = self.status(jobs)
+            if all(state in FINISHED_STATES for state in states.values()):
+                return states
+            time.sleep(poll_interval)
+
+
+def combine_states(states):
+    # one state for all tasks of an array job
+    if len(states) == 0:
+        return UNKNOWN
+    if RUNNING in states:
+        return RUNNING
+    if PENDING in states:
+        return PENDING
+    if all(state == COMPLETED for state in states):
+        return COMPLETED
+    for state in states:
+        if state != COMPLETED:
+            return state
+
+
+def parse_sacct(output):
+    # sacct -P -n -o JobID,State lines, e.g. '123_4|COMPLETED' or
+    # '123_[5-9%10]|PENDING'; 'CANCELLED by 42' is reduced to CANCELLED
+    task_states = {}
+    for line in output.splitlines():
+        fields = line.strip().split('|')
+        if len(fields) < 2 or fields[0] == '':
+            continue
+        job_id = fields[0].split('_')[0].split('.')[0]
+        task_states.setdefault(job_id, []).append(fields[1].split()[0])
+    return {job_id: combine_states(states) for job_id, states in task_states.items()}
+
+
+def parse_squeue(output):
+    # squeue -h -o '%i %T' lines, e.g. '123_4 RUNNING'
+    task_states = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        task_states.setdefault(fields[0].split('_')[0], []).append(fields[1])
+    return {job_id: combine_states(states) for job_id, states in task_states.items()}
+
+
+class SlurmScheduler(Scheduler):
+
+    def submit(self, path_to_sbatch, cwd, dependencies=[], args=''):
+        command = ['sbatch', '--parsable']
+        if dependencies != []:
+            command.append(f'--dependency=afterany:{":".join(str(job.job_id) for job in dependencies)}')
+        command.append(path_to_sbatch)
+        command.extend(args.split())
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 cwd=cwd, universal_newlines=True)
+        if process.returncode != 0:
+            logger.error(f'sbatch failed for {path_to_sbatch}: {process.stderr}')
+            raise RuntimeError(f'sbatch failed for {path_to_sbatch}: {process.stderr}')
+        # --parsable prints "jobid" or "jobid;cluster"
+        job_id = process.stdout.strip().split(';')[0]
+        logger.info(f'Submitted {path_to_sbatch} as job {job_id}')
+        return Job(job_id, path_to_sbatch, self)
+
+    def status(self, jobs):
+        job_ids = [job.job_id for job in jobs]
+        if job_ids == []:
+            return {}
+        process = subprocess.run(['sacct', '-n', '-P', '-X', '-o', 'JobID,State', '-j', ','.join(job_ids)],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        if process.returncode == 0:
+            states = parse_sacct(process.stdout)
+        else:
+            # without accounting only queued and running jobs are known
+            process = subprocess.run(['squeue', '-h', '-o', '%i %T', '-j', ','.join(job_ids)],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+            states = parse_squeue(process.stdout)
+        return {job_id: states.get(job_id, UNKNOWN) for job_id in job_ids}
+
+
+class LocalScheduler(Scheduler):
+    """Runs the sbatch files on a local process pool, one after the other.
+
+    submit blocks until all array tasks are done, so dependencies are
+    always fulfilled by the submission order.
+    """
+    blocking = True
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.states = {}
+
+    def submit(self, path_to_sbatch, cwd, dependencies=[], args=''):
+        job_id, failed = run_sbatch_locally(path_to_sbatch, cwd, max_workers=self.max_workers, args=args)
+        if failed == []:
+            self.states[str(job_id)] = COMPLETED
+        else:
+            self.states[str(job_id)] = FAILED
+        return Job(job_id, path_to_sbatch, self)
+
+    def status(self, jobs):
+        return {job.job_id: self.states.get(job.job_id, UNKNOWN) for job in jobs}
+
+
+def get_scheduler(executor='slurm', max_workers=None):
+    if executor == 'local':
+        return LocalScheduler(max_workers=max_workers)
+    return SlurmScheduler()
@@ -0,0 +1,108 @@
+"""sequence_alignment.py aligns the structure sequence to the UniProt sequence in-process.
+
+align_index_map(structure_seq, uniprot_seq) returns the index map of the
+create stage as an int32 array with one entry per structure residue: the
+UniProt residue number (1-based) aligned to it, 0 for residues without one.
+It replaces running MUSCLE on prepare_checking/fasta_file.fasta; the
+global alignment (BLOSUM62, gap open -10, extend -0.5, free end gaps, so a
+structure fragment is placed in the full length sequence) is the same for
+the sequences of the pipeline.
+
+Index maps are cached in memory and as .npy files in
+rosetta_paths.path_to_alignment_cache, keyed by the sha256 of both
+sequences, so repeated runs and campaign entries with the same sequences
+do not align again.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import hashlib
+import os
+from os.path import isfile, join
+
+# Third party imports
+from Bio import Align
+from Bio.Align import substitution_matrices
+import numpy as np
+
+# Local application imports
+import rosetta_paths
+
+
+# part of the cache key, change it with the scoring
+SCORING = 'global BLOSUM62 -10 -0.5 free end gaps'
+
+aligner = Align.PairwiseAligner()
+aligner.mode = 'global'
+aligner.substitution_matrix = substitution_matrices.load('BLOSUM62')
+aligner.open_gap_score = -10
+aligner.extend_gap_score = -0.5
+aligner.end_gap_score = 0
+
+# index maps by cache key
+index_maps = {}
+
+
+def alignment_key(structure_seq, uniprot_seq):
+    return hashlib.sha256(f'{SCORING}\n{structure_seq}\n{uniprot_seq}'.encode()).hexdigest()
+
+
+def alignable(sequence):
+    # letters without a BLOSUM62 entry (e.g. U, O) are aligned as X
+    alphabet = aligner.substitution_matrix.alphabet
+    return ''.join(letter if letter in alphabet else 'X' for letter in sequence.upper())
+
+
+def index_map_from_rows(structure_row, uniprot_row):
+    """Returns the index map of two gapped alignment rows (e.g. of MUSCLE)."""
+    structure_row = np.array(list(structure_row))
+    uniprot_row = np.array(list(uniprot_row))
+    uniprot_numbers = np.cumsum(uniprot_row != '-')
+    residues = structure_row != '-'
+    return np.where(uniprot_row[residues] != '-', uniprot_numbers[residues], 0).astype(np.int32)
+
+
+def uniprot_to_structure(index_map):
+    # {UniProt residue number: structure residue number (1-based)} of the
+    # aligned residues; residues without a UniProt residue (0) are left out
+    return {int(uniprot_number): structure_index + 1 for structure_index, uniprot_number in enumerate(index_map)
+            if uniprot_number != 0}
+
+
+def pairwise_index_map(structure_seq, uniprot_seq):
+    # the index map of one optimal alignment
+    alignment = aligner.align(alignable(structure_seq), alignable(uniprot_seq))[0]
+    index_map = np.zeros(len(structure_seq), dtype=np.int32)
+    for (start, end), (uniprot_start, uniprot_end) in zip(*alignment.aligned):
+        index_map[start:end] = np.arange(uniprot_start + 1, uniprot_end + 1)
+    return index_map
+
+
+def align_index_map(structure_seq, uniprot_seq, cache_dir=None):
+    """Returns the index map of structure_seq on uniprot_seq.
+
+    The map is read from cache_dir (default rosetta_paths.path_to_alignment_cache)
+    if these sequences were aligned before, and written to it otherwise.
+    """
+    key = alignment_key(structure_seq, uniprot_seq)
+    if key in index_maps:
+        return index_maps[key]
+    if cache_dir == None:
+        cache_dir = rosetta_paths.path_to_alignment_cache
+    path_to_map = join(cache_dir, f'{key}.npy')
+    if isfile(path_to_map):
+        index_maps[key] = np.load(path_to_map)
+        return index_maps[key]
+    index_maps[key] = pairwise_index_map(structure_seq, uniprot_seq)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # written to a temporary file first, other runs may read it meanwhile
+        with open(f'{path_to_map}.{os.getpid()}.tmp', 'wb') as fp:
+            np.save(fp, index_maps[key])
+        os.replace(f'{path_to_map}.{os.getpid()}.tmp', path_to_map)
+    except OSError:
+        # an unwritable cache only costs the alignment next time
+        pass
+    return index_maps[key]
@@ -0,0 +1,117 @@
+"""stages.py records content hashes of the pipeline stages to skip unchanged work.
+
+For every stage (cleaning, alignment, span, mutfiles, relax) the hash of
+its inputs (files, directories, options and tool paths) and of its outputs
+is stored in <output_path>/stage_hashes.json. A stage is up to date, and
+can be skipped, when the input hash is unchanged and all outputs still
+exist with the recorded content.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import hashlib
+import json
+import logging as logger
+import os
+from os.path import isdir, isfile, join
+import shutil
+
+# Local application imports
+import rosetta_paths
+
+
+def hash_update(sha, item):
+    # files and directories are hashed by content, everything else by value
+    if isinstance(item, str) and isfile(item):
+        sha.update(item.encode())
+        with open(item, 'rb') as fp:
+            for block in iter(lambda: fp.read(1 << 20), b''):
+                sha.update(block)
+    elif isinstance(item, str) and isdir(item):
+        for root, dirs, files in os.walk(item):
+            dirs.sort()
+            for name in sorted(files):
+                hash_update(sha, join(root, name))
+    else:
+        sha.update(repr(item).encode())
+
+
+def tool_stamp(path):
+    # tools are identified by path and modification time, not by content, so
+    # the Rosetta tree or large binaries are never read
+    if isfile(path):
+        return ('tool', path, os.path.getmtime(path))
+    return ('tool', path)
+
+
+def content_hash(items):
+    sha = hashlib.sha256()
+    for item in items:
+        hash_update(sha, item)
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def clear_outputs(paths):
+    # removes stale outputs of a stage before it is run again
+    for path in paths:
+        if isdir(path):
+            shutil.rmtree(path)
+        elif isfile(path):
+            os.remove(path)
+
+
+class StageCache:
+    """Make-style bookkeeping of the stages of one run folder."""
+
+    def __init__(self, folder, enabled=True):
+        self.path = join(folder.output_path, 'stage_hashes.json')
+        self.enabled = enabled
+        self.stages = {}
+        if isfile(self.path):
+            with open(self.path, 'r') as fp:
+                self.stages = json.load(fp)
+
+    def up_to_date(self, stage, inputs, outputs):
+        if not self.enabled or stage not in self.stages:
+            return False
+        record = self.stages[stage]
+        if record['inputs'] != content_hash(inputs):
+            return False
+        for path in outputs:
+            if not (isfile(path) or isdir(path)):
+                return False
+            # outputs of submitted jobs are only known after they finished
+            if record['outputs'].get(path) not in [None, content_hash([path])]:
+                return False
+        logger.info(f'Stage {stage} is up to date, skipping it')
+        return True
+
+    def done(self, stage, inputs, outputs, hash_outputs=True):
+        """Records the input hash and outputs of a stage.
+
+        Use hash_outputs=False for stages that run as (SLURM) jobs, whose
+        outputs do not exist yet; then only their existence is checked.
+        """
+        self.stages[stage] = {
+            'inputs': content_hash(inputs),
+            'outputs': {path: (content_hash([path]) if hash_outputs else None) for path in outputs},
+        }
+        with open(self.path, 'w') as fp:
+            json.dump(self.stages, fp, indent=4)
+
+
+def relax_stage(folder):
+    """Returns the inputs and outputs of the relax stage.
+
+    The inputs are all files in folder.relax_input except the sbatch
+    files, which only change with the job name or partition.
+    """
+    inputs = [join(folder.relax_input, name) for name in sorted(os.listdir(folder.relax_input))
+              if not name.endswith('.sbatch')]
+    inputs += [tool_stamp(rosetta_paths.path_to_rosetta), rosetta_paths.Rosetta_extension,
+               tool_stamp(join(rosetta_paths.path_to_parameters, 'cart2.script'))]
+    outputs = [join(folder.relax_output, 'output.pdb'), join(folder.ddG_input, 'input.pdb')]
+    return inputs, outputs
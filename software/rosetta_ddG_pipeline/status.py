@@ -0,0 +1,200 @@
+"""status.py reports the progress of the ddG calculations of a run folder.
+
+    python3 run_pipeline.py --mode status -o run_folder [--status_heatmap]
+
+counts the completed, failed and pending units (mutfiles for cartesian
+runs, residues for membrane protein runs, queue units for --work_queue_workers),
+the fraction of variants with complete output and the expected time to
+completion. The rate of completed units is taken from the earlier status
+reports of the run (ddG/run/status_history.tsv, only written with
+--status_history), the work queue or the age of the oldest output.
+Apart from the history, reports write nothing into the run folder.
+Failed units are the unfinished units of array tasks that sacct reports
+as failed or that were cancelled (see retry.cancelled_ddg_tasks).
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import glob
+import json
+import logging as logger
+import os
+from os.path import isfile, join
+import subprocess
+import time
+
+# Third party imports
+import pandas as pd
+
+# Local application imports
+from folders import folder2
+from helper import AttrDict, read_mutfile
+from parse_cartesian_functions import ddg_matrix, ddg_matrix_frame, update_ddg_aggregate
+import resume
+from retry import cancelled_ddg_tasks, job_task_units, read_ddg_jobs
+from runtime_model import parse_sacct_usage
+from scheduler import COMPLETED, FINISHED_STATES
+from work_queue import connect, queue_status
+
+
+def failed_tasks(ddG_run):
+    """Returns the units of the failed or cancelled array tasks of all ddG waves.
+
+    Units of later waves replace those of earlier ones.
+    """
+    jobs = read_ddg_jobs(ddG_run, None)
+    if jobs == {}:
+        return set()
+    try:
+        process = subprocess.run(['sacct', '-n', '-P', '-o', 'JobID,State,ElapsedRaw,MaxRSS', '-j', ','.join(jobs)],
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+        usage = parse_sacct_usage(process.stdout)
+    except FileNotFoundError:
+        # no SLURM accounting on this machine
+        usage = {}
+    states = {(job_id, task): record['state'] for (job_id, task), record in usage.items()}
+    for job_id, task in cancelled_ddg_tasks(ddG_run):
+        states.setdefault((job_id, task), 'CANCELLED')
+    job_tasks = {}
+    for (job_id, task), state in sorted(states.items()):
+        job_tasks.setdefault(job_id, []).append((task, state))
+
+    unit_states = {}
+    for job_id, job in jobs.items():
+        for task, state in job_tasks.get(job_id, []):
+            for unit in job_task_units(job, task):
+                unit_states[unit] = state
+    return set(unit for unit, state in unit_states.items() if state in FINISHED_STATES and state != COMPLETED)
+
+
+def array_progress(folder, is_mp):
+    """Returns the units, their completed and failed subsets and the
+    number of completed and all variants."""
+    failed = failed_tasks(folder.ddG_run)
+    if is_mp:
+        mut_dict = resume.mp_mut_dict(folder)
+        missing = resume.missing_mp_mutations(folder, mut_dict)
+        units = list(mut_dict)
+        completed = [resid for resid in units if resid not in missing]
+        n_variants = sum(len(muts) for muts in mut_dict.values())
+        n_done = n_variants - sum(len(muts) for muts in missing.values())
+    else:
+        units = sorted(glob.glob(join(folder.ddG_input, 'mutfiles', 'mutfile*')))
+        missing = set(resume.missing_mutfiles(folder))
+        completed = [mutfile for mutfile in units if mutfile not in missing]
+        iterations = resume.ddg_iterations(join(folder.ddG_input, 'ddg_flagfile'))
+        rounds = resume.count_cartesian_rounds(folder.ddG_run)
+        mutations = [mutation for mutfile in units for mutation in read_mutfile(mutfile)]
+        n_variants = len(mutations)
+        n_done = sum(rounds.get(mutation, 0) >= iterations for mutation in mutations)
+    failed = [unit for unit in units if unit in failed and unit not in completed]
+    return units, completed, failed, n_done, n_variants
+
+
+def oldest_output(ddG_run):
+    # modification time of the oldest ddG output, roughly the start of the run
+    times = [entry.stat().st_mtime for entry in os.scandir(ddG_run)
+             if entry.name.endswith('.ddg') or entry.name.endswith('.out')]
+    return min(times) if times != [] else None
+
+
+def completion_rate(path_to_history, completed, now, start=None):
+    """Returns completed units per second since the first report, or since
+    start if there is no earlier report with less progress."""
+    if isfile(path_to_history):
+        with open(path_to_history, 'r') as fp:
+            first_time, first_completed = [float(field) for field in fp.readline().split()[:2]]
+        if completed > first_completed and now > first_time:
+            return (completed - first_completed) / (now - first_time)
+    if start != None and completed > 0 and now > start:
+        return completed / (now - start)
+    return None
+
+
+def ddg_status(folder, is_mp=False, record_history=False):
+    """Returns the progress of the ddG calculations of folder as a dict.
+
+    record_history appends the report to ddG/run/status_history.tsv.
+    """
+    now = time.time()
+    path_to_queue = join(folder.ddG_run, 'work_queue.db')
+    if isfile(path_to_queue):
+        states = queue_status(path_to_queue)
+        db = connect(path_to_queue)
+        start = db.execute('SELECT MIN(started) FROM units').fetchone()[0]
+        db.close()
+        n_units = sum(states.values())
+        n_completed = states.get('done', 0)
+        n_failed = states.get('failed', 0)
+        n_done, n_variants = n_completed, n_units
+    else:
+        units, completed, failed, n_done, n_variants = array_progress(folder, is_mp)
+        n_units, n_completed, n_failed = len(units), len(completed), len(failed)
+        start = oldest_output(folder.ddG_run)
+
+    path_to_history = join(folder.ddG_run, 'status_history.tsv')
+    rate = completion_rate(path_to_history, n_completed, now, start=start)
+    n_pending = n_units - n_completed - n_failed
+    status = {'units': n_units, 'completed': n_completed, 'failed': n_failed, 'pending': n_pending,
+              'coverage': n_done / n_variants if n_variants > 0 else 0.0,
+              'hours_left': n_pending / rate / 3600 if rate != None else None}
+    if record_history:
+        with open(path_to_history, 'a') as fp:
+            fp.write(f'{now}\t{n_completed}\t{n_units}\n')
+    return status
+
+
+def partial_ddgs(folder, is_mp=False):
+    """Returns position, mutant and ddg of the variants finished so far."""
+    if is_mp:
+        rows = []
+        path_to_output = join(folder.ddG_run, 'ddG.out')
+        if isfile(path_to_output):
+            with open(path_to_output, 'r') as fp:
+                for line in fp:
+                    fields = line.strip().split(',')
+                    if len(fields) > 1 and len(fields[0]) > 2:
+                        rows.append((int(fields[0][1:-1]), fields[0][-1], float(fields[1])))
+        return pd.DataFrame(rows, columns=['position', 'mutant', 'ddg'])
+    # the structure sequence is the first entry of fasta_file.fasta
+    with open(join(folder.prepare_checking, 'fasta_file.fasta'), 'r') as fp:
+        fp.readline()
+        sequence = fp.readline().strip()
+    # continues the incremental parse of parse_ddgs.sbatch in memory, the
+    # parser may be running
+    stats = update_ddg_aggregate(folder.ddG_run, sequence, write=False)
+    return stats.loc[stats['ddg'].notna(), ['position', 'mutant', 'ddg']]
+
+
+def plot_partial_heatmap(folder, sys_name='', is_mp=False):
+    # the plotting dependencies are only needed for the heatmap
+    from plotting import simple_plot_heatmap
+    ddgs = partial_ddgs(folder, is_mp=is_mp)
+    matrix = ddg_matrix_frame(ddg_matrix(ddgs, int(ddgs['position'].max()) if len(ddgs) > 0 else 0))
+    simple_plot_heatmap(matrix, folder.ddG_output, sys_name=f'{sys_name}_partial',
+                        title=f'{sys_name}: {len(ddgs)} variants')
+    return join(folder.ddG_output, f'{sys_name}_partial_simple_heatmap.png')
+
+
+def report_status(args):
+    """Prints the progress of the run folder args.OUTPUT_FILE."""
+    with open(join(args.OUTPUT_FILE, 'input', 'args.info'), 'r') as fp:
+        run_args = AttrDict(json.load(fp))
+    folder = folder2(args.OUTPUT_FILE, True, is_mp=run_args.IS_MP)
+    sys_name = os.path.splitext(os.path.basename(run_args.STRUC_FILE))[0]
+    status = ddg_status(folder, is_mp=run_args.IS_MP, record_history=args.STATUS_HISTORY)
+    if status['hours_left'] == None:
+        eta = 'unknown'
+    else:
+        eta = f"{status['hours_left']:.1f} h"
+    report = (f"{sys_name}: {status['completed']} completed, {status['failed']} failed, "
+              f"{status['pending']} pending of {status['units']} units; "
+              f"coverage {100 * status['coverage']:.1f}%; time to completion {eta}")
+    logger.info(report)
+    print(report)
+    if args.STATUS_HEATMAP:
+        path_to_heatmap = plot_partial_heatmap(folder, sys_name=sys_name, is_mp=run_args.IS_MP)
+        print(f'Partial heatmap: {path_to_heatmap}')
+    return status
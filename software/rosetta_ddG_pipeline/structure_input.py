@@ -9,6 +9,7 @@ Date of last major changes: 2020-04-15
 
 # Standard library imports
 
+import glob
 import logging 
 import os
 import subprocess
@@ -18,10 +19,12 @@ import sys
 import numpy as np
 
 # Local application imports
+import clean_structure
 import pdb_to_fasta_seq
 import rosetta_paths
 from AnalyseStruc import get_structure_parameters
-from helper import read_fasta
+from helper import array_spec, format_slurm_time, read_fasta, read_mutfile, remove_ddg_sbatch_files, split_array
+from sequence_alignment import align_index_map, index_map_from_rows, uniprot_to_structure
 
 
 class structure:
@@ -41,34 +44,46 @@ class structure:
             self.uniprot_seq = read_fasta(uniprot_accesion)
         self.name='input'
         
-    def clean_up_and_isolate(self, name='input',ligand=None):
-        
+    def clean_up_and_isolate(self, name='input',ligand=None, run_clean=True, native=True):
+        # run_clean=False reuses the output of a previous cleaning;
+        # native=False runs Rosetta's python2 scripts instead of clean_structure.py
+        if native and run_clean:
+            self.logger.info('Cleaning the structure (clean_structure.py)')
+            path_to_cleaned_pdb, sequences = clean_structure.clean_pdb(
+                self.prep_struc, self.chain_id if ligand == True else str(self.run_struc),
+                self.folder.prepare_cleaning, keep_ligand=ligand == True)
+            # the sequence of the last chain, as read from the FASTA files below
+            self.fasta_seq = sequences.get(list(str(self.run_struc))[-1], '')
+
         if  ligand == None:
             
             self.path_to_clean_pdb = rosetta_paths.path_to_clean_pdb
     
-            shell_command = f'python2 {self.path_to_clean_pdb} {self.prep_struc} {self.run_struc}'
-            self.logger.info('Running clean_pdb.py script')
-            subprocess.call(shell_command, cwd=self.folder.prepare_cleaning, shell=True)
-            self.logger.info('end of output from clean_pdb.py')
+            if run_clean and not native:
+                shell_command = f'python2 {self.path_to_clean_pdb} {self.prep_struc} {self.run_struc}'
+                self.logger.info('Running clean_pdb.py script')
+                subprocess.call(shell_command, cwd=self.folder.prepare_cleaning, shell=True)
+                self.logger.info('end of output from clean_pdb.py')
     
             self.path_to_cleaned_pdb = os.path.join(self.folder.prepare_cleaning, f'{name}_{self.run_struc}.pdb')
             path_to_cleaned_pdb=self.path_to_cleaned_pdb
-            for chain in list(str(self.run_struc)):
-                self.path_to_cleaned_fasta = os.path.join(self.folder.prepare_cleaning, f'{name}_{chain}.fasta')
-                fasta_lines = open(self.path_to_cleaned_fasta, 'r').readlines()
-                self.fasta_seq = ''
-        
-                for line in fasta_lines[1:]:
-                    self.fasta_seq = self.fasta_seq + line.strip()
+            if not (native and run_clean):
+                for chain in list(str(self.run_struc)):
+                    self.path_to_cleaned_fasta = os.path.join(self.folder.prepare_cleaning, f'{name}_{chain}.fasta')
+                    fasta_lines = open(self.path_to_cleaned_fasta, 'r').readlines()
+                    self.fasta_seq = ''
+            
+                    for line in fasta_lines[1:]:
+                        self.fasta_seq = self.fasta_seq + line.strip()
                   
         if ligand == True:
             self.path_to_clean_pdb = rosetta_paths.path_to_clean_keep_ligand
             
-            shell_command = f'python2 {self.path_to_clean_pdb} {self.prep_struc} {self.chain_id}'
-            self.logger.info('Running clean_pdb_keep_ligand.py script')
-            subprocess.call(shell_command, cwd=self.folder.prepare_cleaning, shell=True)
-            self.logger.info('end of output from clean_pdb_keep_ligand.py')
+            if run_clean and not native:
+                shell_command = f'python2 {self.path_to_clean_pdb} {self.prep_struc} {self.chain_id}'
+                self.logger.info('Running clean_pdb_keep_ligand.py script')
+                subprocess.call(shell_command, cwd=self.folder.prepare_cleaning, shell=True)
+                self.logger.info('end of output from clean_pdb_keep_ligand.py')
             path_to_cleaned_pdb = os.path.join(self.folder.prepare_cleaning, f'{name}.pdb{self.chain_id}.pdb')
             
         
@@ -79,7 +94,9 @@ class structure:
 
 
 
-    def muscle_align_to_uniprot(self, uniprot_sequence,name='input'):
+    def muscle_align_to_uniprot(self, uniprot_sequence,name='input', run_muscle=True, native=True):
+        # native=True aligns in-process (sequence_alignment.py, cached by sequence);
+        # run_muscle=False reuses the alignment of a previous MUSCLE run
 
         path_to_muscle = rosetta_paths.path_to_muscle
         self.path_to_fasta = os.path.join(self.folder.prepare_checking, 'fasta_file.fasta')
@@ -90,50 +107,40 @@ class structure:
             fasta_file.write('>{}_uniprot_sequence\n'.format(self.sys_name))
             fasta_file.write('{}\n'.format(uniprot_sequence))
 
-        shell_call = '{} -in {} -out {}'.format(
-            path_to_muscle, self.path_to_fasta, self.path_to_alignment)
-        subprocess.call(shell_call, shell=True)
-
-        alignment_sequences = {}
-        current_seq = ''
-        current_name = 'first'
-        with open(self.path_to_alignment, 'r') as alignment_file:
-            for line in alignment_file.readlines():
-                if line[0] == '>':
-                    if current_name != 'first':
-                        alignment_sequences[current_name] = current_seq
-
-                    current_name = line[1:].strip()
-                    current_seq = ''
-                else:
-                    current_seq = current_seq + line.strip()
-            alignment_sequences[current_name] = current_seq
-
-        alignment_index_numbers = []
-        current_index = 0
-        for key in alignment_sequences:
-            if 'uniprot_sequence' in key:
-                for letter in alignment_sequences[key]:
-                    current_index = current_index + 1
-                    if letter != '-':
-                        alignment_index_numbers.append(current_index)
-
-        current_index = 0
-
-        structure_index_numbers = []
-        for key in alignment_sequences:
-            if 'uniprot_sequence' not in key:
-                for letter in alignment_sequences[key]:
-                    if letter != '-':
-                        structure_index_numbers.append(
-                            str(alignment_index_numbers[current_index]))
-                    current_index = current_index + 1
-
-        self.structure_index_numbers = structure_index_numbers
+        if native:
+            self.index_map = align_index_map(self.fasta_seq, uniprot_sequence)
+        else:
+            if run_muscle:
+                shell_call = '{} -in {} -out {}'.format(
+                    path_to_muscle, self.path_to_fasta, self.path_to_alignment)
+                subprocess.call(shell_call, shell=True)
+
+            alignment_sequences = {}
+            current_seq = ''
+            current_name = 'first'
+            with open(self.path_to_alignment, 'r') as alignment_file:
+                for line in alignment_file.readlines():
+                    if line[0] == '>':
+                        if current_name != 'first':
+                            alignment_sequences[current_name] = current_seq
+
+                        current_name = line[1:].strip()
+                        current_seq = ''
+                    else:
+                        current_seq = current_seq + line.strip()
+                alignment_sequences[current_name] = current_seq
+
+            uniprot_row = [alignment_sequences[key] for key in alignment_sequences if 'uniprot_sequence' in key][0]
+            structure_row = [alignment_sequences[key] for key in alignment_sequences
+                             if 'uniprot_sequence' not in key][0]
+            self.index_map = index_map_from_rows(structure_row, uniprot_row)
+
+        self.structure_index_numbers = [str(number) for number in self.index_map]
 
+        # still written for the checks and the records of the run
         self.path_to_index_string = os.path.join(self.folder.prepare_checking, 'uniprot_index_list.txt')
         with open(self.path_to_index_string, 'w') as index_file:
-            index_list_as_string = '\n'.join(structure_index_numbers)
+            index_list_as_string = '\n'.join(self.structure_index_numbers)
             index_file.write(str(index_list_as_string))
 
         path_to_index_string = self.path_to_index_string
@@ -164,12 +171,7 @@ class structure:
         resdata = self.struc_dic_cleaned["resdata"]
         strucdata = self.struc_dic_cleaned["strucdata"]
         
-        path_to_alignment = self.path_to_index_string
-        alignment = np.loadtxt(path_to_alignment)
-        
-        alignment_dic = {}
-        for n in enumerate(alignment):
-            alignment_dic[int(n[1])] = int(n[0] + 1)
+        alignment_dic = uniprot_to_structure(self.index_map)
             
             
         if mutation_input == None:
@@ -254,7 +256,7 @@ class structure:
         return(path_to_sbatch)
 
 
-    def parse_relax_sbatch(self, folder, sys_name='', partition='sbinlab'):
+    def parse_relax_sbatch(self, folder, sys_name='', partition='sbinlab', sc_name='score_bn15_calibrated', keep_top=1):
         path_to_parse_relax_script = os.path.join(
             rosetta_paths.path_to_stability_pipeline, 'relax_parse_results.py')
 
@@ -268,49 +270,23 @@ class structure:
 
 # launching parsing script 
 ''')
-            fp.write(f'python {path_to_parse_relax_script} {folder.relax_run} {folder.relax_output} {folder.ddG_input}')
+            fp.write(f'python {path_to_parse_relax_script} {folder.relax_run} {folder.relax_output} {folder.ddG_input} '
+                     f'"{sc_name}" {keep_top}')
         self.logger.info(path_to_sbatch)
         return path_to_sbatch
 
 
-    def write_rosetta_cartesian_ddg_sbatch(self, folder, input_mutfiles='', ddgfile='', sys_name='', partition='sbinlab'):
-        path_to_sbatch = os.path.join(self.folder.ddG_input, 'rosetta_ddg.sbatch')
-        structure_path = os.path.join(self.folder.ddG_input, 'input.pdb')
-        relax_input = os.path.join(self.folder.ddG_input, 'input.pdb')
-        if input_mutfiles == '':
-            input_mutfiles = os.path.join(self.folder.ddG_input, 'mutfiles')
-        if ddgfile == '':
-            # path_to_ddgflags = os.path.join(
-            # rosetta_paths.path_to_parameters, 'cartesian_ddg_flagfile')
-            path_to_ddgflags = os.path.join(self.folder.ddG_input, 'ddg_flagfile')
-        else:
-            path_to_ddgflags = ddgfile
-
-        muts = os.listdir(input_mutfiles)
+    def write_rosetta_cartesian_ddg_sbatch(self, folder, input_mutfiles='', ddgfile='', sys_name='', partition='sbinlab', mutfiles_per_task=1, hours_per_mutfile=48, max_array_size=1000, array_throttle=100, runtime_model=None):
+        paths_to_sbatch = write_cartesian_ddg_sbatch(
+            self.folder, input_mutfiles=input_mutfiles, ddgfile=ddgfile, sys_name=sys_name,
+            partition=partition, mutfiles_per_task=mutfiles_per_task, hours_per_mutfile=hours_per_mutfile,
+            max_array_size=max_array_size, array_throttle=array_throttle, runtime_model=runtime_model)
+        for path_to_sbatch in paths_to_sbatch:
+            self.logger.info(path_to_sbatch)
+        return paths_to_sbatch
 
-        with open(path_to_sbatch, 'w') as fp:
-            fp.write(f'''#!/bin/sh 
-#SBATCH --job-name={sys_name}_ddg
-#SBATCH --array=0-{len(muts)-1}
-#SBATCH --time=48:00:00
-#SBATCH --mem 2000
-#SBATCH --partition={partition}
-#SBATCH --nice 
-LST=(`ls {input_mutfiles}/mutfile*`)
-OFFSET=0 
-INDEX=$((OFFSET+SLURM_ARRAY_TASK_ID))
-echo $INDEX
 
-# launching rosetta 
-''')
-            fp.write((f'{os.path.join(rosetta_paths.path_to_rosetta, f"bin/cartesian_ddg.{rosetta_paths.Rosetta_extension}")} '
-                      f'-s {structure_path} -ddg:mut_file ${{LST[$INDEX]}} '
-                      f' -out:prefix ddg-$SLURM_ARRAY_JOB_ID-$SLURM_ARRAY_TASK_ID @{path_to_ddgflags}'))
-        self.logger.info(path_to_sbatch)
-        return path_to_sbatch
-
-
-    def write_parse_cartesian_ddg_sbatch(self, folder, partition='sbinlab'):
+    def write_parse_cartesian_ddg_sbatch(self, folder, partition='sbinlab', n_shards=0):
         score_sbatch_path = os.path.join(self.folder.ddG_input, 'parse_ddgs.sbatch')
         structure_input = os.path.join(self.folder.prepare_checking,'structure_input.json')
         with open(score_sbatch_path, 'w') as fp:
@@ -325,4 +301,90 @@ echo $INDEX
 ''')
             fp.write((f'python3 {rosetta_paths.path_to_stability_pipeline}/parser_ddg_v2.py '
                       f'{self.sys_name} {self.chain_id} {self.fasta_seq} {folder.ddG_run} {folder.ddG_output} {structure_input}'))
+            # with parse shards, this job merges the shards of parse_shards.sbatch
+            if n_shards > 0:
+                fp.write(f' {n_shards}')
         return score_sbatch_path
+
+
+def write_cartesian_ddg_sbatch(folder, input_mutfiles='', ddgfile='', sys_name='', partition='sbinlab',
+                               mutfiles_per_task=1, hours_per_mutfile=48, max_array_size=1000,
+                               array_throttle=100, mutfile_list=None, basename='rosetta_ddg', mem=2000,
+                               runtime_model=None, max_hours=168):
+    structure_path = os.path.join(folder.ddG_input, 'input.pdb')
+    if input_mutfiles == '':
+        input_mutfiles = os.path.join(folder.ddG_input, 'mutfiles')
+    if ddgfile == '':
+        # path_to_ddgflags = os.path.join(
+        # rosetta_paths.path_to_parameters, 'cartesian_ddg_flagfile')
+        path_to_ddgflags = os.path.join(folder.ddG_input, 'ddg_flagfile')
+    else:
+        path_to_ddgflags = ddgfile
+
+    # an explicit mutfile_list (e.g. only the missing ones when resuming)
+    # replaces the listing of the whole mutfile directory
+    if mutfile_list == None:
+        muts = sorted(glob.glob(os.path.join(input_mutfiles, 'mutfile*')))
+        mutfile_array = f'(`ls {input_mutfiles}/mutfile*`)'
+    else:
+        muts = mutfile_list
+        mutfile_array = f'({" ".join(mutfile_list)})'
+    # each array task runs a contiguous block of mutfiles one after the
+    # other (one cartesian_ddg call per mutfile), which saves scheduler
+    # jobs, not Rosetta start-ups
+    n_tasks = -(-len(muts) // mutfiles_per_task)
+    # walltime requests are clamped to max_hours, the partition limit
+    hours = hours_per_mutfile * mutfiles_per_task
+    if runtime_model == None and hours > max_hours:
+        logging.warning(f'{mutfiles_per_task} mutfiles per task need up to {hours} h without a runtime model; '
+                        f'requesting {max_hours} h, tasks may time out')
+    walltime = format_slurm_time(min(hours, max_hours))
+    # arrays larger than MaxArraySize are split into several sbatch
+    # files, each starting at its own OFFSET into the mutfile list
+    chunks = split_array(n_tasks, max_array_size)
+    remove_ddg_sbatch_files(folder.ddG_input, basename=basename)
+    if runtime_model != None:
+        # residues of the mutations of every array task
+        tasks = []
+        for start in range(0, len(muts), mutfiles_per_task):
+            tasks.append([resnum for mutfile in muts[start:start + mutfiles_per_task]
+                          for resnum, aa in read_mutfile(mutfile)])
+        cpu_hours = 0
+
+    paths_to_sbatch = []
+    for n, (first_task, chunk_tasks) in enumerate(chunks):
+        if len(chunks) == 1:
+            path_to_sbatch = os.path.join(folder.ddG_input, f'{basename}.sbatch')
+        else:
+            path_to_sbatch = os.path.join(folder.ddG_input, f'{basename}_{n:03}.sbatch')
+        if runtime_model != None:
+            hours, mem, chunk_cpu_hours = runtime_model.request(tasks[first_task:first_task + chunk_tasks])
+            walltime = format_slurm_time(min(hours, max_hours))
+            cpu_hours += chunk_cpu_hours
+        with open(path_to_sbatch, 'w') as fp:
+            fp.write(f'''#!/bin/sh 
+#SBATCH --job-name={sys_name}_ddg
+#SBATCH --array={array_spec(chunk_tasks, array_throttle)}
+#SBATCH --time={walltime}
+#SBATCH --mem {mem}
+#SBATCH --partition={partition}
+#SBATCH --nice 
+LST={mutfile_array}
+OFFSET={first_task * mutfiles_per_task} 
+PER_TASK={mutfiles_per_task}
+START=$((OFFSET+SLURM_ARRAY_TASK_ID*PER_TASK))
+for INDEX in `seq $START $((START+PER_TASK-1))`; do
+if [ $INDEX -ge ${{#LST[@]}} ]; then break; fi
+echo $INDEX
+
+# launching rosetta 
+''')
+            fp.write((f'{os.path.join(rosetta_paths.path_to_rosetta, f"bin/cartesian_ddg.{rosetta_paths.Rosetta_extension}")} '
+                      f'-s {structure_path} -ddg:mut_file ${{LST[$INDEX]}} '
+                      f' -out:prefix ddg-$SLURM_ARRAY_JOB_ID-$INDEX @{path_to_ddgflags}\n'
+                      'done\n'))
+        paths_to_sbatch.append(path_to_sbatch)
+    if runtime_model != None:
+        logging.info(f'Estimated cost of {n_tasks} ddG tasks: {cpu_hours:.1f} CPU-hours')
+        print(f'Estimated cost of {n_tasks} ddG tasks: {cpu_hours:.1f} CPU-hours')
+    return paths_to_sbatch
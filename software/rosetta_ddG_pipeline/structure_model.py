@@ -0,0 +1,230 @@
+"""structure_model.py parses a PDB file once for all preparation steps.
+
+A StructureModel holds what the create stage reads from a PDB file as
+arrays with one entry per residue (in file order, so the residues of a
+chain are contiguous):
+
+    residue_numbers  int32        PDB residue number
+    insertion_codes  <U1          insertion code (' ' if none)
+    chain_index      int16        index in chains
+    residue_letters  <U1          one-letter code ('X' for other residues)
+    resnames         <U3          residue name
+    ca               float32 (3)  CA coordinates (NaN if missing)
+    cb               float32 (3)  CB coordinates (CA for glycine, NaN if missing)
+
+the coordinates of all atoms of these residues (atoms, float32 (3)) with
+the index of their residue (atom_residue, int32), together with chains, chain_offsets (the residues of chains[i] are
+chain_offsets[i]:chain_offsets[i + 1]), the SEQRES sequence and DBREF
+records and the sequence of pdb_to_fasta_seq. The residue table (resdata)
+and chain sequences (strucdata) of AnalyseStruc.get_structure_parameters
+are derived from the arrays.
+
+load_structure parses a file only once per content: models are cached in
+memory by the sha256 of the file and, with a sidecar path, in an
+uncompressed .npz file (structure_<name>.npz next to structure_<name>.json),
+which later steps read with read_structure_arrays or np.load, without the
+PDB file. The memory cache keeps the MAX_MODELS models used last.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+from collections import OrderedDict
+import hashlib
+import io
+import os
+from os.path import isfile
+
+# Third party imports
+from Bio import SeqIO
+from Bio.PDB.PDBParser import PDBParser
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Local application imports
+from parse_cartesian_functions import aminocodes
+from pdb_to_fasta_seq import fasta_seq_from_lines
+
+
+# parsed models by content hash, least recently used first
+models = OrderedDict()
+MAX_MODELS = 8
+
+ARRAYS = ['residue_numbers', 'insertion_codes', 'chain_index', 'residue_letters', 'resnames', 'ca', 'cb',
+          'atoms', 'atom_residue', 'chains', 'chain_offsets', 'seqres']
+
+
+def cached_model(key):
+    # the cached model of key (None if not cached), now the last used one
+    if key not in models:
+        return None
+    models.move_to_end(key)
+    return models[key]
+
+
+def cache_model(key, model):
+    models[key] = model
+    models.move_to_end(key)
+    while len(models) > MAX_MODELS:
+        models.popitem(last=False)
+    return model
+
+
+def atom_coordinates(residue, name):
+    if name in residue:
+        return residue[name].get_coord()
+    return np.full(3, np.nan, dtype=np.float32)
+
+
+class StructureModel:
+    """The parsed content of one PDB file."""
+
+    def __init__(self, arrays, dbref, fasta_seq, sha256=''):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.dbref = dbref
+        self.fasta_seq = fasta_seq
+        self.sha256 = sha256
+        self._resdata = None
+        self._strucdata = None
+
+    @classmethod
+    def from_text(cls, text, sha256=''):
+        structure = PDBParser(PERMISSIVE=1).get_structure('input', io.StringIO(text))
+        chains = []
+        chain_offsets = [0]
+        residues = []
+        for chain in structure[0]:
+            chains.append(chain.get_id())
+            residues.extend((len(chains) - 1, residue) for residue in chain if residue.get_id()[0] == ' ')
+            chain_offsets.append(len(residues))
+        arrays = {
+            'residue_numbers': np.array([residue.get_id()[1] for index, residue in residues], dtype=np.int32),
+            'insertion_codes': np.array([residue.get_id()[2] for index, residue in residues], dtype='<U1'),
+            'chain_index': np.array([index for index, residue in residues], dtype=np.int16),
+            'residue_letters': np.array([aminocodes.get(residue.get_resname(), 'X') for index, residue in residues],
+                                        dtype='<U1'),
+            'resnames': np.array([residue.get_resname() for index, residue in residues], dtype='<U3'),
+            'ca': np.array([atom_coordinates(residue, 'CA') for index, residue in residues],
+                           dtype=np.float32).reshape(-1, 3),
+            'cb': np.array([atom_coordinates(residue, 'CA' if residue.get_resname() == 'GLY' else 'CB')
+                            for index, residue in residues], dtype=np.float32).reshape(-1, 3),
+            'atoms': np.array([atom.get_coord() for index, residue in residues for atom in residue],
+                              dtype=np.float32).reshape(-1, 3),
+            'atom_residue': np.array([n for n, (index, residue) in enumerate(residues) for atom in residue],
+                                     dtype=np.int32),
+            'chains': np.array(chains, dtype=str),
+            'chain_offsets': np.array(chain_offsets, dtype=np.int64),
+        }
+        # SEQRES sequence per chain, None without SEQRES records
+        seqres = [None] * len(chains)
+        for record in SeqIO.parse(io.StringIO(text), 'pdb-seqres'):
+            seqres[chains.index(str(record.annotations['chain']))] = str(record.seq)
+        arrays['seqres'] = np.array(seqres, dtype=object)
+
+        lines = text.splitlines(True)
+        dbref = {}
+        for line in lines:
+            if len(line) > 1 and line.split()[0] == 'DBREF':
+                dbref[len(dbref) + 1] = line.split()
+        return cls(arrays, dbref, fasta_seq_from_lines(lines), sha256=sha256)
+
+    def __len__(self):
+        return len(self.residue_numbers)
+
+    def chain_slice(self, chain):
+        # the residues of chain in the residue arrays
+        index = list(self.chains).index(chain)
+        return slice(self.chain_offsets[index], self.chain_offsets[index + 1])
+
+    def neighbour_counts(self, radius):
+        """Returns the number of other residues with an atom within radius
+        of an atom of each residue."""
+        pairs = self.atom_residue[cKDTree(self.atoms).query_pairs(radius, output_type='ndarray')]
+        pairs = np.unique(np.sort(pairs[pairs[:, 0] != pairs[:, 1]], axis=1), axis=0)
+        return np.bincount(pairs.ravel(), minlength=len(self))
+
+    def labels(self):
+        # one-letter codes, residue names for the other residues
+        standard = np.isin(self.resnames, list(aminocodes))
+        return np.where(standard, self.residue_letters, self.resnames)
+
+    @property
+    def exceptions(self):
+        # number of residues without a one-letter code
+        return int((~np.isin(self.resnames, list(aminocodes))).sum())
+
+    @property
+    def resdata(self):
+        """{Rosetta number: (letter, PDB number, chain)} as in AnalyseStruc;
+        other residues have their name and the PDB number as a string."""
+        if self._resdata == None:
+            standard = np.isin(self.resnames, list(aminocodes))
+            labels = self.labels()
+            chains = self.chains[self.chain_index]
+            self._resdata = {i + 1: (str(labels[i]), int(self.residue_numbers[i]) if standard[i]
+                                 else str(self.residue_numbers[i]), str(chains[i]))
+                             for i in range(len(self))}
+        return self._resdata
+
+    @property
+    def strucdata(self):
+        """{chain: sequence}, or {chain: (sequence, SEQRES sequence)} for
+        chains with SEQRES records."""
+        if self._strucdata == None:
+            labels = self.labels()
+            self._strucdata = {}
+            for index, chain in enumerate(self.chains):
+                sequence = ''.join(labels[self.chain_offsets[index]:self.chain_offsets[index + 1]])
+                if self.seqres[index] == None:
+                    self._strucdata[str(chain)] = sequence
+                else:
+                    self._strucdata[str(chain)] = sequence, str(self.seqres[index])
+        return self._strucdata
+
+    def write(self, path_to_sidecar):
+        # uncompressed, so single arrays can be read without the others;
+        # written to a temporary file first and moved into place
+        arrays = {name: getattr(self, name) for name in ARRAYS}
+        arrays['seqres'] = np.array(['' if sequence == None else sequence for sequence in self.seqres], dtype=str)
+        arrays['has_seqres'] = np.array([sequence != None for sequence in self.seqres], dtype=bool)
+        with open(path_to_sidecar + '.tmp', 'wb') as fp:
+            np.savez(fp, sha256=np.array(self.sha256), fasta_seq=np.array(self.fasta_seq),
+                     dbref=np.array([' '.join(fields) for fields in self.dbref.values()], dtype=str), **arrays)
+        os.replace(path_to_sidecar + '.tmp', path_to_sidecar)
+        return path_to_sidecar
+
+
+def read_structure_arrays(path_to_sidecar):
+    # the StructureModel of a sidecar, without the PDB file
+    with np.load(path_to_sidecar) as data:
+        arrays = {name: data[name] for name in ARRAYS if name != 'seqres'}
+        arrays['seqres'] = np.array([sequence if has_seqres else None for sequence, has_seqres
+                                     in zip(data['seqres'], data['has_seqres'])], dtype=object)
+        dbref = {n: fields.split() for n, fields in enumerate(data['dbref'], 1)}
+        return StructureModel(arrays, dbref, str(data['fasta_seq']), sha256=str(data['sha256']))
+
+
+def load_structure(path_to_pdb, sidecar=None):
+    """Returns the StructureModel of path_to_pdb, parsed only once per content.
+
+    With a sidecar path, the model is read from the sidecar if it belongs
+    to the same content, and written to it otherwise (also if the sidecar
+    lacks arrays of this version).
+    """
+    with open(path_to_pdb, 'rb') as fp:
+        data = fp.read()
+    key = hashlib.sha256(data).hexdigest()
+    current = False
+    if sidecar != None and isfile(sidecar):
+        with np.load(sidecar) as arrays:
+            current = str(arrays['sha256']) == key and set(ARRAYS) <= set(arrays.files)
+    model = cached_model(key)
+    if model == None and current:
+        model = cache_model(key, read_structure_arrays(sidecar))
+    if model == None:
+        model = cache_model(key, StructureModel.from_text(data.decode(), sha256=key))
+    if sidecar != None and not current:
+        model.write(sidecar)
+    return model
@@ -0,0 +1,119 @@
+"""test_campaign.py tests the manifest paths and the bookkeeping of the shared ddG arrays of a campaign.
+
+Needs PrismData.py (rosetta_paths.prims_parser), which campaign imports through retry.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_campaign
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+from helper import AttrDict
+try:
+    import campaign
+    import retry
+except ImportError:
+    campaign = None
+
+
+class SubmittedJob:
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+
+class RecordingScheduler:
+    # records the submissions of a non-blocking scheduler
+    blocking = False
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, path_to_sbatch, run_dir, dependencies=[], args=''):
+        self.submitted.append((os.path.basename(path_to_sbatch), run_dir, [job.job_id for job in dependencies], args))
+        return SubmittedJob(str(len(self.submitted)))
+
+
+@unittest.skipIf(campaign == None, 'PrismData.py not found')
+class TestCampaign(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def entry_folder(self, name):
+        folder = AttrDict({'ddG_input': os.path.join(self.tmp, name, 'input'),
+                           'ddG_run': os.path.join(self.tmp, name, 'run')})
+        os.makedirs(folder.ddG_input)
+        os.makedirs(folder.ddG_run)
+        return folder
+
+    def write_sbatch(self, folder, n_mutfiles):
+        path_to_sbatch = os.path.join(folder.ddG_input, 'rosetta_ddg.sbatch')
+        mutfiles = [os.path.join(folder.ddG_input, f'mutfile{n:05}') for n in range(n_mutfiles)]
+        with open(path_to_sbatch, 'w') as fp:
+            fp.write(f'#!/bin/sh\n#SBATCH --array=0-{n_mutfiles - 1}\nLST=({" ".join(mutfiles)})\n'
+                     'OFFSET=0\nPER_TASK=1\n')
+        return path_to_sbatch, mutfiles
+
+    def test_manifest_paths(self):
+        os.makedirs(os.path.join(self.tmp, 'structures'))
+        open(os.path.join(self.tmp, 'structures', 'A.pdb'), 'w').close()
+        # a value that is also a file name next to the manifest
+        open(os.path.join(self.tmp, 'P00000'), 'w').close()
+        path_to_manifest = os.path.join(self.tmp, 'manifest.csv')
+        with open(path_to_manifest, 'w') as fp:
+            fp.write('structure,uniprot,chainid,outputpath\nstructures/A.pdb,P00000,A,runs/A\n')
+        entry = campaign.read_manifest(path_to_manifest, [], os.path.join(self.tmp, 'campaign'))[0]
+        options = dict(zip(entry['argv'][0::2], entry['argv'][1::2]))
+        self.assertEqual(options['--structure'], os.path.join(self.tmp, 'structures', 'A.pdb'))
+        self.assertEqual(options['--uniprot'], 'P00000')
+        self.assertEqual(options['--chainid'], 'A')
+        self.assertEqual(entry['output_path'], os.path.join(self.tmp, 'runs', 'A'))
+
+    def test_cancelled_shared_tasks(self):
+        campaign_path = os.path.join(self.tmp, 'campaign')
+        os.makedirs(campaign_path)
+        folders = {'a': self.entry_folder('a'), 'b': self.entry_folder('b')}
+        path_a, mutfiles_a = self.write_sbatch(folders['a'], 2)
+        path_b, mutfiles_b = self.write_sbatch(folders['b'], 3)
+        units = [('a', folders['a'].ddG_run, path_a, 0), ('a', folders['a'].ddG_run, path_a, 1),
+                 ('b', folders['b'].ddG_run, path_b, 0), ('b', folders['b'].ddG_run, path_b, 1),
+                 ('b', folders['b'].ddG_run, path_b, 2)]
+        campaign.record_campaign_ddg_jobs(folders, units, [SubmittedJob('500')], campaign_path)
+        # the shared task 3 runs task 1 of entry b
+        with open(os.path.join(campaign_path, 'slurm-500_3.out'), 'w') as fp:
+            fp.write('slurmstepd: error: *** JOB 503 ON node1 CANCELLED AT 2026-10-18T10:00:00 DUE TO TIME LIMIT ***\n')
+
+        cancelled = {}
+        for name, folder in folders.items():
+            jobs = retry.read_ddg_jobs(folder.ddG_run, 0)
+            cancelled[name] = [unit for job_id, task_id in retry.cancelled_ddg_tasks(folder.ddG_run)
+                               if job_id in jobs for unit in retry.job_task_units(jobs[job_id], task_id)]
+        self.assertEqual(cancelled, {'a': [], 'b': [mutfiles_b[1]]})
+
+    def test_chain_adaptive(self):
+        folder = self.entry_folder('a')
+        open(os.path.join(folder.ddG_input, 'adaptive_ddgs.sbatch'), 'w').close()
+        scheduler = RecordingScheduler()
+        campaign.chain_adaptive(folder, scheduler, [SubmittedJob('500'), SubmittedJob('501')])
+        self.assertEqual(scheduler.submitted, [('adaptive_ddgs.sbatch', folder.ddG_run, ['500', '501'], '1')])
+
+
+if __name__ == '__main__':
+    unittest.main()
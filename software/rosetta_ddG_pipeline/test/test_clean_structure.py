@@ -0,0 +1,79 @@
+"""test_clean_structure.py tests that clean_structure.py writes what Rosetta's clean_pdb.py writes.
+
+The reference is the output of clean_pdb.py in data/test/mp-pipeline.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_clean_structure
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+import clean_structure
+
+
+PREPARE_DIR = os.path.join(PARENT_DIR, 'data', 'test', 'mp-pipeline', 'output', 'prepare')
+INPUT_PDB = os.path.join(PREPARE_DIR, 'mp_files', 'superpose', 'input_mp_aligned.pdb')
+
+LIGAND = [
+    'HETATM 1300  C1 AGOL A 201       1.000   2.000   3.000  0.60 20.00           C  \n',
+    'HETATM 1301  C1 BGOL A 201       1.500   2.500   3.500  0.40 20.00           C  \n',
+    'HETATM 1302  O1  GOL A 201       2.000   3.000   4.000  1.00 20.00           O  \n',
+    'HETATM 1303  O   HOH A 301       5.000   5.000   5.000  1.00 30.00           O  \n',
+    'HETATM 1304  C1  GOL B 202       9.000   9.000   9.000  1.00 20.00           C  \n',
+]
+
+
+def read_bytes(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+class TestCleanPdb(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_reference(self):
+        path_to_cleaned_pdb, sequences = clean_structure.clean_pdb(INPUT_PDB, 'A', self.tmp, cache_model=False)
+        self.assertEqual(path_to_cleaned_pdb, os.path.join(self.tmp, 'input_mp_aligned_A.pdb'))
+        self.assertEqual(read_bytes(path_to_cleaned_pdb),
+                         read_bytes(os.path.join(PREPARE_DIR, 'cleaning', 'input_mp_aligned_A.pdb')))
+        self.assertEqual(read_bytes(os.path.join(self.tmp, 'input_mp_aligned_A.fasta')),
+                         read_bytes(os.path.join(PREPARE_DIR, 'cleaning', 'input_mp_aligned_A.fasta')))
+
+    def test_keep_ligand(self):
+        # the protein as in the reference, then the ligands of the chain
+        # (first alternative location only, no water)
+        with open(INPUT_PDB, 'r') as fp:
+            lines = [line for line in fp if not line.startswith('END')]
+        path_to_input = os.path.join(self.tmp, 'input_mp_aligned.pdb')
+        with open(path_to_input, 'w') as fp:
+            fp.writelines(lines + LIGAND + ['END\n'])
+        out_dir = os.path.join(self.tmp, 'cleaned')
+        os.makedirs(out_dir)
+        path_to_cleaned_pdb, sequences = clean_structure.clean_pdb(path_to_input, 'A', out_dir, keep_ligand=True,
+                                                                   cache_model=False)
+        self.assertEqual(path_to_cleaned_pdb, os.path.join(out_dir, 'input_mp_aligned.pdbA.pdb'))
+        reference = read_bytes(os.path.join(PREPARE_DIR, 'cleaning', 'input_mp_aligned_A.pdb'))
+        ligand = (LIGAND[0][:16] + ' ' + LIGAND[0][17:] + LIGAND[2]).encode()
+        self.assertEqual(read_bytes(path_to_cleaned_pdb), reference[:-len(b'TER\n')] + ligand + b'TER\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
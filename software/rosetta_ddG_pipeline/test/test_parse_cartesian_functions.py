@@ -0,0 +1,163 @@
+"""test_parse_cartesian_functions.py tests the incremental and sharded parse of cartesian ddG runs.
+
+The incremental parse (manifest and aggregate) and the shard map-reduce
+must give the same ddGs as a full parse of the .ddg files.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_parse_cartesian_functions
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Third party imports
+import numpy as np
+import pandas as pd
+
+# Local application imports
+import parse_cartesian_functions as pcf
+import parse_shards
+from result_store import ReplicateStore
+
+
+SEQUENCE = 'AKLVDE'
+THREE_LETTER = {'A': 'ALA', 'K': 'LYS', 'L': 'LEU', 'V': 'VAL', 'D': 'ASP', 'E': 'GLU', 'G': 'GLY'}
+
+
+def ddg_lines(position, mutants, rounds, seed):
+    # cartesian_ddg output lines of one mutfile, with a WT line per round
+    rng = np.random.default_rng(seed)
+    lines = []
+    for replicate in rounds:
+        lines.append(f'COMPLEX:   Round{replicate}: WT:  {-300 + rng.normal():.3f}  fa_atr: -10.000 fa_rep: 2.000\n')
+        for mutant in mutants:
+            lines.append(f'COMPLEX:   Round{replicate}: MUT_{position}{THREE_LETTER[mutant]}:  '
+                         f'{-300 + rng.normal(0, 3):.3f}  fa_atr: {-10 + rng.normal():.3f} fa_rep: 2.000\n')
+    return ''.join(lines)
+
+
+def full_parse(ddG_run):
+    return pcf.ddg_statistics(pcf.read_ddg_run(ddG_run, SEQUENCE))
+
+
+class ParseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ddG_run = os.path.join(self.tmp, 'run')
+        self.ddG_output = os.path.join(self.tmp, 'output')
+        os.makedirs(self.ddG_run)
+        os.makedirs(self.ddG_output)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text, mode='w'):
+        with open(os.path.join(self.ddG_run, name), mode) as fp:
+            fp.write(text)
+
+    def assertSameDdgs(self, stats, reference):
+        columns = ['variant', 'count', 'mean', 'ddg', 'ddg_std']
+        stats = stats.sort_values('variant')[columns].reset_index(drop=True)
+        reference = reference.sort_values('variant')[columns].reset_index(drop=True)
+        pd.testing.assert_frame_equal(stats, reference, check_dtype=False)
+
+
+class TestIncrementalParse(ParseTestCase):
+
+    def test_grown_and_partial_files(self):
+        store = ReplicateStore(os.path.join(self.ddG_output, 'ddg_replicates'))
+        self.write('ddg-1-0.ddg', ddg_lines(1, 'AKG', [1, 2, 3], 0))
+        text = ddg_lines(2, 'KAL', [1, 2, 3], 1)
+        # the last line is still being written
+        self.write('ddg-1-1.ddg', text[:-20])
+        stats = pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE, store=store)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+        self.assertEqual(len(store), 9 + 8)
+
+        # the line is completed, more rounds and a new file are added
+        self.write('ddg-1-1.ddg', text[-20:] + ddg_lines(2, 'KAL', [4], 2), mode='a')
+        self.write('ddg-1-2.ddg', ddg_lines(3, 'LV', [1, 2], 3))
+        store = ReplicateStore(os.path.join(self.ddG_output, 'ddg_replicates'))
+        stats = pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE, store=store)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+        self.assertEqual(len(store), 9 + 12 + 4)
+        self.assertEqual(len(store.columns), len(pcf.read_ddg_run(self.ddG_run, SEQUENCE)))
+
+    def test_rewritten_file(self):
+        self.write('ddg-1-0.ddg', ddg_lines(1, 'AKG', [1, 2, 3], 0))
+        self.write('ddg-1-1.ddg', ddg_lines(2, 'KAL', [1, 2, 3], 1))
+        pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE)
+        # a shorter file (e.g. a rerun) rebuilds the aggregate
+        self.write('ddg-1-1.ddg', ddg_lines(2, 'KA', [1], 4))
+        stats = pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+
+    def test_read_only(self):
+        self.write('ddg-1-0.ddg', ddg_lines(1, 'AKG', [1, 2], 0))
+        pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE)
+        self.write('ddg-1-0.ddg', ddg_lines(1, 'AKG', [3], 5), mode='a')
+        self.write('ddg-1-1.ddg', ddg_lines(2, 'KAL', [1, 2, 3], 1))
+        state = {name: os.stat(os.path.join(self.ddG_run, name)).st_mtime_ns
+                 for name in os.listdir(self.ddG_run)}
+        stats = pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE, write=False)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+        self.assertEqual({name: os.stat(os.path.join(self.ddG_run, name)).st_mtime_ns
+                          for name in os.listdir(self.ddG_run)}, state)
+
+
+class TestShardedParse(ParseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for n in range(12):
+            position = n % len(SEQUENCE) + 1
+            self.write(f'ddg-7-{n}.ddg', ddg_lines(position, 'AKLG', [1, 2, 3], n))
+
+    def test_merge_equals_single_pass(self):
+        n_shards = 3
+        for index in range(n_shards):
+            parse_shards.parse_shard(self.ddG_run, SEQUENCE, n_shards, index)
+        stats = parse_shards.reduce_shards(self.ddG_run, self.ddG_output, SEQUENCE, n_shards)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+        store = ReplicateStore(os.path.join(self.ddG_output, 'ddg_replicates'))
+        self.assertEqual(len(store), len(pcf.read_ddg_run(self.ddG_run, SEQUENCE)))
+
+        # the merged state is continued incrementally
+        self.write('ddg-7-0.ddg', ddg_lines(1, 'AKLG', [4], 20), mode='a')
+        stats = pcf.update_ddg_aggregate(self.ddG_run, SEQUENCE, store=store)
+        self.assertSameDdgs(stats, full_parse(self.ddG_run))
+
+    def test_missing_shard(self):
+        parse_shards.parse_shard(self.ddG_run, SEQUENCE, 2, 0)
+        with self.assertRaises(ValueError):
+            parse_shards.reduce_shards(self.ddG_run, self.ddG_output, SEQUENCE, 2)
+
+
+class TestFormatDdgMatrix(unittest.TestCase):
+
+    def test_old_format(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(0, 1, (60, 20)) * 10.0 ** rng.integers(-5, 4, (60, 20))
+        matrix[rng.random((60, 20)) < 0.2] = np.nan
+        matrix[0, :8] = [0.0, 1.0, -1.0, 100.0, 99.95, 999.5, -0.0001234, 12.0]
+        # the per-row formatting of parse_rosetta_ddgs before format_ddg_matrix
+        scorefile_line = '{}' + '\t {:.3}' * 20
+        old = [scorefile_line.format(i, *['-' if np.isnan(value) else value for value in row])
+               for i, row in enumerate(matrix, 1)]
+        self.assertEqual(list(pcf.format_ddg_matrix(matrix)), old)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+"""test_prism_rosetta_parser.py tests that the fast prism writer writes what PrismParser writes.
+
+The fast writer is compared with data/test/prism/prism_rosetta_PagP.txt;
+the tests of PrismParser itself need PrismData.py (rosetta_paths.prims_parser).
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_prism_rosetta_parser
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Third party imports
+import numpy as np
+import pandas as pd
+
+# Local application imports
+import prism_table
+try:
+    import prism_rosetta_parser
+except ImportError:
+    prism_rosetta_parser = None
+
+
+PATH_TO_REFERENCE = os.path.join(PARENT_DIR, 'data', 'test', 'prism', 'prism_rosetta_PagP.txt')
+SEQUENCE = ('MNADEWMTTFRENIAQTWQQPEHYDLYIPAITWHARFAYNERPWGGGFGLSRWDEKGNWHGLYAMAFKDSWNKWEPIAGYGWESTWRPLADENFHLG'
+            'LGFTAGV')
+METADATA = {
+    'version': 1,
+    'protein': {'name': 'PagP', 'organism': 'Escherichia coli (strain K12)', 'uniprot': 'P37001',
+                'sequence': SEQUENCE},
+    'rosetta': {'version': 'XXX'},
+    'variants': {'number': 30, 'coverage': 0.0385, 'width': 'single'},
+    'columns': {'norm_ddG': 'mean Rosetta ddG values normalized to WT',
+                'std_ddG': 'std Rosetta ddG values normalized to WT'},
+}
+COMMENT = ['version 1 - 2026-10-18 - johanna.tiemann@gmail.com']
+
+
+def read_reference():
+    with open(PATH_TO_REFERENCE, 'r') as fp:
+        text = fp.read()
+    # the values are kept as written, as in rosetta_to_prism
+    dataframe = pd.read_csv(PATH_TO_REFERENCE, sep=' ', comment='#', dtype=str, na_values=['NA'],
+                            keep_default_na=False)
+    return text, dataframe
+
+
+def read_text(path):
+    with open(path, 'r') as fp:
+        return fp.read()
+
+
+class TestPrismTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.reference, self.dataframe = read_reference()
+        self.header, self.body = prism_table.split_prism_text(self.reference)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def probe_text(self, n_rows, header=None):
+        # the file PrismParser writes for the first n_rows rows
+        lines = self.body.splitlines(keepends=True)
+        return (header or self.header) + ''.join(lines[:n_rows + 1])
+
+    def test_reference(self):
+        self.assertEqual(len(self.header.splitlines()), 20)
+        path_to_prism = os.path.join(self.tmp, 'prism.txt')
+        prism_table.write_prism_table(path_to_prism, self.header, ['variant', 'n_mut', 'norm_ddG', 'std_ddG'],
+                                      self.dataframe)
+        self.assertEqual(read_text(path_to_prism), self.reference)
+
+    def test_probe_layout(self):
+        probes = [self.dataframe.head(10), self.dataframe.head(5)]
+        layout = prism_table.probe_layout(probes, [self.probe_text(10), self.probe_text(5)])
+        self.assertEqual(layout, (self.header, ['variant', 'n_mut', 'norm_ddG', 'std_ddG']))
+
+    def test_row_dependent_header(self):
+        # e.g. the number of variants counted from the rows
+        probes = [self.dataframe.head(10), self.dataframe.head(5)]
+        header = self.header.replace('number: 30', 'number: 5')
+        self.assertEqual(prism_table.probe_layout(probes, [self.probe_text(10), self.probe_text(5, header)]), None)
+
+    def test_other_body_format(self):
+        probes = [self.dataframe.head(10), self.dataframe.head(5)]
+        aligned = [self.header + probe.to_string(index=False, na_rep='NA') + '\n' for probe in probes]
+        self.assertEqual(prism_table.probe_layout(probes, aligned), None)
+
+
+def variant_table(n_rows):
+    rng = np.random.default_rng(0)
+    letters = np.array(list('ACDEFGHIKLMNPQRSTVWY'))
+    variants = [f'{letters[i % 20]}{i // 19 + 1}{letters[(i + 1) % 20]}' for i in range(n_rows)]
+    return pd.DataFrame({'variant': variants,
+                         'norm_ddG': [f'{value:.3f}' for value in rng.normal(1, 2, n_rows)],
+                         'std_ddG': [f'{value:.3f}' for value in rng.random(n_rows)],
+                         'n_mut': 1})
+
+
+@unittest.skipIf(prism_rosetta_parser == None, 'PrismData.py not found')
+class TestWritePrismFast(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write_both(self, dataframe):
+        metadata = {
+            'version': 1,
+            'protein': {'name': 'test', 'organism': 'test', 'uniprot': 'P00000', 'sequence': 'A' * 200},
+            'rosetta': {'version': 'XXX'},
+            'variants': {'number': dataframe['variant'].count(),
+                         'coverage': dataframe['variant'].str[1:-1].nunique() / 200, 'width': 'single'},
+            'columns': {'norm_ddG': 'mean Rosetta ddG values normalized to WT',
+                        'std_ddG': 'std Rosetta ddG values normalized to WT'},
+        }
+        comment = ['version 1 - 2026-10-18 - test']
+        path_to_fast = os.path.join(self.tmp, 'fast.txt')
+        path_to_parser = os.path.join(self.tmp, 'parser.txt')
+        prism_rosetta_parser.write_prism_fast(metadata, dataframe, path_to_fast, comment=comment,
+                                              variant_lists=True)
+        prism_rosetta_parser.PrismParser().write(
+            path_to_parser, prism_rosetta_parser.VariantData(metadata, prism_rosetta_parser.add_variant_lists(dataframe)),
+            comment_lines=comment)
+        with open(path_to_fast, 'rb') as fp:
+            fast = fp.read()
+        with open(path_to_parser, 'rb') as fp:
+            parser = fp.read()
+        return fast, parser
+
+    def test_reference(self):
+        reference, dataframe = read_reference()
+        path_to_parser = os.path.join(self.tmp, 'parser.txt')
+        prism_rosetta_parser.PrismParser().write(
+            path_to_parser, prism_rosetta_parser.VariantData(METADATA, prism_rosetta_parser.add_variant_lists(dataframe)),
+            comment_lines=COMMENT)
+        self.assertEqual(read_text(path_to_parser), reference)
+        path_to_fast = os.path.join(self.tmp, 'fast.txt')
+        prism_rosetta_parser.write_prism_fast(METADATA, dataframe, path_to_fast, comment=COMMENT,
+                                              variant_lists=True, probe_rows=10)
+        self.assertEqual(read_text(path_to_fast), reference)
+
+    def test_more_rows_than_probe(self):
+        fast, parser = self.write_both(variant_table(2500))
+        self.assertEqual(fast, parser)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ['fast.txt', 'parser.txt'])
+
+    def test_fewer_rows_than_probe(self):
+        fast, parser = self.write_both(variant_table(300))
+        self.assertEqual(fast, parser)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""test_relax_parse_results.py tests the ranking and retention of relaxed models.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_relax_parse_results
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+from helper import AttrDict
+import relax_parse_results
+
+
+def write_scorefile(path_to_scorefile, scores):
+    with open(path_to_scorefile, 'w') as fp:
+        fp.write('SEQUENCE: \n')
+        fp.write('SCORE: total_score dslf_fa13 fa_atr description\n')
+        for name, score in scores.items():
+            fp.write(f'SCORE: {score:>11.3f} 0.000 -100.000 {name}\n')
+
+
+class TestParseRelaxResults(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.folder = AttrDict()
+        for name in ['relax_run', 'relax_output', 'ddG_input']:
+            self.folder[name] = os.path.join(self.tmp, name)
+            os.makedirs(self.folder[name])
+        self.scores = {}
+        for n, scores in enumerate([[-10.0, -12.5], [-15.0, -9.0], [-11.0, -14.0]]):
+            file_scores = {f'relax_{n}_{i:04}': score for i, score in enumerate(scores)}
+            write_scorefile(os.path.join(self.folder.relax_run, f'{n}-score_bn15_calibrated.sc'), file_scores)
+            self.scores.update(file_scores)
+        # a scorefile of something else, with a lower score
+        write_scorefile(os.path.join(self.folder.relax_run, 'unrelated.sc'), {'unrelated_0001': -100.0})
+        for name in list(self.scores) + ['unrelated_0001']:
+            with open(os.path.join(self.folder.relax_run, f'{name}.pdb'), 'w') as fp:
+                fp.write(f'REMARK {name}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_best_models(self):
+        paths = [os.path.join(self.folder.relax_run, f'{n}-score_bn15_calibrated.sc') for n in range(3)]
+        ranking, descriptions = relax_parse_results.best_models(paths, keep_top=3)
+        self.assertEqual([name for score, name, path in ranking], ['relax_1_0000', 'relax_2_0001', 'relax_0_0001'])
+        self.assertEqual(ranking[0][2], paths[1])
+        self.assertEqual(sorted(descriptions), sorted(self.scores))
+
+    def test_keep_top(self):
+        path = relax_parse_results.parse_relax_results(self.folder, keep_top=2)
+        self.assertEqual(path, os.path.join(self.folder.relax_output, 'relax_1_0000.pdb'))
+        remaining = sorted(fname for fname in os.listdir(self.folder.relax_run) if fname.endswith('.pdb'))
+        self.assertEqual(remaining, ['relax_1_0000.pdb', 'relax_2_0001.pdb', 'unrelated_0001.pdb'])
+        with open(os.path.join(self.folder.ddG_input, 'input.pdb')) as fp:
+            self.assertEqual(fp.read(), 'REMARK relax_1_0000\n')
+        with open(os.path.join(self.folder.relax_output, 'relax_ranking.txt')) as fp:
+            lines = fp.read().splitlines()
+        self.assertEqual([line.split('\t')[2] for line in lines[1:]], ['relax_1_0000', 'relax_2_0001'])
+
+    def test_sc_name(self):
+        relax_parse_results.parse_relax_results(self.folder, sc_name='')
+        with open(os.path.join(self.folder.ddG_input, 'input.pdb')) as fp:
+            self.assertEqual(fp.read(), 'REMARK unrelated_0001\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""test_retry.py tests the walltime cap of the retry waves and the outputs of rerun mutfiles.
+
+Needs PrismData.py (rosetta_paths.prims_parser), which retry imports through mp_ddG.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_retry
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+from helper import AttrDict
+try:
+    import retry
+except ImportError:
+    retry = None
+
+
+@unittest.skipIf(retry == None, 'PrismData.py not found')
+class TestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.folder = AttrDict({'ddG_input': os.path.join(self.tmp, 'input'), 'ddG_run': os.path.join(self.tmp, 'run')})
+        os.makedirs(self.folder.ddG_input)
+        os.makedirs(self.folder.ddG_run)
+        self.mutfiles = [os.path.join(self.folder.ddG_input, f'mutfile{n:05}') for n in range(12)]
+        self.record(0, '100', 'rosetta_ddg.sbatch', self.mutfiles, 96)
+        self.config = {'max_hours': 168}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def record(self, attempt, job_id, name, mutfiles, hours):
+        path_to_sbatch = os.path.join(self.folder.ddG_input, name)
+        with open(path_to_sbatch, 'w') as fp:
+            fp.write(f'#!/bin/sh\n#SBATCH --time={hours}:00:00\n#SBATCH --mem 2000\n'
+                     f'LST=({" ".join(mutfiles)})\nOFFSET=0\nPER_TASK=1\n')
+        retry.record_ddg_jobs(self.folder.ddG_run, attempt, job_id, path_to_sbatch)
+
+    def touch(self, name):
+        with open(os.path.join(self.folder.ddG_run, name), 'w') as fp:
+            fp.write('COMPLEX:   Round1: WT:  -300.000\n')
+
+    def test_supersede_outputs(self):
+        # mutfile 1 ran in job 100 and, as the first unit, in retry job 200
+        self.record(1, '200', 'retry_ddg_1.sbatch', [self.mutfiles[1], self.mutfiles[10]], 192)
+        for name in ['ddg-100-1.ddg', 'ddg-100-10.ddg', 'ddg-100-2.ddg', 'ddg-200-0.ddg', 'ddg-200-1.ddg']:
+            self.touch(name)
+        moved = retry.supersede_outputs(self.folder.ddG_run, [self.mutfiles[1]])
+        self.assertEqual(sorted(moved), ['ddg-100-1.ddg', 'ddg-200-0.ddg'])
+        self.assertEqual(sorted(os.listdir(os.path.join(self.folder.ddG_run, 'superseded'))), sorted(moved))
+        self.assertEqual(sorted(name for name in os.listdir(self.folder.ddG_run) if name.endswith('.ddg')),
+                         ['ddg-100-10.ddg', 'ddg-100-2.ddg', 'ddg-200-1.ddg'])
+
+    def test_walltime_capped(self):
+        self.assertFalse(retry.walltime_capped(self.folder, self.config, 1))
+        self.record(1, '200', 'retry_ddg_1.sbatch', self.mutfiles[:2], 168)
+        self.assertTrue(retry.walltime_capped(self.folder, self.config, 2))
+        self.assertFalse(retry.walltime_capped(self.folder, {'max_hours': 200}, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
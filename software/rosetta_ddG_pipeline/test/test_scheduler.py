@@ -0,0 +1,68 @@
+"""test_scheduler.py tests the job state parsing and the local scheduler.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_scheduler
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+import scheduler
+
+
+class TestStateParsing(unittest.TestCase):
+
+    def test_sacct_array(self):
+        output = ('100_0|COMPLETED\n100_1|COMPLETED\n'
+                  '101_0|COMPLETED\n101_1|CANCELLED by 42\n'
+                  '102_[2-9%4]|PENDING\n102_0|RUNNING\n')
+        states = scheduler.parse_sacct(output)
+        self.assertEqual(states, {'100': scheduler.COMPLETED, '101': 'CANCELLED',
+                                  '102': scheduler.RUNNING})
+
+    def test_squeue(self):
+        states = scheduler.parse_squeue('200_3 PENDING\n200_1 PENDING\n201 RUNNING\n')
+        self.assertEqual(states, {'200': scheduler.PENDING, '201': scheduler.RUNNING})
+
+
+class TestLocalScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_sbatch(self, name, body):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as fp:
+            fp.write('#!/bin/sh\n#SBATCH --array=0-3%2\n' + body)
+        return path
+
+    def test_submit_and_status(self):
+        local = scheduler.LocalScheduler(max_workers=2)
+        job = local.submit(self.write_sbatch('ok.sbatch', 'touch task_${SLURM_ARRAY_TASK_ID}_$1\n'),
+                           self.tmp_dir, args='x')
+        self.assertEqual(job.status(), scheduler.COMPLETED)
+        self.assertEqual(len([f for f in os.listdir(self.tmp_dir) if f.startswith('slurm-')]), 4)
+
+        failing = local.submit(self.write_sbatch('fail.sbatch', 'exit $SLURM_ARRAY_TASK_ID\n'),
+                               self.tmp_dir, dependencies=[job])
+        self.assertEqual(local.status([job, failing]),
+                         {job.job_id: scheduler.COMPLETED, failing.job_id: scheduler.FAILED})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""test_sequence_alignment.py tests the structure to UniProt index maps and their cache.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_sequence_alignment
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Third party imports
+import numpy as np
+
+# Local application imports
+import sequence_alignment
+
+
+CHECKING_DIR = os.path.join(PARENT_DIR, 'data', 'test', 'mp-pipeline', 'output', 'prepare', 'checking')
+
+
+def read_sequences(path_to_fasta):
+    # {name: sequence} of a (multi-line) FASTA file
+    sequences = {}
+    with open(path_to_fasta, 'r') as fp:
+        for line in fp:
+            if line.startswith('>'):
+                name = line[1:].strip()
+                sequences[name] = ''
+            else:
+                sequences[name] += line.strip()
+    return sequences
+
+
+class TestIndexMap(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        sequence_alignment.index_maps.clear()
+        self.reference = np.loadtxt(os.path.join(CHECKING_DIR, 'uniprot_index_list.txt'), dtype=np.int32)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        sequence_alignment.index_maps.clear()
+
+    def test_reference_alignment(self):
+        sequences = read_sequences(os.path.join(CHECKING_DIR, 'fasta_file.fasta'))
+        index_map = sequence_alignment.align_index_map(sequences['PagP_structure_sequence'],
+                                                       sequences['PagP_uniprot_sequence'], cache_dir=self.cache_dir)
+        np.testing.assert_array_equal(index_map, self.reference)
+
+    def test_muscle_rows(self):
+        rows = read_sequences(os.path.join(CHECKING_DIR, 'alignment.txt'))
+        index_map = sequence_alignment.index_map_from_rows(rows['PagP_structure_sequence'],
+                                                           rows['PagP_uniprot_sequence'])
+        np.testing.assert_array_equal(index_map, self.reference)
+
+    def test_gaps(self):
+        # the structure residue C is aligned to a gap of the UniProt sequence
+        index_map = sequence_alignment.index_map_from_rows('AC-DE', 'A-GDE')
+        np.testing.assert_array_equal(index_map, [1, 0, 3, 4])
+        self.assertEqual(sequence_alignment.uniprot_to_structure(index_map), {1: 1, 3: 3, 4: 4})
+
+    def test_fragment(self):
+        uniprot_seq = 'MSKGEELFTGVVPILVELDGDVNGHKFSVSGEGEGDATYGKLTLKFICTTGKLPVPWPTLVTTFSYGVQCF'
+        index_map = sequence_alignment.align_index_map(uniprot_seq[20:40] + uniprot_seq[45:60], uniprot_seq,
+                                                       cache_dir=self.cache_dir)
+        np.testing.assert_array_equal(index_map, list(range(21, 41)) + list(range(46, 61)))
+
+    def test_cache(self):
+        structure_seq, uniprot_seq = 'MNADEWMTTFRENIAQ', 'GSMNADEWMTTFRENIAQTW'
+        index_map = sequence_alignment.align_index_map(structure_seq, uniprot_seq, cache_dir=self.cache_dir)
+        np.testing.assert_array_equal(index_map, np.arange(3, 19))
+        key = sequence_alignment.alignment_key(structure_seq, uniprot_seq)
+        self.assertEqual(os.listdir(self.cache_dir), [f'{key}.npy'])
+        self.assertNotEqual(key, sequence_alignment.alignment_key(uniprot_seq, structure_seq))
+
+        # a cached map is read instead of aligning again
+        np.save(os.path.join(self.cache_dir, f'{key}.npy'), np.zeros(16, dtype=np.int32))
+        sequence_alignment.index_maps.clear()
+        cached = sequence_alignment.align_index_map(structure_seq, uniprot_seq, cache_dir=self.cache_dir)
+        np.testing.assert_array_equal(cached, np.zeros(16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+"""test_structure_model.py tests the structure sidecar, the model cache and the neighbour counts.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_structure_model
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Third party imports
+from Bio.PDB import NeighborSearch, PDBParser
+import numpy as np
+
+# Local application imports
+import structure_model
+try:
+    import runtime_model
+except ImportError:
+    # runtime_model needs PrismData.py through resume
+    runtime_model = None
+
+
+PATH_TO_PDB = os.path.join(PARENT_DIR, 'data', 'test', 'mp-pipeline', 'output', 'prepare', 'cleaning',
+                           'input_mp_aligned_A.pdb')
+
+
+class TestStructureModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        structure_model.models.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+        structure_model.models.clear()
+
+    def test_sidecar_round_trip(self):
+        sidecar = os.path.join(self.tmp, 'structure_input.npz')
+        model = structure_model.load_structure(PATH_TO_PDB, sidecar=sidecar)
+        reloaded = structure_model.read_structure_arrays(sidecar)
+        for name in structure_model.ARRAYS:
+            np.testing.assert_array_equal(getattr(reloaded, name), getattr(model, name), err_msg=name)
+        self.assertEqual(reloaded.dbref, model.dbref)
+        self.assertEqual(reloaded.fasta_seq, model.fasta_seq)
+        self.assertEqual(reloaded.sha256, model.sha256)
+        self.assertEqual(reloaded.resdata, model.resdata)
+        self.assertEqual(reloaded.strucdata, model.strucdata)
+
+        # a new process reads the sidecar instead of the PDB file
+        structure_model.models.clear()
+        self.assertEqual(structure_model.load_structure(PATH_TO_PDB, sidecar=sidecar).resdata, model.resdata)
+
+    def test_lru_cache(self):
+        texts = [f'ATOM      1  CA  GLY A{n:4}       0.000   0.000   0.000  1.00  0.00           C  \n'
+                 for n in range(structure_model.MAX_MODELS + 2)]
+        for n, text in enumerate(texts):
+            with open(os.path.join(self.tmp, f'{n}.pdb'), 'w') as fp:
+                fp.write(text)
+        first = structure_model.load_structure(os.path.join(self.tmp, '0.pdb'))
+        for n in range(1, len(texts)):
+            # the first model stays in use
+            self.assertIs(structure_model.load_structure(os.path.join(self.tmp, '0.pdb')), first)
+            structure_model.load_structure(os.path.join(self.tmp, f'{n}.pdb'))
+        self.assertEqual(len(structure_model.models), structure_model.MAX_MODELS)
+        self.assertIn(first.sha256, structure_model.models)
+        self.assertEqual(sorted(int(model.residue_numbers[0]) for model in structure_model.models.values()),
+                         [0] + list(range(len(texts) - structure_model.MAX_MODELS + 1, len(texts))))
+
+    def bio_neighbour_counts(self):
+        # the neighbour counts of Bio.PDB.NeighborSearch
+        structure = PDBParser(QUIET=True).get_structure('input', PATH_TO_PDB)
+        residues = [residue for residue in structure[0].get_residues() if residue.id[0] == ' ']
+        neighbours = {residue: 0 for residue in residues}
+        for residue1, residue2 in NeighborSearch([atom for residue in residues for atom in residue]).search_all(
+                8.0, level='R'):
+            neighbours[residue1] += 1
+            neighbours[residue2] += 1
+        return residues, neighbours
+
+    def test_neighbour_counts(self):
+        residues, neighbours = self.bio_neighbour_counts()
+        model = structure_model.load_structure(PATH_TO_PDB)
+        self.assertEqual(model.neighbour_counts(8.0).tolist(), [neighbours[residue] for residue in residues])
+
+    @unittest.skipIf(runtime_model == None, 'PrismData.py not found')
+    def test_structure_features(self):
+        residues, neighbours = self.bio_neighbour_counts()
+        shutil.copy(PATH_TO_PDB, os.path.join(self.tmp, 'input.pdb'))
+        n_residues, by_pose, by_resnum = runtime_model.structure_features(os.path.join(self.tmp, 'input.pdb'))
+        self.assertEqual(n_residues, len(residues))
+        self.assertEqual(by_pose, {str(n + 1): neighbours[residue] for n, residue in enumerate(residues)})
+        self.assertEqual(by_resnum, {str(residue.id[1]): neighbours[residue] for residue in residues})
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp, 'structure_input.npz')))
+
+
+if __name__ == '__main__':
+    unittest.main()
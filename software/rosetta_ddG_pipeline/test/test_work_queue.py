@@ -0,0 +1,70 @@
+"""test_work_queue.py tests the claims, leases and walltime of the ddG work queue.
+
+Date of last major changes: 2026-10-18
+
+How to run all tests:
+=======
+>>> python -m unittest test_work_queue
+"""
+
+# Standard library imports
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+DIR = os.path.split(os.path.abspath(__file__))[0]
+PARENT_DIR = os.path.split(DIR)[0]
+sys.path.insert(0, PARENT_DIR)
+
+# Local application imports
+from helper import AttrDict
+import work_queue
+
+
+class TestWorkQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path_to_queue = work_queue.create_queue(
+            os.path.join(self.tmp, 'work_queue.db'),
+            [('small', 'true', 1.0), ('large', 'true', 5.0), ('broken', 'false', 2.0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_run_worker(self):
+        self.assertEqual(work_queue.run_worker(self.path_to_queue), 3)
+        self.assertEqual(work_queue.queue_status(self.path_to_queue), {'done': 2, 'failed': 1})
+
+    def test_reclaim_expired_lease(self):
+        db = work_queue.connect(self.path_to_queue)
+        unit_id, command = work_queue.claim(db, 'killed')
+        self.assertEqual(db.execute('SELECT unit FROM units WHERE id = ?', (unit_id,)).fetchone()[0], 'large')
+        # the lease of a live worker is kept
+        self.assertNotEqual(work_queue.claim(db, 'other')[0], unit_id)
+        db.execute('UPDATE units SET heartbeat = ? WHERE id = ?', (time.time() - 2 * work_queue.LEASE, unit_id))
+        self.assertEqual(work_queue.claim(db, 'other')[0], unit_id)
+        db.close()
+
+    def test_max_claims(self):
+        db = work_queue.connect(self.path_to_queue)
+        for n in range(work_queue.MAX_CLAIMS):
+            unit_id, command = work_queue.claim(db, f'killed-{n}')
+            db.execute('UPDATE units SET heartbeat = 0 WHERE id = ?', (unit_id,))
+        self.assertNotEqual(work_queue.claim(db, 'other')[0], unit_id)
+        self.assertEqual(db.execute('SELECT state FROM units WHERE id = ?', (unit_id,)).fetchone()[0], 'failed')
+        db.close()
+
+    def test_walltime_cap(self):
+        folder = AttrDict({'ddG_run': self.tmp, 'ddG_input': self.tmp})
+        units = [(f'unit{n}', 'true', 1.0) for n in range(40)]
+        path_to_sbatch = work_queue.write_queue_sbatch(folder, units, n_workers=4)[0]
+        with open(path_to_sbatch, 'r') as fp:
+            self.assertIn('#SBATCH --time=168:00:00\n', fp.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+"""work_queue.py runs the ddG calculations from a shared queue instead of a fixed array mapping.
+
+The queue is a SQLite file (ddG_run/work_queue.db) with one row per unit
+of work (a mutfile or an MP residue) and its command. A few long-lived
+workers, the tasks of one small array, claim the most expensive unit
+still waiting, run it and claim the next one until the queue is empty.
+The claim is one IMMEDIATE transaction, so every unit runs once, and
+long units start first. SQLite needs working file locks on the file
+system of the run folder.
+
+A worker renews the lease of its unit (the heartbeat column) every
+HEARTBEAT seconds. Units of workers that were killed (walltime, node
+failure, scancel) stay 'running' with an old heartbeat; claim hands them
+out again once the lease has expired, and marks them failed after
+MAX_CLAIMS claims, so a unit that kills its worker does not take all
+workers down with it.
+
+Date of last major changes: 2026-10-18
+
+"""
+
+# Standard library imports
+import glob
+import logging as logger
+import os
+from os.path import join
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+# Local application imports
+from helper import format_slurm_time, read_mutfile, remove_ddg_sbatch_files
+import rosetta_paths
+
+
+# seconds between lease renewals, and until a lease expires
+HEARTBEAT = 60
+LEASE = 900
+MAX_CLAIMS = 3
+
+
+def connect(path_to_queue):
+    # waits for the lock of other workers instead of failing
+    return sqlite3.connect(path_to_queue, timeout=300, isolation_level=None)
+
+
+def create_queue(path_to_queue, units):
+    """Writes a new queue with (unit, command, expected cost) rows."""
+    if os.path.isfile(path_to_queue):
+        os.remove(path_to_queue)
+    db = connect(path_to_queue)
+    db.execute('CREATE TABLE units (id INTEGER PRIMARY KEY, unit TEXT, command TEXT, cost REAL, '
+               'state TEXT, worker TEXT, started REAL, heartbeat REAL, finished REAL, code INTEGER, '
+               'claims INTEGER DEFAULT 0)')
+    db.executemany("INSERT INTO units (unit, command, cost, state) VALUES (?, ?, ?, 'todo')", units)
+    db.close()
+    return path_to_queue
+
+
+def reclaim(db, now, lease=LEASE):
+    # the units of dead workers wait again, or fail after MAX_CLAIMS claims
+    stale = db.execute("SELECT id, unit, worker, claims FROM units WHERE state = 'running' AND heartbeat < ?",
+                       (now - lease,)).fetchall()
+    for unit_id, unit, worker, claims in stale:
+        state = 'todo' if claims < MAX_CLAIMS else 'failed'
+        logger.warning(f'Lease of {unit} ({worker}) expired after {claims} claims, setting it {state}')
+        db.execute('UPDATE units SET state = ?, worker = NULL WHERE id = ?', (state, unit_id))
+    return len(stale)
+
+
+def claim(db, worker, lease=LEASE):
+    # returns (id, command) of the most expensive waiting unit, or None
+    now = time.time()
+    db.execute('BEGIN IMMEDIATE')
+    reclaim(db, now, lease=lease)
+    row = db.execute("SELECT id, command FROM units WHERE state = 'todo' ORDER BY cost DESC, id LIMIT 1").fetchone()
+    if row != None:
+        db.execute("UPDATE units SET state = 'running', worker = ?, started = ?, heartbeat = ?, claims = claims + 1 "
+                   "WHERE id = ?", (worker, now, now, row[0]))
+    db.execute('COMMIT')
+    return row
+
+
+def run_worker(path_to_queue):
+    """Runs units from the queue in its directory until no unit is left."""
+    worker = f"{socket.gethostname()}:{os.getenv('SLURM_JOB_ID', os.getpid())}"
+    db = connect(path_to_queue)
+    n_units = 0
+    while True:
+        row = claim(db, worker)
+        if row == None:
+            break
+        unit_id, command = row
+        process = subprocess.Popen(command, shell=True, cwd=os.path.dirname(os.path.abspath(path_to_queue)))
+        while True:
+            try:
+                code = process.wait(timeout=HEARTBEAT)
+                break
+            except subprocess.TimeoutExpired:
+                db.execute('UPDATE units SET heartbeat = ? WHERE id = ?', (time.time(), unit_id))
+        db.execute("UPDATE units SET state = ?, finished = ?, code = ? WHERE id = ?",
+                   ('done' if code == 0 else 'failed', time.time(), code, unit_id))
+        n_units += 1
+    db.close()
+    logger.info(f'Worker {worker} ran {n_units} units')
+    return n_units
+
+
+def queue_status(path_to_queue):
+    # number of units per state
+    db = connect(path_to_queue)
+    states = dict(db.execute('SELECT state, COUNT(*) FROM units GROUP BY state').fetchall())
+    db.close()
+    return states
+
+
+def cartesian_units(folder, input_mutfiles='', ddgfile='', runtime_model=None):
+    # one unit per mutfile; cost by runtime model or number of mutations
+    if input_mutfiles == '':
+        input_mutfiles = join(folder.ddG_input, 'mutfiles')
+    if ddgfile == '':
+        ddgfile = join(folder.ddG_input, 'ddg_flagfile')
+    cartesian_ddg = join(rosetta_paths.path_to_rosetta, f'bin/cartesian_ddg.{rosetta_paths.Rosetta_extension}')
+    units = []
+    for mutfile in sorted(glob.glob(join(input_mutfiles, 'mutfile*'))):
+        residues = [resnum for resnum, aa in read_mutfile(mutfile)]
+        if runtime_model == None:
+            cost = len(residues)
+        else:
+            cost = runtime_model.estimate(residues)[0]
+        command = (f'{cartesian_ddg} -s {join(folder.ddG_input, "input.pdb")} -ddg:mut_file {mutfile} '
+                   f'-out:prefix ddg-queue-{os.path.basename(mutfile)} @{ddgfile}')
+        units.append((mutfile, command, cost))
+    return units
+
+
+def mp_units(mut_dict, ddG_command, runtime_model=None):
+    # one unit per residue with all its mutations
+    units = []
+    for resid, muts in mut_dict.items():
+        if runtime_model == None:
+            cost = len(muts)
+        else:
+            cost = runtime_model.estimate([resid] * len(muts))[0]
+        units.append((resid, f'{ddG_command} --res {resid} --mut {muts}', cost))
+    return units
+
+
+def write_queue_sbatch(folder, units, n_workers=10, sys_name='', partition='sbinlab', hours=None,
+                       mem=2000, basename='rosetta_ddg', runtime_model=None, max_hours=168):
+    """Writes the queue and an array of n_workers workers as basename.sbatch.
+
+    The walltime covers an equal share of the units plus the longest one:
+    from the runtime model if given, else 48 hours per unit. It is clamped
+    to max_hours, the partition limit; units of workers that time out are
+    claimed again by the others (see claim).
+    """
+    path_to_queue = create_queue(join(folder.ddG_run, 'work_queue.db'), units)
+    n_workers = max(1, min(n_workers, len(units)))
+    if runtime_model != None:
+        costs = [cost for unit, command, cost in units]
+        hours = runtime_model.margin * (sum(costs) / n_workers + max(costs))
+        logger.info(f'Estimated cost of {len(units)} ddG units: {sum(costs):.1f} CPU-hours')
+        print(f'Estimated cost of {len(units)} ddG units: {sum(costs):.1f} CPU-hours')
+    elif hours == None:
+        hours = 48 * -(-len(units) // n_workers)
+    if hours > max_hours:
+        logger.warning(f'{len(units)} ddG units on {n_workers} workers need up to {hours:.0f} h; '
+                       f'requesting {max_hours} h, add workers if the queue is not empty by then')
+        hours = max_hours
+
+    remove_ddg_sbatch_files(folder.ddG_input, basename=basename)
+    path_to_sbatch = join(folder.ddG_input, f'{basename}.sbatch')
+    with open(path_to_sbatch, 'w') as fp:
+        fp.write(f'''#!/bin/sh
+#SBATCH --job-name={sys_name}_ddg_queue
+#SBATCH --array=0-{n_workers - 1}
+#SBATCH --time={format_slurm_time(hours)}
+#SBATCH --mem {mem}
+#SBATCH --partition={partition}
+#SBATCH --nice
+
+# each task is a worker running units from the queue until it is empty
+''')
+        fp.write(f'python3 {join(rosetta_paths.path_to_stability_pipeline, "work_queue.py")} {path_to_queue}\n')
+    logger.info(path_to_sbatch)
+    return [path_to_sbatch]
+
+
+if __name__ == '__main__':
+    run_worker(sys.argv[1])